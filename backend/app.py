@@ -1,9 +1,23 @@
 import os
-from flask import Flask, jsonify, request, send_from_directory
+import json
+import hashlib
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
-import yfinance as yf
 import pandas as pd
-import numpy as np
+
+from services.lazy import lazy_import, is_available
+from services.upstream import guarded, hedged_call, breaker_stats
+from services.rate_limits import limiter_stats
+from services.metrics import (
+    SERVER_TIMING, span, upstream_span, begin_request, end_request, server_timing_header, render_metrics
+)
+
+# yfinance is imported on first use (see services/lazy.py)
+yf = lazy_import('yfinance')
 
 # Resolve static folder path absolutely
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,13 +26,41 @@ STATIC_FOLDER = os.path.join(BASE_DIR, '..', 'frontend', 'dist')
 app = Flask(__name__, static_folder=STATIC_FOLDER, static_url_path='/')
 CORS(app)
 
-print(f"DEBUG: Flask app initialized. Base Dir: {BASE_DIR}")
-print(f"DEBUG: Static folder: {app.static_folder}")
-if os.path.exists(app.static_folder):
-    print(f"DEBUG: Static folder exists. Contents: {os.listdir(app.static_folder)}")
-else:
+if not os.path.exists(app.static_folder):
     print(f"WARNING: Static folder NOT FOUND at {app.static_folder}")
 
+@app.before_request
+def _start_request_timing():
+    g.request_timing = begin_request()
+
+
+@app.after_request
+def _finish_request_timing(response):
+    token = g.pop('request_timing', None)
+    if token is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else None
+    spans, total = end_request(token, route, request.method, response.status_code)
+    if SERVER_TIMING and request.path.startswith('/api/'):
+        response.headers['Server-Timing'] = server_timing_header(spans, total)
+    return response
+
+
+@app.route('/api/limits', methods=['GET'])
+def rate_limits():
+    """Upstream rate limiter and circuit breaker state for this worker."""
+    return jsonify({
+        "limits": limiter_stats(),
+        "breakers": breaker_stats()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of request, stage, upstream and cache metrics for this worker."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -39,7 +81,8 @@ def serve(path):
 def health_check():
     return jsonify({
         "status": "healthy",
-        "message": "Stock Prediction API is running"
+        "message": "Stock Prediction API is running",
+        "upstreams": breaker_stats()
     })
 
 # --------------------
@@ -47,163 +90,494 @@ def health_check():
 # --------------------
 from services.prediction import (
     train_linear_regression,
-    predict_future_linear,
-    train_lstm_model,
-    predict_future_lstm,
-    calculate_trading_signals
+    forecast_from_artifacts,
+    calculate_trading_signals,
+    DEFAULT_SIGNAL_PARAMS
 )
 
 from services.coingecko import (
-    is_crypto_symbol,
     fetch_crypto_historical_data,
-    fetch_crypto_current_price,
+    fetch_crypto_current_prices,
     get_crypto_info
 )
 
 from services.binance_api import (
     get_binance_klines,
-    get_binance_price,
-    get_binance_24hr_stats
+    get_binance_klines_since,
+    get_binance_klines_range
 )
 
-# Optional TradingView import (prevents Render crashes)
-try:
-    from tradingview_ta import TA_Handler, Interval
-    TRADINGVIEW_AVAILABLE = True
-except Exception:
-    TRADINGVIEW_AVAILABLE = False
-    TA_Handler = None
-    Interval = None
+from services.history_cache import history_cache, ttl_for_interval
+from services.symbols import symbol_index
+from services.response_cache import response_cache, bars_version
+from services.bar_store import sync_bars, resample_bars, load_bars, bars_to_frame, Bars
+from services.quotes import get_quotes
+from services.indicators import indicator_book
+from services.model_registry import model_registry
+from services.training_jobs import training_queue, TrainingQueueFull
+from services.price_hub import price_hub
+from services.backtest import run_backtest, DEFAULT_MAX_HOLD
+from services.optimizer import load_signal_params
+from services.screener import screen, filter_and_sort, SORT_KEYS as SCREEN_SORT_KEYS
+from services.serialization import (frame_columns, columns_to_records, columns_to_lists, json_response,
+                                   TRADE_COLUMNS, EQUITY_COLUMNS)
+
+# Optional TradingView support (prevents Render crashes); checked without importing it
+TRADINGVIEW_AVAILABLE = is_available('tradingview_ta')
+tradingview_ta = lazy_import('tradingview_ta') if TRADINGVIEW_AVAILABLE else None
+
+
+def _history_route(symbol):
+    """Which upstream family serves history for a symbol (see services/symbols.py)."""
+    return symbol_index.resolve(symbol)['route']
+
+
+def _pair_name(symbol):
+    pair = symbol_index.binance_pair(symbol)
+    return f"{pair[:-4]}/{pair[-4:]}" if pair else symbol
+
+
+# Bar intervals /api/stock serves. Intraday intervals are all resampled from
+# one cached 1m base series per symbol rather than fetched separately.
+INTERVALS = ('1m', '5m', '15m', '1h', '1d')
+# Bars returned for an intraday interval
+INTERVAL_BARS = int(os.environ.get('INTERVAL_BARS', 500))
+# Length of the 1m base series (30000 minutes covers 500 hourly bars)
+INTRADAY_BASE_BARS = int(os.environ.get('INTRADAY_BASE_BARS', 30000))
+
+
+def _compact(loaded):
+    """Cached histories are held as Bars: int64 times and OHLCV arrays only."""
+    hist, data_source, crypto_info = loaded
+    if hist is not None and not isinstance(hist, Bars):
+        hist = Bars.from_frame(hist)
+    return hist, data_source, crypto_info
+
+
+def fetch_bars(symbol, interval='1d'):
+    """
+    Cached wrapper around the upstream history fetch. Returns the shared,
+    read-only Bars of the cache entry (no copy).
+    """
+    symbol = symbol.upper()
+    key = (symbol, _history_route(symbol), interval)
+    if interval == '1d':
+        loader = lambda: _compact(_fetch_full_stock_data_uncached(symbol))
+    else:
+        loader = lambda: _compact(_resampled_history(symbol, interval))
+    return history_cache.get_or_load(key, loader, ttl_for_interval(interval))
+
+
+def fetch_full_stock_data(symbol, interval='1d'):
+    """
+    Cached history as a private DataFrame, so callers can add indicator
+    columns without touching the cached bars.
+    """
+    hist, data_source, crypto_info = fetch_bars(symbol, interval)
+    if hist is not None:
+        hist = hist.to_frame()
+    return hist, data_source, crypto_info
+
+
+def _binance_history(symbol, interval='1d', limit=500):
+    """
+    Binance klines from the local bar store, topped up with the missing tail.
+    limit=None returns everything stored (e.g. after services/backfill.py).
+    """
+    def fetch_since(last_ts):
+        if last_ts is None:
+            return get_binance_klines(symbol, interval=interval, limit=limit or 500)
+        return get_binance_klines_since(symbol, last_ts, interval=interval)
+
+    return sync_bars('binance', symbol, interval, fetch_since, max_bars=limit)
+
+
+def _yfinance_history(ticker):
+    """
+    One year of daily yfinance bars from the local bar store, topped up from upstream.
+    Bars are split/dividend adjusted (auto_adjust, on every yfinance history
+    path). A split or dividend in the new bars re-adjusts everything before
+    it, so then the whole year is refetched and merged over the stored one.
+    """
+    def fetch_since(last_ts):
+        stock = yf.Ticker(ticker)
+        with upstream_span('yfinance', 'history'):
+            if last_ts is None:
+                hist = guarded('yfinance.history', lambda: stock.history(period="1y", auto_adjust=True))
+            else:
+                start = pd.to_datetime(last_ts, unit='ms').strftime('%Y-%m-%d')
+                hist = guarded('yfinance.history', lambda: stock.history(start=start, auto_adjust=True))
+                actions = [hist[col] for col in ('Dividends', 'Stock Splits') if col in hist.columns]
+                if any((col != 0).any() for col in actions):
+                    hist = guarded('yfinance.history', lambda: stock.history(period="1y", auto_adjust=True))
+        if hist.empty:
+            return None
+        return hist.reset_index()
+
+    one_year_ago = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=365)
+    return sync_bars('yfinance', ticker, '1d', fetch_since, min_ts=one_year_ago.value // 10**6)
+
+
+def _binance_minute_history(symbol):
+    """
+    The last INTRADAY_BASE_BARS 1m klines. The stored series is topped up
+    from its last bar with a parallel ranged fetch, or from the window start
+    if it ends before that. Older stored bars are kept; a gap this leaves
+    behind the window is never served and services/backfill.py refills it.
+    """
+    window_start = int(time.time() * 1000) - INTRADAY_BASE_BARS * 60_000
+
+    def fetch_since(last_ts):
+        return get_binance_klines_range(symbol, max(last_ts or 0, window_start), interval='1m')
+
+    return sync_bars('binance', symbol, '1m', fetch_since, min_ts=window_start)
+
+
+def _yfinance_minute_history(ticker):
+    """yfinance 1m bars from the bar store; Yahoo only serves the last few days at 1m."""
+    window_start = int(time.time() * 1000) - INTRADAY_BASE_BARS * 60_000
+    recent = int(time.time() * 1000) - 7 * 86_400_000
+
+    def fetch_since(last_ts):
+        stock = yf.Ticker(ticker)
+        with upstream_span('yfinance', 'history'):
+            if last_ts is None or last_ts < recent:
+                hist = guarded('yfinance.history', lambda: stock.history(period="7d", interval="1m"))
+            else:
+                hist = guarded('yfinance.history', lambda: stock.history(start=last_ts // 1000, interval="1m"))
+        if hist.empty:
+            return None
+        return hist.rename_axis('Date').reset_index()
+
+    return sync_bars('yfinance', ticker, '1m', fetch_since, min_ts=window_start)
+
+
+def _fetch_intraday_base_uncached(symbol):
+    route = _history_route(symbol)
+    if route == 'gold':
+        hist = _yfinance_minute_history("IAU")
+        if hist is None or hist.empty:
+            return None, None, {'name': 'Gold Spot (XAU/USD)'}
+        for col in ['Open', 'High', 'Low', 'Close']:
+            hist[col] *= 53.4
+        return hist, "yfinance IAU (Scaled)", {'name': 'Gold Spot (XAU/USD)'}
+    if route == 'crypto':
+        # CoinGecko has no minute bars, so there is nothing to hedge against
+        return _binance_minute_history(symbol), "Binance API", {"name": _pair_name(symbol)}
+    return _yfinance_minute_history(symbol), "yfinance", {"name": symbol}
+
+
+def _intraday_base(symbol):
+    """The cached 1m series every intraday interval of symbol is built from."""
+    key = (symbol, _history_route(symbol), 'base-1m')
+    return history_cache.get_or_load(key, lambda: _compact(_fetch_intraday_base_uncached(symbol)),
+                                     ttl_for_interval('1m'))
+
+
+def _resampled_history(symbol, interval):
+    """The last INTERVAL_BARS bars of symbol at interval, aggregated from the 1m base series."""
+    base, data_source, crypto_info = _intraday_base(symbol)
+    if base is None or base.empty:
+        return None, data_source, crypto_info
+    bars = resample_bars(base.to_records(), interval)[-INTERVAL_BARS:]
+    return Bars.from_records(bars), data_source, crypto_info
+
 
+def _binance_crypto_history(symbol):
+    return _binance_history(symbol), "Binance API", {"name": _pair_name(symbol)}
 
-def fetch_full_stock_data(symbol):
+
+def _coingecko_crypto_history(symbol):
+    hist = fetch_crypto_historical_data(symbol, days=365)
+    if hist is None or hist.empty:
+        return None
+    return hist, "CoinGecko", get_crypto_info(symbol) or {"name": symbol}
+
+
+def _fetch_full_stock_data_uncached(symbol):
     symbol = symbol.upper()
-    is_crypto = is_crypto_symbol(symbol)
+    resolution = symbol_index.resolve(symbol)
     
     hist = None
     data_source = None
     crypto_info = {"name": symbol}
 
-    if is_crypto or symbol in ('XAUUSD', 'GOLD'):
+    if resolution['route'] in ('crypto', 'gold'):
         # -------- GOLD (XAUUSD) --------
-        if symbol in ('XAUUSD', 'GOLD'):
+        if resolution['route'] == 'gold':
             crypto_info = {'name': 'Gold Spot (XAU/USD)'}
             # yfinance fallback (IAU proxy)
-            stock = yf.Ticker("IAU")
-            hist = stock.history(period="1y")
-            if not hist.empty:
-                hist.reset_index(inplace=True)
+            hist = _yfinance_history("IAU")
+            if hist is not None and not hist.empty:
                 scale_factor = 53.4
                 for col in ['Open', 'High', 'Low', 'Close']:
                     hist[col] *= scale_factor
                 data_source = "yfinance IAU (Scaled)"
         # -------- CRYPTO --------
         else:
-            hist = get_binance_klines(symbol)
-            if hist is not None and not hist.empty:
-                data_source = "Binance API"
-                crypto_info = {"name": f"{symbol}/USDT"}
+            # Binance first; CoinGecko is started too if Binance is slow or
+            # failing, and whichever answers first wins (services/upstream.py).
+            # Sources that do not list the coin are left out of the race.
+            candidates = []
+            if resolution['binance_pair']:
+                candidates.append(('binance', _binance_crypto_history, (symbol,)))
+            if resolution['coingecko_id']:
+                candidates.append(('coingecko', _coingecko_crypto_history, (symbol,)))
+            source, result = hedged_call(candidates)
+            if result is not None:
+                hist, data_source, crypto_info = result
             else:
-                hist = fetch_crypto_historical_data(symbol, days=365)
-                crypto_info = get_crypto_info(symbol)
                 data_source = "CoinGecko"
     else:
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period="1y")
-        if not hist.empty:
-            hist.reset_index(inplace=True)
+        hist = _yfinance_history(symbol)
+        if hist is not None and not hist.empty:
             data_source = "yfinance"
 
     return hist, data_source, crypto_info
 
+@app.route('/api/resolve/<path:symbol>', methods=['GET'])
+def resolve_symbol(symbol):
+    """Where a symbol (ticker, alias, pair or CoinGecko id) is routed, plus the resolver's index state."""
+    return jsonify({**symbol_index.resolve(symbol), "index": symbol_index.stats()})
+
 @app.route('/api/price/<symbol>', methods=['GET'])
 def get_live_price(symbol):
     try:
-        symbol = symbol.upper()
-        if is_crypto_symbol(symbol):
-            # Check Binance first
-            price = get_binance_price(symbol)
-            if price:
-                return jsonify({"price": price})
-            # Fallback to CoinGecko
-            price_data = fetch_crypto_current_price(symbol)
-            if price_data:
-                return jsonify({"price": price_data['price']})
-        elif symbol in ('XAUUSD', 'GOLD'):
-            # Gold price logic from get_stock_data
-            paxg_price = get_binance_price("PAXGUSDT")
-            if paxg_price:
-                return jsonify({"price": paxg_price})
-            # fallback via IAU
-            stock = yf.Ticker("IAU")
-            data = stock.history(period='1d')
-            if not data.empty:
-                return jsonify({"price": float(data['Close'].iloc[-1]) * 53.4})
-        else:
-            stock = yf.Ticker(symbol)
-            data = stock.history(period='1d')
-            if not data.empty:
-                return jsonify({"price": float(data['Close'].iloc[-1])})
-        
+        quote = get_quotes([symbol]).get(symbol.upper())
+        if quote:
+            return jsonify({"price": quote['price']})
         return jsonify({"error": "Price not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+PRICES_MAX_SYMBOLS = int(os.environ.get('PRICES_MAX_SYMBOLS', 200))
+
+
+@app.route('/api/prices', methods=['GET'])
+def get_live_prices():
+    """
+    Batch live prices: ?symbols=BTC,ETH,AAPL
+    Served from the shared quote cache, so many pollers share one upstream call per tick.
+    """
+    symbols = parse_symbols_arg(PRICES_MAX_SYMBOLS)
+    if not symbols:
+        return jsonify({"error": "No symbols given"}), 400
+    try:
+        quotes = get_quotes(symbols)
+        return jsonify({
+            "prices": {sym: q['price'] for sym, q in quotes.items()},
+            "sources": {sym: q['source'] for sym, q in quotes.items()},
+            "missing": [sym for sym in symbols if sym not in quotes]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+STREAM_MAX_SYMBOLS = int(os.environ.get('STREAM_MAX_SYMBOLS', 50))
+STREAM_HEARTBEAT_SECONDS = 15
+# Open streams per web worker. Each one holds a gunicorn thread for as long
+# as the viewer stays connected, so past this cap new streams get a 503 and
+# the remaining threads are left for the API (see gunicorn.conf.py).
+STREAM_MAX_PER_WORKER = int(os.environ.get('STREAM_MAX_PER_WORKER',
+                                           max(1, int(os.environ.get('GUNICORN_THREADS', 16)) // 2)))
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_PER_WORKER)
+
+
+@app.route('/api/stream/prices', methods=['GET'])
+def stream_prices():
+    """
+    Server-Sent Events stream of live prices: ?symbols=BTC,ETH,AAPL
+    Each event is a JSON {"symbol", "price", "ts"} published by the shared
+    price hub. Every open stream holds a worker thread for its lifetime;
+    beyond STREAM_MAX_PER_WORKER streams the request is refused with 503.
+    """
+    symbols = parse_symbols_arg(STREAM_MAX_SYMBOLS)
+    if not symbols:
+        return jsonify({"error": "No symbols given"}), 400
+    if not _stream_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many open price streams, try again later"})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    sub = price_hub.subscribe(symbols)
+
+    def events():
+        yield "retry: 3000\n\n"
+        while True:
+            update = sub.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            if update is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(update)}\n\n"
+
+    def close():
+        price_hub.unsubscribe(sub)
+        _stream_slots.release()
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the body never started
+    response.call_on_close(close)
+    return response
+
+# How long a synchronous /api/predict waits on a pooled fit before handing
+# back a job id to poll instead of holding the web worker.
+PREDICT_SYNC_WAIT = float(os.environ.get('PREDICT_SYNC_WAIT', 2))
+
+
+def _prediction_history(symbol):
+    with span('fetch'):
+        hist, _, _ = fetch_full_stock_data(symbol)
+    if hist is None or hist.empty:
+        return None
+
+    # Ensure RSI is there for signals/matching data if needed
+    delta = hist['Close'].diff()
+    gain = delta.clip(lower=0).rolling(14).mean()
+    loss = (-delta.clip(upper=0)).rolling(14).mean()
+    rs = gain / loss
+    hist['RSI'] = 100 - (100 / (1 + rs))
+    return hist
+
+
+def _job_response(symbol, job, status=200):
+    body = job.to_dict()
+    body["status_url"] = f"/api/predict/{symbol}/jobs/{job.id}"
+    return jsonify(body), status
+
+
 @app.route('/api/predict/<symbol>', methods=['GET'])
 def get_stock_prediction(symbol):
     model_type = request.args.get('model', 'linear')
     try:
-        hist, _, _ = fetch_full_stock_data(symbol)
-        if hist is None or hist.empty:
+        symbol = symbol.upper()
+        hist = _prediction_history(symbol)
+        if hist is None:
             return jsonify({"error": "No data found for prediction"}), 404
-        
-        # Ensure RSI is there for signals/matching data if needed
-        delta = hist['Close'].diff()
-        gain = delta.clip(lower=0).rolling(14).mean()
-        loss = (-delta.clip(upper=0)).rolling(14).mean()
-        rs = gain / loss
-        hist['RSI'] = 100 - (100 / (1 + rs))
 
-        predictions = []
+        key = ('predict', symbol, model_type, bars_version(hist))
+        rendered = response_cache.get(key)
+        if rendered is not None:
+            return rendered.respond(request)
+
+        # Fitted models are reused until new bars arrive (see services/model_registry.py)
         if model_type == 'linear':
-            model = train_linear_regression(hist)
-            predictions = predict_future_linear(model, hist.iloc[-1]['Date'])
+            with span('train'):
+                model = model_registry.get_or_train(symbol, 'linear', hist, train_linear_regression)
+            with span('forecast'):
+                predictions = forecast_from_artifacts('linear', model, hist)
         else:
-            model, scaler, scaled_data = train_lstm_model(hist)
-            future_prices = predict_future_lstm(model, scaler, scaled_data)
-            
-            last_date = pd.to_datetime(hist.iloc[-1]['Date'])
-            for i, p in enumerate(future_prices):
-                future_date = last_date + pd.Timedelta(days=i+1)
-                predictions.append({
-                    "date": future_date.strftime('%Y-%m-%d'),
-                    "price": float(p)
-                })
+            # Neural fits run in the training pool; if this one is not done
+            # quickly, answer 202 with a job to poll.
+            job = training_queue.submit(symbol, 'lstm', hist)
+            with span('train_wait'):
+                finished = training_queue.wait(job, PREDICT_SYNC_WAIT)
+            if not finished:
+                return _job_response(symbol, job, 202)
+            if job.error:
+                return jsonify({"error": job.error}), 500
+            predictions = job.result
 
-        return jsonify({
+        return response_cache.put(key, {
             "symbol": symbol,
             "model": model_type,
             "predictions": predictions
+        }).respond(request)
+    except TrainingQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+UNIVERSE_MAX_SYMBOLS = int(os.environ.get('UNIVERSE_MAX_SYMBOLS', 500))
+
+
+@app.route('/api/predictions', methods=['GET'])
+def get_universe_predictions():
+    """
+    Forecasts for a watchlist from one shared model: ?symbols=AAPL,MSFT,BTC
+    The model is fitted once on per-symbol-normalised windows from every
+    symbol and reused until any member gets new bars. Like /api/predict,
+    a fit that is not done within PREDICT_SYNC_WAIT returns a 202 job.
+    """
+    symbols = parse_symbols_arg(UNIVERSE_MAX_SYMBOLS)
+    if not symbols:
+        return jsonify({"error": "No symbols given"}), 400
+    try:
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            futures = {sym: pool.submit(contextvars.copy_context().run, _prediction_history, sym) for sym in symbols}
+            histories = {sym: future.result() for sym, future in futures.items()}
+        frames = {sym: hist for sym, hist in histories.items() if hist is not None}
+        if not frames:
+            return jsonify({"error": "No data found for prediction"}), 404
+
+        universe = "UNIVERSE-" + hashlib.sha1(','.join(sorted(frames)).encode()).hexdigest()[:12].upper()
+        job = training_queue.submit(universe, 'universe', frames)
+        if not training_queue.wait(job, PREDICT_SYNC_WAIT):
+            return _job_response(universe, job, 202)
+        if job.error:
+            return jsonify({"error": job.error}), 500
+
+        return jsonify({
+            "universe": universe,
+            "model": "universe",
+            "predictions": job.result,
+            "missing": [sym for sym in symbols if sym not in job.result]
         })
+    except TrainingQueueFull as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/stock/<symbol>', methods=['GET'])
-def get_stock_data(symbol):
+
+@app.route('/api/predict/<symbol>/jobs', methods=['POST'])
+def create_prediction_job(symbol):
+    """
+    Queue a prediction fit: ?model=lstm|linear
+    Returns the job (202) to poll via GET .../jobs/<job_id>; identical
+    in-flight requests share one job. Jobs live in the web worker process
+    that created them.
+    """
+    model_type = request.args.get('model', 'lstm')
+    if model_type not in ('linear', 'lstm'):
+        return jsonify({"error": f"Unknown model: {model_type}"}), 400
     try:
         symbol = symbol.upper()
-        hist, data_source, crypto_info = fetch_full_stock_data(symbol)
+        hist = _prediction_history(symbol)
+        if hist is None:
+            return jsonify({"error": "No data found for prediction"}), 404
+        job = training_queue.submit(symbol, model_type, hist)
+        return _job_response(symbol, job, 202)
+    except TrainingQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        if hist is None or hist.empty:
-            return jsonify({"error": "No data found"}), 404
 
-        # Clean Dates
-        if 'Date' in hist.columns:
-            hist['Date'] = pd.to_datetime(hist['Date']).dt.strftime('%Y-%m-%d')
+@app.route('/api/predict/<symbol>/jobs/<job_id>', methods=['GET'])
+def get_prediction_job(symbol, job_id):
+    job = training_queue.get(job_id)
+    if job is None or job.symbol != symbol.upper():
+        return jsonify({"error": "Job not found"}), 404
+    return _job_response(symbol.upper(), job)
+
+def build_stock_payload(symbol, hist, data_source, crypto_info, response_format='records', interval='1d'):
+    """
+    Compute indicators and signals for one history frame and shape the
+    /api/stock response body. Returns None if there is not enough data.
+    """
+    # Clean Dates (intraday bars keep their time, in UTC)
+    if 'Date' in hist.columns:
+        date_format = '%Y-%m-%d' if interval == '1d' else '%Y-%m-%d %H:%M'
+        hist['Date'] = pd.to_datetime(hist['Date']).dt.strftime(date_format)
 
-        # =========================
-        # INDICATORS
-        # =========================
+    # =========================
+    # INDICATORS
+    # =========================
+    with span('indicators'):
         hist['SMA_20'] = hist['Close'].rolling(20).mean()
         hist['SMA_50'] = hist['Close'].rolling(50).mean()
 
@@ -214,47 +588,378 @@ def get_stock_data(symbol):
         hist['RSI'] = 100 - (100 / (1 + rs))
 
         df = hist.dropna()
-        data = [{
-            "Date": r['Date'],
-            "Open": float(r['Open']),
-            "High": float(r['High']),
-            "Low": float(r['Low']),
-            "Close": float(r['Close']),
-            "Volume": int(r['Volume']),
-            "SMA_20": float(r['SMA_20']),
-            "SMA_50": float(r['SMA_50']),
-            "RSI": float(r['RSI'])
-        } for _, r in df.iterrows()]
-
-        latest = df.iloc[-1]
-        stats = {
-            "open": float(latest['Open']),
-            "high": float(latest['High']),
-            "low": float(latest['Low']),
-            "close": float(latest['Close']),
-            "volume": int(latest['Volume'])
-        }
+    if df.empty:
+        return None
 
-        signals = calculate_trading_signals(hist)
+    # Serialize straight from the column arrays; the columnar format sends
+    # one array per field instead of one object per bar.
+    with span('serialize'):
+        arrays = frame_columns(df)
+        if response_format == 'columnar':
+            data = columns_to_lists(arrays)
+        else:
+            data = columns_to_records(arrays)
 
-        return jsonify({
+    latest = df.iloc[-1]
+    stats = {
+        "open": float(latest['Open']),
+        "high": float(latest['High']),
+        "low": float(latest['Low']),
+        "close": float(latest['Close']),
+        "volume": int(latest['Volume'])
+    }
+
+    # Signals come from the per-symbol incremental engine, which only has to
+    # apply the bars it has not seen since the last request. The engine runs
+    # the default periods, so an optimized configuration is scored directly.
+    with span('signals'):
+        params = load_signal_params(symbol, interval)
+        if params is None:
+            signals = indicator_book.sync((symbol, interval), hist)
+        else:
+            signals = calculate_trading_signals(hist, params=params)
+
+    return {
+        "symbol": symbol,
+        "company": (crypto_info or {}).get("name", symbol),
+        "interval": interval,
+        "format": response_format,
+        "data": data,
+        "stats": stats,
+        "signals": signals,
+        "data_source": data_source,
+        "warning": None
+    }
+
+
+@app.route('/api/stock/<symbol>', methods=['GET'])
+def get_stock_data(symbol):
+    try:
+        symbol = symbol.upper()
+        interval = request.args.get('interval', '1d')
+        if interval not in INTERVALS:
+            return jsonify({"error": f"Unsupported interval; use one of {', '.join(INTERVALS)}"}), 400
+
+        with span('fetch'):
+            hist, data_source, crypto_info = fetch_full_stock_data(symbol, interval)
+
+        if hist is None or hist.empty:
+            return jsonify({"error": "No data found"}), 404
+
+        response_format = 'columnar' if request.args.get('format') == 'columnar' else 'records'
+        # The rendered body is reused until the bars or the saved signal parameters change
+        params = load_signal_params(symbol, interval)
+        key = ('stock', symbol, interval, response_format, data_source, bars_version(hist),
+               json.dumps(params, sort_keys=True) if params else None)
+        rendered = response_cache.get(key)
+        if rendered is None:
+            payload = build_stock_payload(symbol, hist, data_source, crypto_info, response_format, interval)
+            if payload is None:
+                return jsonify({"error": "Not enough data for indicators"}), 404
+            rendered = response_cache.put(key, payload)
+
+        return rendered.respond(request)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Trades listed in a /api/backtest response (the summary covers all of them)
+BACKTEST_MAX_TRADES = int(os.environ.get('BACKTEST_MAX_TRADES', 500))
+BACKTEST_STRATEGIES = ('day_trading', 'scalping_xau')
+
+
+def _backtest_history(symbol, interval):
+    """
+    Crypto backtests use the full stored Binance series; others the regular
+    history window. Intraday intervals are resampled from the stored 1m
+    series, as _resampled_history does, so a 1m backfill covers them all.
+    """
+    if _history_route(symbol) == 'crypto':
+        if interval == '1d':
+            hist = _binance_history(symbol, interval, limit=None)
+        else:
+            _binance_minute_history(symbol)  # top up the stored 1m series
+            stored = load_bars('binance', symbol, '1m')
+            hist = bars_to_frame(resample_bars(stored, interval)) if stored is not None and len(stored) else None
+        if hist is not None and not hist.empty:
+            return hist, "Binance API"
+    hist, data_source, _ = fetch_full_stock_data(symbol, interval)
+    return hist, data_source
+
+
+@app.route('/api/backtest/<symbol>', methods=['GET'])
+def get_backtest(symbol):
+    """
+    Replay the trading signals over history:
+    ?interval=1d&strategy=day_trading&min_score=1&max_hold=100&fee_bps=0&short=true
+    Uses the configuration saved by services/optimizer.py unless ?params=default.
+    """
+    symbol = symbol.upper()
+    interval = request.args.get('interval', '1d')
+    strategy = request.args.get('strategy', 'day_trading')
+    if interval not in INTERVALS:
+        return jsonify({"error": f"Unsupported interval; use one of {', '.join(INTERVALS)}"}), 400
+    if strategy not in BACKTEST_STRATEGIES:
+        return jsonify({"error": f"Unsupported strategy; use one of {', '.join(BACKTEST_STRATEGIES)}"}), 400
+    try:
+        min_score = int(request.args.get('min_score', 1))
+        max_hold = int(request.args.get('max_hold', DEFAULT_MAX_HOLD))
+        fee_bps = float(request.args.get('fee_bps', 0))
+    except ValueError:
+        return jsonify({"error": "min_score, max_hold and fee_bps must be numbers"}), 400
+    if not 1 <= min_score <= 6 or max_hold < 1:
+        return jsonify({"error": "min_score must be 1-6 and max_hold at least 1"}), 400
+    allow_short = request.args.get('short', 'true').lower() != 'false'
+    params = None if request.args.get('params') == 'default' else load_signal_params(symbol, interval)
+
+    try:
+        with span('fetch'):
+            hist, data_source = _backtest_history(symbol, interval)
+        if hist is None or len(hist) < 30:
+            return jsonify({"error": "Not enough data to backtest"}), 404
+
+        with span('backtest'):
+            summary, trades, equity = run_backtest(hist, strategy, min_score, max_hold, fee_bps, allow_short, params)
+
+        date_format = '%Y-%m-%d' if interval == '1d' else '%Y-%m-%d %H:%M'
+        with span('serialize'):
+            trades = trades.tail(BACKTEST_MAX_TRADES).copy()
+            for col in ('entry_date', 'exit_date'):
+                trades[col] = pd.to_datetime(trades[col]).dt.strftime(date_format)
+            equity['date'] = pd.to_datetime(equity['date']).dt.strftime(date_format)
+
+        return json_response({
             "symbol": symbol,
-            "company": crypto_info["name"],
-            "data": data,
-            "stats": stats,
-            "signals": signals,
+            "interval": interval,
+            "strategy": strategy,
             "data_source": data_source,
-            "warning": None
+            "params": params or DEFAULT_SIGNAL_PARAMS,
+            "start": pd.to_datetime(hist['Date'].iloc[0]).strftime(date_format),
+            "end": pd.to_datetime(hist['Date'].iloc[-1]).strftime(date_format),
+            "summary": summary,
+            "equity_curve": columns_to_records(frame_columns(equity, EQUITY_COLUMNS, 'date')),
+            "trades": columns_to_records(frame_columns(trades, TRADE_COLUMNS, 'entry_date')),
         })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+SCREEN_MAX_SYMBOLS = int(os.environ.get('SCREEN_MAX_SYMBOLS', 500))
+SCREEN_COLUMNS = {name: 'object' if name in ('symbol', 'signal', 'confidence') or name.endswith('_rule') else 'float64'
+                  for name in ('symbol', 'signal', 'confidence', 'close', 'change_pct', 'rsi', 'ema_fast', 'ema_slow',
+                               'macd', 'macd_signal', 'bb_upper', 'bb_lower', 'rsi_rule', 'ma_rule', 'macd_rule',
+                               'bb_rule')}
+SCREEN_COLUMNS['score'] = 'int64'
+
+
+def _float_arg(name):
+    value = request.args.get(name)
+    return float(value) if value not in (None, '') else None
+
+
+def _list_arg(name):
+    return [part.strip() for part in request.args.get(name, '').split(',') if part.strip()]
+
+
+@app.route('/api/screen', methods=['GET'])
+def screen_universe():
+    """
+    Latest signals for a whole universe in one pass:
+    ?symbols=AAPL,MSFT,BTC,...&interval=1d&signal=STRONG BUY,BUY&confidence=High
+    &min_score=&max_score=&rsi_below=&rsi_above=&sort=score&order=desc&limit=50
+    """
+    symbols = parse_symbols_arg(SCREEN_MAX_SYMBOLS)
+    if not symbols:
+        return jsonify({"error": "No symbols given"}), 400
+    interval = request.args.get('interval', '1d')
+    if interval not in INTERVALS:
+        return jsonify({"error": f"Unsupported interval; use one of {', '.join(INTERVALS)}"}), 400
+    sort = request.args.get('sort', 'score')
+    if sort not in SCREEN_SORT_KEYS:
+        return jsonify({"error": f"Unsupported sort; use one of {', '.join(SCREEN_SORT_KEYS)}"}), 400
+    try:
+        filters = {
+            'signals': [s.upper() for s in _list_arg('signal')],
+            'confidences': [c.capitalize() for c in _list_arg('confidence')],
+            'min_score': _float_arg('min_score'),
+            'max_score': _float_arg('max_score'),
+            'rsi_below': _float_arg('rsi_below'),
+            'rsi_above': _float_arg('rsi_above'),
+            'limit': int(request.args['limit']) if request.args.get('limit') else None,
+        }
+    except ValueError:
+        return jsonify({"error": "Score, RSI and limit filters must be numbers"}), 400
+    descending = request.args.get('order', 'asc' if sort == 'symbol' else 'desc') != 'asc'
+
+    def load(sym):
+        hist, _, _ = fetch_bars(sym, interval)
+        return hist
+
+    try:
+        histories, errors = {}, {}
+        with span('fetch'):
+            if interval == '1d':
+                _prefetch_yfinance_batch([s for s in symbols if _history_route(s) == 'yfinance'])
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+                futures = {sym: pool.submit(contextvars.copy_context().run, load, sym) for sym in symbols}
+                for sym, future in futures.items():
+                    try:
+                        hist = future.result()
+                    except Exception as e:
+                        errors[sym] = str(e)
+                        continue
+                    if hist is None or len(hist) < 20:
+                        errors[sym] = "Not enough data"
+                        continue
+                    histories[sym] = hist
+
+        # Symbols with an optimized configuration are screened with it, one pass per configuration
+        with span('screen'):
+            groups = {}
+            for sym in histories:
+                params = load_signal_params(sym, interval)
+                key = json.dumps(params, sort_keys=True) if params else None
+                groups.setdefault(key, (params, {}))[1][sym] = histories[sym]
+            parts = [screen(frames, params) for params, frames in groups.values()]
+            result = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+            matched = filter_and_sort(result, sort=sort, descending=descending, **filters)
 
+        date_format = '%Y-%m-%d' if interval == '1d' else '%Y-%m-%d %H:%M'
+        with span('serialize'):
+            rows = []
+            if not matched.empty:
+                matched = matched.assign(date=matched['date'].dt.strftime(date_format))
+                rows = columns_to_records(frame_columns(matched, SCREEN_COLUMNS, 'date'))
+
+        return json_response({
+            "interval": interval,
+            "screened": len(result),
+            "matched": len(rows),
+            "results": rows,
+            "errors": errors,
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def parse_symbols_arg(max_symbols):
+    """Read ?symbols=A,B,C into a de-duplicated, upper-cased list."""
+    raw = request.args.get('symbols', '')
+    symbols = []
+    for part in raw.split(','):
+        sym = part.strip().upper()
+        if sym and sym not in symbols:
+            symbols.append(sym)
+    return symbols[:max_symbols]
+
+
+def _prefetch_yfinance_batch(symbols):
+    """
+    Warm the history cache for many yfinance tickers with a single
+    multi-ticker yf.download call instead of one request per ticker.
+    """
+    pending = [s for s in symbols if history_cache.get((s, 'yfinance', '1d')) is None]
+    if len(pending) < 2:
+        return
+
+    try:
+        with upstream_span('yfinance', 'download'):
+            frames = guarded('yfinance.download', lambda: yf.download(pending, period="1y", group_by='ticker', threads=True,
+                                                                      progress=False, auto_adjust=True))
+    except Exception as e:
+        print(f"yfinance batch download error: {e}")
+        return
+    if frames is None or frames.empty:
+        return
+
+    for sym in pending:
+        try:
+            sym_hist = frames[sym].dropna(how='all')
+        except KeyError:
+            continue
+        if sym_hist.empty:
+            continue
+        sym_hist = sym_hist.rename_axis('Date').reset_index()
+
+        # The whole downloaded year is merged in, not just the tail: it is
+        # adjusted as of today, like _yfinance_history's bars
+        def fetch_since(last_ts, sym_hist=sym_hist):
+            return sym_hist
+
+        one_year_ago = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=365)
+        hist = sync_bars('yfinance', sym, '1d', fetch_since, min_ts=one_year_ago.value // 10**6)
+        if hist is not None and not hist.empty:
+            history_cache.put((sym, 'yfinance', '1d'), (Bars.from_frame(hist), "yfinance", {"name": sym}),
+                              ttl_for_interval('1d'))
+
+
+BATCH_MAX_SYMBOLS = int(os.environ.get('BATCH_MAX_SYMBOLS', 50))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))
+
+
+@app.route('/api/stocks', methods=['GET'])
+def get_stocks_batch():
+    """
+    Batch version of /api/stock: ?symbols=AAPL,MSFT,BTC[&interval=1h]
+    Symbols are fetched and scored concurrently; per-symbol failures are
+    reported under "errors" instead of failing the whole request.
+    """
+    symbols = parse_symbols_arg(BATCH_MAX_SYMBOLS)
+    if not symbols:
+        return jsonify({"error": "No symbols given"}), 400
+
+    interval = request.args.get('interval', '1d')
+    if interval not in INTERVALS:
+        return jsonify({"error": f"Unsupported interval; use one of {', '.join(INTERVALS)}"}), 400
+    response_format = 'columnar' if request.args.get('format') == 'columnar' else 'records'
+    include_data = request.args.get('include_data', 'true').lower() != 'false'
+
+    crypto_symbols = [s for s in symbols if _history_route(s) == 'crypto']
+    stock_symbols = [s for s in symbols if _history_route(s) == 'yfinance']
+
+    def load(sym):
+        with span('fetch'):
+            hist, data_source, crypto_info = fetch_full_stock_data(sym, interval)
+        if hist is None or hist.empty:
+            return None
+        return build_stock_payload(sym, hist, data_source, crypto_info, response_format, interval)
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        # Run each task in a copy of the request context so its spans reach Server-Timing
+        quotes_future = pool.submit(contextvars.copy_context().run, fetch_crypto_current_prices, crypto_symbols) if crypto_symbols else None
+        if interval == '1d':
+            _prefetch_yfinance_batch(stock_symbols)
+        futures = {sym: pool.submit(contextvars.copy_context().run, load, sym) for sym in symbols}
+        for sym, future in futures.items():
+            try:
+                payload = future.result()
+            except Exception as e:
+                errors[sym] = str(e)
+                continue
+            if payload is None:
+                errors[sym] = "No data found"
+                continue
+            if not include_data:
+                payload.pop("data")
+            results[sym] = payload
+        quotes = quotes_future.result() if quotes_future else {}
+
+    for sym, quote in (quotes or {}).items():
+        if sym in results:
+            results[sym]["quote"] = quote
+
+    return json_response({
+        "symbols": symbols,
+        "results": results,
+        "errors": errors
+    })
+
+
 # =========================
 # ENTRY POINT (Render)
 # =========================
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"DEBUG: Starting Flask app on port {port}")
     app.run(host="0.0.0.0", port=port, debug=False)
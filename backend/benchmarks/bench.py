@@ -0,0 +1,400 @@
+"""
+Benchmark suite: API endpoints and service functions against replayed
+upstream fixtures (no network).
+
+    python benchmarks/bench.py [--dataset 1y_daily] [--filter stock] [--out results.json]
+    python benchmarks/bench.py --compare baseline.json results.json
+
+Each case reports p50/p99/mean latency, sequential throughput, peak Python
+heap allocation (tracemalloc, measured on a separate run so it does not
+skew the timings) and the upstream calls it made per iteration. Endpoints
+run "warm" (caches primed) and "cold" (history/quote/indicator/model
+caches and the bar store emptied before every iteration).
+
+Peak memory covers the benchmark process only; neural fits that run in
+the training pool's child processes are timed but not memory-profiled.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Keep the benchmark's on-disk state away from the real data directory
+_STATE_DIR = tempfile.mkdtemp(prefix='bench-')
+os.environ.setdefault('BAR_STORE_DIR', os.path.join(_STATE_DIR, 'bars'))
+os.environ.setdefault('MODEL_DIR', os.path.join(_STATE_DIR, 'models'))
+os.environ.setdefault('SYMBOL_SNAPSHOT_DIR', os.path.join(_STATE_DIR, 'symbols'))
+# No background symbol-index refresh: its calls would skew the per-case upstream counts
+os.environ.setdefault('SYMBOL_INDEX_REFRESH_SECONDS', '0')
+# Replayed upstreams have no rate limits; don't let the client-side limiter throttle runs
+for _limit in ('BINANCE_WEIGHT_PER_MINUTE', 'COINGECKO_CALLS_PER_MINUTE', 'YFINANCE_CALLS_PER_MINUTE'):
+    os.environ.setdefault(_limit, str(10**9))
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import DATASETS, load_dataset
+from benchmarks.stub import ReplayUpstream
+
+DEFAULT_ITERATIONS = int(os.environ.get('BENCH_ITERATIONS', 20))
+COLD_ITERATIONS = int(os.environ.get('BENCH_COLD_ITERATIONS', 5))
+# Relative slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+CRYPTO_BATCH = 'BTC,ETH'
+MIXED_BATCH = 'BTC,ETH,AAPL,MSFT,XAUUSD'
+
+# (case, path, modes). POST paths start with "POST ".
+ENDPOINTS = [
+    ('health', '/health', ('warm',)),
+    ('price_crypto', '/api/price/BTC', ('warm', 'cold')),
+    ('price_stock', '/api/price/AAPL', ('warm', 'cold')),
+    ('prices_batch', f'/api/prices?symbols={MIXED_BATCH}', ('warm', 'cold')),
+    ('stock_crypto', '/api/stock/BTC', ('warm', 'cold')),
+    ('stock_crypto_columnar', '/api/stock/BTC?format=columnar', ('warm',)),
+    ('stock_crypto_revalidate', '/api/stock/BTC', ('warm',)),
+    ('stock_equity', '/api/stock/AAPL', ('warm', 'cold')),
+    ('stock_gold', '/api/stock/XAUUSD', ('warm', 'cold')),
+    ('stocks_batch', f'/api/stocks?symbols={MIXED_BATCH}&include_data=true', ('warm', 'cold')),
+    ('backtest_crypto', '/api/backtest/BTC', ('warm', 'cold')),
+    ('screen_mixed', f'/api/screen?symbols={MIXED_BATCH}', ('warm', 'cold')),
+    ('predict_linear', '/api/predict/BTC?model=linear', ('warm', 'cold')),
+    ('predict_lstm', '/api/predict/BTC?model=lstm', ('warm', 'cold')),
+    ('predictions_universe', f'/api/predictions?symbols={CRYPTO_BATCH}', ('warm', 'cold')),
+    ('predict_job', 'POST /api/predict/ETH/jobs?model=linear', ('warm', 'cold')),
+    ('stream_first_event', '/api/stream/prices?symbols=BTC', ('warm',)),
+]
+
+# Neural fits are slow; cold runs of these cases use fewer iterations
+SLOW_CASES = {'predict_lstm': 2, 'predictions_universe': 2}
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples) * 1000, q))
+
+
+def summarize(samples):
+    total = sum(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(1000 * total / len(samples), 3),
+        "min_ms": round(1000 * min(samples), 3),
+        "max_ms": round(1000 * max(samples), 3),
+        "throughput_per_s": round(len(samples) / total, 2) if total else None,
+    }
+
+
+def run_case(fn, iterations, reset=None, upstream=None):
+    """Time fn() iterations times; reset() runs untimed before each call."""
+    samples = []
+    calls_before = dict(upstream.calls) if upstream else {}
+    for _ in range(iterations):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    result = summarize(samples)
+    if upstream is not None:
+        result["upstream_calls"] = {provider: round((count - calls_before.get(provider, 0)) / iterations, 2)
+                                    for provider, count in upstream.calls.items()
+                                    if count != calls_before.get(provider, 0)}
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    try:
+        fn()
+        result["peak_mem_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+# -------- endpoints --------
+
+def reset_caches():
+    from app import history_cache
+    from services import bar_store
+    from services.indicators import indicator_book
+    from services.model_registry import model_registry
+    from services.quotes import quote_cache
+    from services.response_cache import response_cache
+
+    history_cache.invalidate()
+    response_cache.invalidate()
+    quote_cache.invalidate()
+    indicator_book.clear()
+    model_registry.clear()
+    for directory in (bar_store.BAR_STORE_DIR, model_registry.model_dir):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def endpoint_call(client, case, path):
+    method = 'get'
+    if path.startswith('POST '):
+        method, path = 'post', path[5:]
+
+    if case == 'stream_first_event':
+        def call():
+            response = client.get(path, buffered=False)
+            for chunk in response.response:
+                if (chunk.encode() if isinstance(chunk, str) else chunk).startswith(b'data:'):
+                    break
+            response.close()
+            return 200
+        return call
+
+    if case.endswith('_revalidate'):
+        # A client that already holds the body: conditional GET with its ETag
+        etag = client.get(path).headers['ETag']
+
+        def call():
+            response = client.get(path, headers={'If-None-Match': etag})
+            if response.status_code != 304:
+                raise RuntimeError(f"{path} -> {response.status_code}, expected 304")
+            return 304
+        return call
+
+    def call():
+        response = getattr(client, method)(path)
+        body = response.get_json(silent=True) or {}
+        # Async fits and job submissions: follow the job until the forecast is ready
+        while response.status_code in (200, 202) and 'status_url' in body and body.get('status') not in ('done', 'failed'):
+            time.sleep(0.005)
+            response = client.get(body['status_url'])
+            body = response.get_json(silent=True) or {}
+        if response.status_code >= 400 or body.get('status') == 'failed':
+            raise RuntimeError(f"{path} -> {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.status_code
+    return call
+
+
+def bench_endpoints(dataset, upstream, args):
+    import app
+
+    client = app.app.test_client()
+    results = []
+    for case, path, modes in ENDPOINTS:
+        for mode in modes:
+            if not selected(args, 'endpoint', case, mode):
+                continue
+            call = endpoint_call(client, case, path)
+            reset = reset_caches if mode == 'cold' else None
+            iterations = args.iterations if mode == 'warm' else SLOW_CASES.get(case, args.cold_iterations)
+            try:
+                if mode == 'warm':
+                    call()  # prime caches
+                result = run_case(call, iterations, reset, upstream)
+            except Exception as e:
+                result = {"error": str(e)}
+            results.append(record('endpoint', case, dataset, mode, result, path=path.replace('POST ', '')))
+            report(results[-1])
+    reset_caches()
+    return results
+
+
+# -------- service functions --------
+
+def dataset_frame(data, pair='BTCUSDT'):
+    """The fixture's kline series as the OHLCV frame the services work on."""
+    rows = np.array([r[:6] for r in data['binance'][pair]], dtype=float)
+    frame = pd.DataFrame(rows[:, 1:], columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+    frame.insert(0, 'Date', pd.to_datetime(rows[:, 0].astype(np.int64), unit='ms'))
+    return frame
+
+
+# Neural fits are capped to this many trailing bars so intraday runs stay bounded
+FIT_MAX_BARS = 2000
+
+
+def service_cases(frame, dataset):
+    from app import build_stock_payload, fetch_full_stock_data
+    from services.backtest import run_backtest
+    from services.indicators import IndicatorEngine
+    from services.prediction import (calculate_trading_signals, forecast_from_artifacts, predict_future_lstm,
+                                     prepare_data, train_linear_regression, train_lstm_model)
+
+    with_rsi = frame.copy()
+    delta = with_rsi['Close'].diff()
+    with_rsi['RSI'] = 100 - 100 / (1 + delta.clip(lower=0).rolling(14).mean() / (-delta.clip(upper=0)).rolling(14).mean())
+
+    fit_frame = frame.tail(FIT_MAX_BARS).reset_index(drop=True)
+    linear = train_linear_regression(frame)
+    lstm = {}
+
+    def lstm_artifacts():
+        if not lstm:
+            lstm['artifacts'] = train_lstm_model(fit_frame)
+        return lstm['artifacts']
+
+    engine = IndicatorEngine.from_frame(frame)
+    last = frame.iloc[-1]
+    ts = int(pd.Timestamp(last['Date']).value // 10**6)
+
+    return [
+        ('calculate_trading_signals', lambda: calculate_trading_signals(with_rsi), None, 1),
+        ('build_stock_payload', lambda: build_stock_payload(f"BENCH-{dataset}", frame.copy(), 'bench', None), None, 1),
+        ('indicator_engine_from_frame', lambda: IndicatorEngine.from_frame(frame), None, 1),
+        ('indicator_engine_update', lambda: engine.update(ts, last['Open'], last['High'], last['Low'],
+                                                          last['Close'], last['Volume']), None, 1),
+        ('run_backtest', lambda: run_backtest(frame), None, 1),
+        ('prepare_data', lambda: prepare_data(frame), None, 1),
+        ('train_linear_regression', lambda: train_linear_regression(frame), None, 1),
+        ('forecast_linear', lambda: forecast_from_artifacts('linear', linear, frame), None, 1),
+        ('train_lstm_model', lambda: train_lstm_model(fit_frame), None, 0.1),
+        ('predict_future_lstm', lambda: predict_future_lstm(*lstm_artifacts()), None, 1),
+        ('fetch_full_stock_data_warm', lambda: fetch_full_stock_data('BTC'), None, 1),
+        ('fetch_full_stock_data_cold', lambda: fetch_full_stock_data('BTC'), reset_caches, 0.25),
+    ]
+
+
+def bench_services(dataset, data, upstream, args):
+    frame = dataset_frame(data)
+    results = []
+    for case, fn, reset, scale in service_cases(frame, dataset):
+        if not selected(args, 'service', case, 'cold' if reset else 'warm'):
+            continue
+        iterations = max(2, int(args.iterations * scale))
+        try:
+            fn()
+            result = run_case(fn, iterations, reset, upstream)
+        except Exception as e:
+            result = {"error": str(e)}
+        result["bars"] = len(frame)
+        results.append(record('service', case, dataset, 'cold' if reset else 'warm', result))
+        report(results[-1])
+    return results
+
+
+# -------- reporting --------
+
+def record(kind, case, dataset, mode, result, **extra):
+    return {"kind": kind, "case": case, "dataset": dataset, "mode": mode, **extra, **result}
+
+
+def result_key(result):
+    return f"{result['kind']}:{result['case']}:{result['dataset']}:{result['mode']}"
+
+
+def selected(args, kind, case, mode):
+    name = f"{kind}:{case}:{mode}"
+    return not args.filter or any(f in name for f in args.filter)
+
+
+def report(result):
+    if 'error' in result:
+        print(f"  {result_key(result):<60} ERROR {result['error']}", file=sys.stderr)
+        return
+    print(f"  {result_key(result):<60} p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+          f"peak {result['peak_mem_kb']:>9.1f}KB", file=sys.stderr)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, new_path, threshold):
+    """Print per-case p50/p99/memory changes; returns the number of regressions."""
+    with open(base_path) as f:
+        base = {result_key(r): r for r in json.load(f)['results'] if 'error' not in r}
+    with open(new_path) as f:
+        new = {result_key(r): r for r in json.load(f)['results'] if 'error' not in r}
+
+    regressions = 0
+    print(f"{'case':<60} {'p50':>18} {'p99':>18} {'peak mem':>18}")
+    for key in sorted(base.keys() & new.keys()):
+        cells, regressed = [], False
+        for field in ('p50_ms', 'p99_ms', 'peak_mem_kb'):
+            old, cur = base[key][field], new[key][field]
+            change = (cur - old) / old if old else 0.0
+            regressed |= field == 'p50_ms' and change > threshold
+            cells.append(f"{cur:>9.2f} ({change:+6.1%})")
+        regressions += regressed
+        print(f"{key:<60} {' '.join(cells)}{'  REGRESSION' if regressed else ''}")
+    for key in sorted(base.keys() - new.keys()):
+        print(f"{key:<60} removed")
+    for key in sorted(new.keys() - base.keys()):
+        print(f"{key:<60} new")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark endpoints and services against replayed fixtures")
+    parser.add_argument('--dataset', action='append', choices=sorted(DATASETS),
+                        help="fixture dataset(s) to run (default: all)")
+    parser.add_argument('--filter', action='append', help="only run cases whose kind:case:mode contains this")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--cold-iterations', type=int, default=COLD_ITERATIONS)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="simulated latency per upstream call")
+    parser.add_argument('--skip-endpoints', action='store_true')
+    parser.add_argument('--skip-services', action='store_true')
+    parser.add_argument('--out', help="write JSON results here (default: stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="diff two result files and exit")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        return 1 if compare(*args.compare, args.threshold) else 0
+
+    # Service code logs with print(); keep stdout clean for the JSON output
+    warnings.filterwarnings('ignore', category=UserWarning)
+    started = time.time()
+    results, datasets = [], {}
+    try:
+        for dataset in args.dataset or list(DATASETS):
+            data = load_dataset(dataset)
+            datasets[dataset] = {"synthetic": data['synthetic'], "interval": data['interval'],
+                                 "bars": len(next(iter(data['binance'].values())))}
+            print(f"{dataset} ({'synthetic' if data['synthetic'] else 'recorded'} fixtures)", file=sys.stderr)
+            with ReplayUpstream(data, latency=args.latency_ms / 1000) as upstream, contextlib.redirect_stdout(sys.stderr):
+                if not args.skip_endpoints:
+                    results += bench_endpoints(dataset, upstream, args)
+                if not args.skip_services:
+                    results += bench_services(dataset, data, upstream, args)
+                reset_caches()
+    finally:
+        shutil.rmtree(_STATE_DIR, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started_at": started,
+            "duration_s": round(time.time() - started, 2),
+            "latency_ms": args.latency_ms,
+            "datasets": datasets,
+        },
+        "results": results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
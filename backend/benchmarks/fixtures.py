@@ -0,0 +1,188 @@
+"""
+Upstream fixtures for the benchmark suite.
+
+A fixture set is one gzipped JSON file per dataset holding raw upstream
+payloads exactly as the providers return them:
+
+    binance    {pair: [kline row, ...]}              /api/v3/klines rows
+    coingecko  {coin_id: {prices, total_volumes}}    /coins/{id}/market_chart
+    yfinance   {ticker: [[ts_ms, o, h, l, c, v]]}    Ticker.history() rows
+
+Record real payloads with
+
+    python benchmarks/fixtures.py record [--dataset 1y_daily]
+
+(needs network access). When a dataset has not been recorded, load_dataset()
+generates a deterministic synthetic one with the same shapes and marks it
+"synthetic" so results from the two are never compared by accident.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+FIXTURE_DIR = os.environ.get('BENCH_FIXTURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+
+# name -> (bar interval, number of bars)
+DATASETS = {
+    '1y_daily': ('1d', 365),
+    '5y_daily': ('1d', 5 * 365),
+    '1m_intraday': ('1m', 30 * 24 * 60),  # one month of minute bars
+}
+
+INTERVAL_MS = {'1m': 60_000, '1d': 86_400_000}
+
+CRYPTO = {'BTCUSDT': 'bitcoin', 'ETHUSDT': 'ethereum', 'PAXGUSDT': 'pax-gold'}
+TICKERS = ('AAPL', 'MSFT', 'IAU')
+
+START_PRICES = {'BTCUSDT': 40000.0, 'ETHUSDT': 2500.0, 'PAXGUSDT': 2000.0,
+                'AAPL': 180.0, 'MSFT': 350.0, 'IAU': 38.0}
+
+
+def fixture_path(dataset):
+    return os.path.join(FIXTURE_DIR, f"{dataset}.json.gz")
+
+
+# -------- synthetic --------
+
+def _ohlcv(name, interval, bars, end_ts):
+    """Seeded geometric random walk shaped like real OHLCV."""
+    rng = np.random.default_rng(sum(map(ord, name)) * 100003 + bars)
+    step = INTERVAL_MS[interval]
+    vol = 0.02 if interval == '1d' else 0.0008
+    returns = rng.normal(0.0002, vol, bars)
+    close = START_PRICES[name] * np.exp(np.cumsum(returns))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, vol, bars)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(10, 0.5, bars)
+    ts = end_ts - step * np.arange(bars - 1, -1, -1, dtype=np.int64)
+    return ts, open_, high, low, close, volume
+
+
+def synthesize(dataset):
+    interval, bars = DATASETS[dataset]
+    step = INTERVAL_MS[interval]
+    end_ts = (int(time.time() * 1000) // step) * step
+    data = {'dataset': dataset, 'interval': interval, 'synthetic': True,
+            'binance': {}, 'coingecko': {}, 'yfinance': {}}
+
+    for pair, coin_id in CRYPTO.items():
+        ts, o, h, l, c, v = _ohlcv(pair, interval, bars, end_ts)
+        data['binance'][pair] = [
+            [int(t), f"{o[i]:.8f}", f"{h[i]:.8f}", f"{l[i]:.8f}", f"{c[i]:.8f}", f"{v[i]:.8f}",
+             int(t) + step - 1, f"{v[i] * c[i]:.8f}", 1000, "0", "0", "0"]
+            for i, t in enumerate(ts)
+        ]
+        data['coingecko'][coin_id] = {
+            'prices': [[int(t), float(c[i])] for i, t in enumerate(ts)],
+            'total_volumes': [[int(t), float(v[i] * c[i])] for i, t in enumerate(ts)],
+        }
+
+    for ticker in TICKERS:
+        ts, o, h, l, c, v = _ohlcv(ticker, interval, bars, end_ts)
+        data['yfinance'][ticker] = [[int(t), float(o[i]), float(h[i]), float(l[i]), float(c[i]), float(v[i])]
+                                    for i, t in enumerate(ts)]
+    return data
+
+
+# -------- recording --------
+
+def _record_klines(pair, interval, bars):
+    from services.binance_api import BINANCE_BASE_URL, BINANCE_KLINES_MAX_LIMIT
+    from services.http_client import http_get
+
+    step = INTERVAL_MS[interval]
+    start = (int(time.time() * 1000) // step - bars) * step
+    rows = []
+    while len(rows) < bars:
+        response = http_get(f"{BINANCE_BASE_URL}/klines", endpoint='binance.klines', params={
+            'symbol': pair, 'interval': interval, 'limit': BINANCE_KLINES_MAX_LIMIT, 'startTime': start})
+        response.raise_for_status()
+        page = response.json()
+        if not page:
+            break
+        rows.extend(page)
+        start = page[-1][0] + 1
+    return rows[-bars:]
+
+
+def _record_market_chart(coin_id, bars):
+    from services.coingecko import COINGECKO_BASE_URL
+    from services.http_client import http_get
+
+    response = http_get(f"{COINGECKO_BASE_URL}/coins/{coin_id}/market_chart", endpoint='coingecko.market_chart',
+                        params={'vs_currency': 'usd', 'days': min(bars, 365), 'interval': 'daily'})
+    response.raise_for_status()
+    payload = response.json()
+    return {'prices': payload.get('prices', []), 'total_volumes': payload.get('total_volumes', [])}
+
+
+def _record_yfinance(ticker, interval, bars):
+    import yfinance as yf
+
+    if interval == '1m':
+        # Yahoo only serves 7 days of minute bars per request and 30 days in total
+        hist = yf.Ticker(ticker).history(period='1mo', interval='1m')
+    else:
+        hist = yf.Ticker(ticker).history(period=f"{max(1, round(bars / 365))}y")
+    hist = hist.tail(bars)
+    ts = hist.index.tz_convert('UTC').tz_localize(None).astype('datetime64[ms]').astype('int64')
+    return [[int(t), *map(float, row)] for t, row in zip(ts, hist[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy())]
+
+
+def record(dataset):
+    interval, bars = DATASETS[dataset]
+    data = {'dataset': dataset, 'interval': interval, 'synthetic': False,
+            'recorded_at': int(time.time()), 'binance': {}, 'coingecko': {}, 'yfinance': {}}
+    for pair, coin_id in CRYPTO.items():
+        data['binance'][pair] = _record_klines(pair, interval, bars)
+        if interval == '1d':
+            data['coingecko'][coin_id] = _record_market_chart(coin_id, bars)
+    for ticker in TICKERS:
+        data['yfinance'][ticker] = _record_yfinance(ticker, interval, bars)
+    save(data)
+    return data
+
+
+# -------- storage --------
+
+def save(data):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(data['dataset'])
+    with gzip.open(f"{path}.tmp", 'wt') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(f"{path}.tmp", path)
+
+
+def load_dataset(dataset):
+    """Recorded fixture for dataset if present, else a synthetic one."""
+    path = fixture_path(dataset)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt') as f:
+            return json.load(f)
+    return synthesize(dataset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or generate benchmark fixtures")
+    parser.add_argument('action', choices=['record', 'synthesize'])
+    parser.add_argument('--dataset', choices=sorted(DATASETS), action='append')
+    args = parser.parse_args()
+
+    for dataset in args.dataset or sorted(DATASETS):
+        data = record(dataset) if args.action == 'record' else synthesize(dataset)
+        if args.action == 'synthesize':
+            save(data)
+        print(f"{dataset}: {sum(len(v) for v in data['binance'].values())} klines, "
+              f"{sum(len(v) for v in data['yfinance'].values())} yfinance rows -> {fixture_path(dataset)}")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
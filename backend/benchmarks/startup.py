@@ -0,0 +1,67 @@
+"""
+Worker startup-time budget check.
+
+Imports the Flask app in fresh interpreters and fails if the median import
+time exceeds the budget, or if any lazily-loaded backend was imported eagerly.
+
+    python benchmarks/startup.py [--runs 5] [--budget 1.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 1.0))
+
+# Must not be imported just by loading the app
+LAZY_MODULES = ('yfinance', 'sklearn', 'tensorflow', 'tradingview_ta', 'joblib')
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "eager": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure(runs):
+    samples, eager = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        eager.update(result['eager'])
+    return samples, sorted(eager)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_SECONDS)
+    args = parser.parse_args()
+
+    samples, eager = measure(args.runs)
+    median = statistics.median(samples)
+    print(json.dumps({
+        "median_seconds": round(median, 4),
+        "max_seconds": round(max(samples), 4),
+        "budget_seconds": args.budget,
+        "eager_imports": eager,
+    }))
+
+    if eager:
+        print(f"FAIL: imported eagerly at startup: {', '.join(eager)}")
+        return 1
+    if median > args.budget:
+        print(f"FAIL: median startup {median:.3f}s exceeds budget {args.budget:.3f}s")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
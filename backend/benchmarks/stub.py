@@ -0,0 +1,252 @@
+"""
+Local stand-in for Binance, CoinGecko and yfinance that replays a fixture
+dataset (see fixtures.py).
+
+HTTP providers are replaced at the session layer: services/http_client
+looks sessions up by host, so installing a ReplaySession for a host routes
+every http_get to that host through the fixtures with no change to the
+service code. yfinance's Ticker and download are patched on the module.
+
+Timestamps are shifted so the last fixture bar is the current bar; the
+services' "last year" windows then see the whole recording.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+
+from benchmarks.fixtures import CRYPTO, INTERVAL_MS
+
+BINANCE_HOST = 'api.binance.com'
+COINGECKO_HOST = 'api.coingecko.com'
+
+
+class ReplayResponse:
+    def __init__(self, payload, status_code=200, url=''):
+        self._payload = payload
+        self.status_code = status_code
+        self.url = url
+        self.headers = {}
+
+    @property
+    def text(self):
+        return json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} replay error for {self.url}", response=self)
+
+
+class ReplaySession:
+    """requests.Session look-alike whose get() answers from fixtures."""
+
+    def __init__(self, upstream, handler):
+        self.upstream = upstream
+        self.handler = handler
+
+    def get(self, url, params=None, timeout=None):
+        self.upstream.hit(urlsplit(url).netloc)
+        status, payload = self.handler(urlsplit(url).path, dict(params or {}))
+        return ReplayResponse(payload, status, url)
+
+    def close(self):
+        pass
+
+
+class ReplayUpstream:
+    """
+    Replays one fixture dataset. latency is added to every upstream call
+    (seconds) to approximate network cost; calls counts them by provider.
+    """
+
+    def __init__(self, data, latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._saved = {}
+
+        step = INTERVAL_MS[data['interval']]
+        series = [rows[-1][0] for rows in list(data['binance'].values()) + list(data['yfinance'].values()) if rows]
+        now = (int(time.time() * 1000) // step) * step
+        shift = now - max(series) if series else 0
+
+        self.klines = {}
+        for pair, rows in data['binance'].items():
+            self.klines[pair] = [[r[0] + shift] + r[1:6] + [r[6] + shift] + r[7:] for r in rows]
+        self.kline_ts = {pair: np.array([r[0] for r in rows], dtype=np.int64) for pair, rows in self.klines.items()}
+
+        self.charts = {}
+        for coin_id, chart in data['coingecko'].items():
+            self.charts[coin_id] = {key: [[t + shift, v] for t, v in points] for key, points in chart.items()}
+        self.coin_pairs = {coin_id: pair for pair, coin_id in CRYPTO.items()}
+
+        self.frames = {}
+        for ticker, rows in data['yfinance'].items():
+            arr = np.array(rows, dtype=float).reshape(-1, 6)
+            index = pd.to_datetime(arr[:, 0].astype(np.int64) + shift, unit='ms', utc=True).tz_convert('America/New_York')
+            frame = pd.DataFrame(arr[:, 1:], columns=['Open', 'High', 'Low', 'Close', 'Volume'], index=index.rename('Date'))
+            frame['Dividends'] = 0.0
+            frame['Stock Splits'] = 0.0
+            self.frames[ticker] = frame
+
+    def hit(self, provider):
+        with self._lock:
+            self.calls[provider] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # -------- Binance --------
+
+    def binance(self, path, params):
+        if path.endswith('/klines'):
+            pair = params.get('symbol')
+            if pair not in self.klines:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            rows, ts = self.klines[pair], self.kline_ts[pair]
+            lo = int(np.searchsorted(ts, int(params['startTime']))) if 'startTime' in params else 0
+            hi = int(np.searchsorted(ts, int(params['endTime']), side='right')) if 'endTime' in params else len(rows)
+            limit = int(params.get('limit', 500))
+            window = rows[lo:hi]
+            return 200, window[:limit] if 'startTime' in params else window[-limit:]
+
+        if path.endswith('/ticker/price'):
+            if 'symbols' in params:
+                pairs = json.loads(params['symbols'])
+                return 200, [{'symbol': p, 'price': self.klines[p][-1][4]} for p in pairs if p in self.klines]
+            pair = params.get('symbol')
+            if pair not in self.klines:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            return 200, {'symbol': pair, 'price': self.klines[pair][-1][4]}
+
+        if path.endswith('/ticker/24hr'):
+            pair = params.get('symbol')
+            if pair not in self.klines:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            last = self.klines[pair][-1]
+            change = float(last[4]) - float(last[1])
+            return 200, {'lastPrice': last[4], 'priceChange': str(change),
+                         'priceChangePercent': str(100 * change / float(last[1])),
+                         'highPrice': last[2], 'lowPrice': last[3], 'volume': last[5], 'quoteVolume': last[7]}
+        if path.endswith('/exchangeInfo'):
+            return 200, {'symbols': [{'symbol': pair, 'baseAsset': pair[:-4], 'quoteAsset': 'USDT', 'status': 'TRADING'}
+                                     for pair in self.klines]}
+        return 404, {'code': -1, 'msg': f'No replay for {path}'}
+
+    # -------- CoinGecko --------
+
+    def coingecko(self, path, params):
+        parts = path.strip('/').split('/')  # api, v3, ...
+        if parts[-2:] == ['coins', 'list']:
+            return 200, [{'id': coin_id, 'symbol': pair[:-4].lower(), 'name': coin_id}
+                         for coin_id, pair in self.coin_pairs.items()]
+        if parts[-2:] == ['simple', 'price']:
+            result = {}
+            for coin_id in params.get('ids', '').split(','):
+                pair = self.coin_pairs.get(coin_id)
+                if pair in self.klines:
+                    last = self.klines[pair][-1]
+                    result[coin_id] = {'usd': float(last[4]), 'usd_24h_change': 0.0,
+                                       'usd_24h_vol': float(last[7]), 'last_updated_at': last[6] // 1000}
+            return 200, result
+        if len(parts) >= 4 and parts[-3] == 'coins' and parts[-1] == 'market_chart':
+            chart = self.charts.get(parts[-2])
+            if chart is None:
+                return 404, {'error': 'coin not found'}
+            days = int(params.get('days', 365))
+            return 200, {key: points[-days:] for key, points in chart.items()}
+        if len(parts) >= 3 and parts[-2] == 'coins':
+            coin_id = parts[-1]
+            if coin_id not in self.coin_pairs:
+                return 404, {'error': 'coin not found'}
+            return 200, {'name': coin_id.replace('-', ' ').title(), 'symbol': self.coin_pairs[coin_id][:-4].lower(),
+                         'description': {'en': f'{coin_id} replay fixture'}}
+        return 404, {'error': f'No replay for {path}'}
+
+    # -------- yfinance --------
+
+    PERIODS = {'d': lambda n: pd.Timedelta(days=n), 'mo': lambda n: pd.DateOffset(months=n),
+               'y': lambda n: pd.DateOffset(years=n)}
+
+    def _slice(self, ticker, period=None, start=None):
+        frame = self.frames.get(ticker)
+        if frame is None:
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        if start is not None:
+            # yfinance takes epoch seconds or an exchange-local date string
+            if isinstance(start, (int, np.integer)):
+                start = pd.Timestamp(int(start), unit='s', tz='UTC')
+            else:
+                start = pd.Timestamp(start, tz='America/New_York')
+            return frame[frame.index >= start].copy()
+        for suffix, offset in self.PERIODS.items():
+            if period and period.endswith(suffix) and period[:-len(suffix)].isdigit():
+                return frame[frame.index >= frame.index[-1] - offset(int(period[:-len(suffix)]))].copy()
+        return frame.copy()
+
+    def history(self, ticker, period=None, start=None, **kwargs):
+        self.hit('yfinance')
+        return self._slice(ticker, period, start)
+
+    def download(self, tickers, period=None, start=None, group_by='column', **kwargs):
+        if isinstance(tickers, str):
+            tickers = tickers.replace(',', ' ').split()
+        self.hit('yfinance')
+        frames = {t: self._slice(t, period, start).drop(columns=['Dividends', 'Stock Splits'])
+                  for t in tickers if t in self.frames}
+        if not frames:
+            return pd.DataFrame()
+        combined = pd.concat(frames, axis=1)
+        if group_by != 'ticker':
+            combined = combined.swaplevel(axis=1).sort_index(axis=1)
+        return combined
+
+    # -------- install --------
+
+    def install(self):
+        import yfinance
+        from services import http_client
+
+        with http_client._sessions_lock:
+            self._saved['sessions'] = dict(http_client._sessions)
+            http_client._sessions[BINANCE_HOST] = ReplaySession(self, self.binance)
+            http_client._sessions[COINGECKO_HOST] = ReplaySession(self, self.coingecko)
+
+        upstream = self
+
+        class ReplayTicker:
+            def __init__(self, ticker, *args, **kwargs):
+                self.ticker = ticker
+
+            def history(self, *args, **kwargs):
+                return upstream.history(self.ticker, *args, **kwargs)
+
+        self._saved['yfinance'] = (yfinance.Ticker, yfinance.download)
+        yfinance.Ticker = ReplayTicker
+        yfinance.download = self.download
+        return self
+
+    def uninstall(self):
+        import yfinance
+        from services import http_client
+
+        if 'sessions' in self._saved:
+            with http_client._sessions_lock:
+                http_client._sessions.clear()
+                http_client._sessions.update(self._saved.pop('sessions'))
+        if 'yfinance' in self._saved:
+            yfinance.Ticker, yfinance.download = self._saved.pop('yfinance')
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc):
+        self.uninstall()
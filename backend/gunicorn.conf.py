@@ -0,0 +1,29 @@
+import os
+import sys
+
+# Make the backend package importable from the hooks below
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Load the app once in the master and fork workers from it
+preload_app = True
+
+# Threaded workers so SSE streams and job polling don't each pin a whole worker.
+# Worker count comes from WEB_CONCURRENCY, which gunicorn reads natively.
+# An open price stream holds a thread, so app.py caps streams at half the
+# threads (STREAM_MAX_PER_WORKER) and the other half keep serving the API.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def when_ready(server):
+    # Runs in the master before workers are forked
+    from services.warmup import warm_up
+    timings = warm_up()
+    server.log.info("Warm-up imports: %s", ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+
+def post_fork(server, worker):
+    # Keep-alive sockets must not be shared between processes
+    from services.http_client import close_sessions
+    close_sessions()
@@ -0,0 +1,200 @@
+"""
+Deep-history Binance kline backfill into the local bar store.
+
+    python -m services.backfill BTC --interval 1d --start 2018-01-01
+    python -m services.backfill ETH --interval 1m --days 90
+
+The requested range is split into startTime/endTime pages of the per-request
+kline limit, fetched a few at a time at backfill priority (live requests
+keep their share of the rate limit), and merged into the same series the
+API reads (source 'binance', the app's symbol, interval).
+
+Pages are committed to the store in order, walking backwards from the
+oldest stored bar and forwards from the newest. An interrupted run keeps
+what it flushed and a re-run only fetches the ranges that are still
+missing, including any gaps inside the stored series.
+"""
+import argparse
+import contextvars
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bar_store import INTERVAL_MS, BAR_DTYPE, load_bars, append_bars, frame_to_bars
+from services.binance_api import get_binance_klines, BINANCE_KLINES_MAX_LIMIT, BINANCE_BACKFILL_CONCURRENCY
+from services.rate_limits import upstream_priority, PRIORITY_BACKFILL
+
+# Bars buffered in memory before they are merged into the store; each flush
+# rewrites the series file, so flushing per page would be quadratic.
+BACKFILL_FLUSH_BARS = int(os.environ.get('BACKFILL_FLUSH_BARS', 50_000))
+
+
+class BackfillError(Exception):
+    pass
+
+
+def missing_ranges(stored, start, end, step):
+    """
+    [(start, end, newest_first), ...] still to fetch: before and after the
+    stored bars, and every gap between them within [start, end]. The newest
+    stored bar is refetched since it may have been incomplete.
+
+    Bars Binance itself never produced (exchange outages) show up as gaps
+    too; refetching them costs one empty page per run.
+    """
+    if stored is None or len(stored) == 0:
+        return [(start, end, False)]
+    ts = stored['ts']
+    first, last = int(ts[0]), int(ts[-1])
+    ranges = []
+    if start < first:
+        ranges.append((start, first - step, True))
+    for gap in np.flatnonzero(np.diff(ts) > step):
+        gap_start, gap_end = max(int(ts[gap]) + step, start), min(int(ts[gap + 1]) - step, end)
+        if gap_start <= gap_end:
+            ranges.append((gap_start, gap_end, False))
+    if end >= last:
+        ranges.append((last, end, False))
+    return ranges
+
+
+def _pages(start, end, step, newest_first):
+    span = step * BINANCE_KLINES_MAX_LIMIT
+    pages = [(page_start, min(page_start + span - 1, end)) for page_start in range(start, end + 1, span)]
+    return pages[::-1] if newest_first else pages
+
+
+def _fetch_page(symbol, interval, start, end):
+    df = get_binance_klines(symbol, interval=interval, limit=BINANCE_KLINES_MAX_LIMIT, start_time=start, end_time=end)
+    if df is None:
+        raise BackfillError(f"klines {symbol} {interval} {start}-{end} failed")
+    return frame_to_bars(df)
+
+
+class _StoreWriter:
+    """Buffers committed pages and merges them into the store in batches."""
+
+    def __init__(self, symbol, interval, flush_bars):
+        self.symbol = symbol
+        self.interval = interval
+        self.flush_bars = flush_bars
+        self.buffer = []
+        self.buffered = 0
+        self.written = 0
+
+    def add(self, bars):
+        self.buffer.append(bars)
+        self.buffered += len(bars)
+        if self.buffered >= self.flush_bars:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        append_bars('binance', self.symbol, self.interval, np.concatenate(self.buffer))
+        self.written += self.buffered
+        self.buffer, self.buffered = [], 0
+
+
+def _run_range(pool, symbol, interval, pages, newest_first, concurrency, writer):
+    """Fetch pages with up to concurrency in flight, committing them in order."""
+    todo = iter(pages)
+    in_flight = deque()
+
+    def top_up():
+        while len(in_flight) < concurrency:
+            page = next(todo, None)
+            if page is None:
+                return
+            in_flight.append(pool.submit(contextvars.copy_context().run, _fetch_page, symbol, interval, *page))
+
+    top_up()
+    try:
+        while in_flight:
+            bars = in_flight.popleft().result()
+            top_up()
+            if len(bars):
+                writer.add(bars)
+            elif newest_first:
+                break  # walked back past the pair's listing date
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def backfill(symbol, interval='1d', start=None, end=None, concurrency=BINANCE_BACKFILL_CONCURRENCY,
+             flush_bars=BACKFILL_FLUSH_BARS):
+    """
+    Make the stored (binance, symbol, interval) series cover [start, end]
+    (epoch ms; end defaults to now). Returns a summary dict; 'complete' is
+    False if a page failed, in which case running it again resumes.
+    """
+    step = INTERVAL_MS[interval]
+    if end is None:
+        end = int(time.time() * 1000)
+    start = int(start) // step * step
+    ranges = missing_ranges(load_bars('binance', symbol, interval), start, int(end), step)
+
+    writer = _StoreWriter(symbol, interval, flush_bars)
+    error = None
+    started = time.perf_counter()
+    try:
+        with upstream_priority(PRIORITY_BACKFILL), ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for range_start, range_end, newest_first in ranges:
+                _run_range(pool, symbol, interval, _pages(range_start, range_end, step, newest_first),
+                           newest_first, concurrency, writer)
+    except BackfillError as e:
+        print(f"Backfill stopped: {e}")
+        error = str(e)
+    finally:
+        writer.flush()
+
+    stored = load_bars('binance', symbol, interval)
+    if stored is None:
+        stored = np.empty(0, dtype=BAR_DTYPE)
+    return {
+        'symbol': symbol,
+        'interval': interval,
+        'fetched_bars': writer.written,
+        'stored_bars': len(stored),
+        'first': pd.to_datetime(int(stored['ts'][0]), unit='ms').isoformat() if len(stored) else None,
+        'last': pd.to_datetime(int(stored['ts'][-1]), unit='ms').isoformat() if len(stored) else None,
+        'seconds': round(time.perf_counter() - started, 2),
+        'complete': error is None,
+        'error': error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill Binance kline history into the local bar store")
+    parser.add_argument('symbol', help="symbol as the API takes it, e.g. BTC")
+    parser.add_argument('--interval', default='1d', choices=list(INTERVAL_MS))
+    when = parser.add_mutually_exclusive_group(required=True)
+    when.add_argument('--start', help="first date to cover (YYYY-MM-DD, UTC)")
+    when.add_argument('--days', type=float, help="cover this many days back from now")
+    parser.add_argument('--end', help="last date to cover (YYYY-MM-DD, UTC; default now)")
+    parser.add_argument('--concurrency', type=int, default=BINANCE_BACKFILL_CONCURRENCY)
+    args = parser.parse_args()
+
+    end = int(pd.Timestamp(args.end, tz='UTC').value // 10**6) if args.end else int(time.time() * 1000)
+    if args.start:
+        start = int(pd.Timestamp(args.start, tz='UTC').value // 10**6)
+    else:
+        start = end - int(args.days * 86_400_000)
+
+    result = backfill(args.symbol.upper(), args.interval, start, end, concurrency=args.concurrency)
+    print(json.dumps(result, indent=2))
+    return 0 if result['complete'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from services.prediction import signal_params, rsi_series
+
+# Vectorized backtest of calculate_trading_signals. The RSI/EMA/MACD/Bollinger
+# consensus score is computed for every bar in one pass over the columns,
+# with the same formulas as latest_indicators/signals_from_indicators, and
+# each entry's stop-loss/take-profit exit is found by scanning a window of
+# the following bars as one 2-D array comparison. The only Python loop is
+# over the trades actually taken (one position at a time).
+
+# Bars a trade may stay open before it is closed at the bar's close
+DEFAULT_MAX_HOLD = 100
+# Entries are scanned for their exits this many at a time (bounds memory)
+EXIT_SCAN_BLOCK = 20000
+# calculate_trading_signals needs at least this many bars of history
+MIN_HISTORY = 20
+
+
+def _sign_points(buy, sell, strong_buy=None, strong_sell=None):
+    points = np.where(buy, 1, np.where(sell, -1, 0))
+    if strong_buy is not None:
+        points = np.where(strong_buy, 2, np.where(strong_sell, -2, points))
+    return points
+
+
+def signal_scores(df, params=None):
+    """
+    Consensus score (-6..6) of every bar, as calculate_trading_signals would
+    score it with that bar as the latest one. Returns an int array.
+    """
+    return score_arrays(df['Close'].to_numpy(dtype=float), params)
+
+
+def indicator_arrays(close, params=None):
+    """
+    The indicators the signal rules read, for every bar. close is 1-D, or
+    2-D with one column per symbol (bars x symbols) to evaluate a whole
+    universe at once; leading NaNs pad shorter series. Returns a dict of
+    arrays shaped like close.
+    """
+    p = signal_params(params)
+    c = np.asarray(close, dtype=float)
+    close = pd.Series(c) if c.ndim == 1 else pd.DataFrame(c)
+
+    macd = close.ewm(span=p['macd_fast'], adjust=False).mean() - close.ewm(span=p['macd_slow'], adjust=False).mean()
+    macd_sig = macd.ewm(span=p['macd_signal'], adjust=False).mean()
+    return {
+        'close': c,
+        'rsi': rsi_series(close, p['rsi_period']).to_numpy(),
+        'ema_fast': close.ewm(span=p['ema_fast'], adjust=False).mean().to_numpy(),
+        'ema_slow': close.ewm(span=p['ema_slow'], adjust=False).mean().to_numpy(),
+        'macd': macd.to_numpy(),
+        'macd_signal': macd_sig.to_numpy(),
+        'prev_macd': macd.shift(1).to_numpy(),
+        'prev_macd_signal': macd_sig.shift(1).to_numpy(),
+        'bb_mid': close.rolling(p['bb_period']).mean().to_numpy(),
+        'bb_band': close.rolling(p['bb_period']).std().to_numpy() * p['bb_std'],
+    }
+
+
+def rule_points(ind, params=None):
+    """Points (-2..2) each rule gives every bar: {'rsi', 'ma', 'macd', 'bb'}."""
+    p = signal_params(params)
+    rsi, macd, macd_sig = ind['rsi'], ind['macd'], ind['macd_signal']
+    # NaN comparisons are False, i.e. NEUTRAL, just like the scalar rules
+    return {
+        'rsi': _sign_points(rsi < p['rsi_buy'], rsi > p['rsi_sell']),
+        'ma': _sign_points(ind['ema_fast'] > ind['ema_slow'], ind['ema_fast'] < ind['ema_slow']),
+        'macd': _sign_points(macd > macd_sig, macd < macd_sig,
+                             (macd > macd_sig) & (ind['prev_macd'] <= ind['prev_macd_signal']),
+                             (macd < macd_sig) & (ind['prev_macd'] >= ind['prev_macd_signal'])),
+        'bb': np.where(ind['close'] <= ind['bb_mid'] - ind['bb_band'], 2,
+                       np.where(ind['close'] >= ind['bb_mid'] + ind['bb_band'], -2, 0)),
+    }
+
+
+def score_arrays(close, params=None):
+    """signal_scores on a plain close-price array (1-D, or bars x symbols)."""
+    points = rule_points(indicator_arrays(close, params), params)
+    return points['rsi'] + points['ma'] + points['macd'] + points['bb']
+
+
+def trade_levels(high, low, close, direction, strategy="day_trading", params=None):
+    """
+    Stop-loss and take-profit for entering at every bar's close in direction
+    (+1 long, -1 short, scalar or per bar), per the risk rules of
+    signals_from_indicators.
+    """
+    p = signal_params(params)
+    if strategy == "scalping_xau":
+        sl = close - direction * p['scalp_sl']
+        tp = close + direction * p['scalp_tp']
+        return sl, tp
+
+    atr = pd.Series(high - low).rolling(p['atr_period']).mean().to_numpy()
+    support = pd.Series(low).rolling(10, min_periods=1).min().to_numpy()
+    resistance = pd.Series(high).rolling(10, min_periods=1).max().to_numpy()
+
+    long_sl = np.where(close - support < 2 * atr, support, close - 1.5 * atr)
+    short_sl = np.where(resistance - close < 2 * atr, resistance, close + 1.5 * atr)
+    sl = np.where(direction > 0, long_sl, short_sl)
+    risk = (close - sl) * direction
+    risk = np.where(risk <= 0, atr * 0.5, risk)
+    tp = close + direction * 2 * risk
+    return sl, tp
+
+
+def _find_exits(entries, direction, sl, tp, high, low, close, max_hold):
+    """
+    Exit bar and price of each entry: the first later bar whose range
+    touches the stop or target (the stop wins if a bar touches both), else
+    the close max_hold bars later or at the end of the data.
+    """
+    n = len(close)
+    pad = np.full(max_hold, np.nan)
+    high_windows = sliding_window_view(np.r_[high[1:], pad], max_hold)
+    low_windows = sliding_window_view(np.r_[low[1:], pad], max_hold)
+
+    exit_idx = np.empty(len(entries), dtype=np.int64)
+    exit_price = np.empty(len(entries))
+    exit_reason = np.empty(len(entries), dtype='<U7')
+
+    for lo in range(0, len(entries), EXIT_SCAN_BLOCK):
+        idx = entries[lo:lo + EXIT_SCAN_BLOCK]
+        d = direction[idx][:, None]
+        stop, target = sl[idx][:, None], tp[idx][:, None]
+        highs, lows = high_windows[idx], low_windows[idx]
+
+        # For a long the stop is below (touched by the low), for a short above
+        hit_sl = np.where(d > 0, lows <= stop, highs >= stop)
+        hit_tp = np.where(d > 0, highs >= target, lows <= target)
+        first_sl = np.where(hit_sl.any(axis=1), hit_sl.argmax(axis=1), max_hold)
+        first_tp = np.where(hit_tp.any(axis=1), hit_tp.argmax(axis=1), max_hold)
+        timeout = np.minimum(max_hold, n - 1 - idx) - 1
+
+        offset = np.minimum(np.minimum(first_sl, first_tp), timeout)
+        exit_idx[lo:lo + len(idx)] = idx + 1 + offset
+        by_sl = first_sl <= np.minimum(first_tp, timeout)
+        by_tp = ~by_sl & (first_tp <= timeout)
+        exit_price[lo:lo + len(idx)] = np.where(by_sl, sl[idx], np.where(by_tp, tp[idx], close[idx + 1 + offset]))
+        exit_reason[lo:lo + len(idx)] = np.where(by_sl, 'stop', np.where(by_tp, 'target', 'timeout'))
+    return exit_idx, exit_price, exit_reason
+
+
+def simulate(high, low, close, score, sl, tp, min_score=1, max_hold=DEFAULT_MAX_HOLD, fee_bps=0.0,
+             allow_short=True, first_bar=MIN_HISTORY - 1):
+    """
+    Enter at the close of a bar (from first_bar on) whose score is >=
+    min_score (long) or <= -min_score (short, if allowed), exit on
+    stop/target/timeout, one position at a time. sl/tp are the per-bar
+    long levels where score > 0 and short levels where score < 0.
+    Returns a dict of per-trade arrays.
+    """
+    n = len(close)
+    direction = np.where(score >= min_score, 1, np.where(score <= -min_score, -1, 0))
+    if not allow_short:
+        direction[direction < 0] = 0
+    direction[:first_bar] = 0
+    direction[n - 1:] = 0  # no bar left to exit on
+    direction[~(np.isfinite(sl) & np.isfinite(tp))] = 0
+
+    candidates = np.flatnonzero(direction)
+    exit_idx, exit_price, exit_reason = _find_exits(candidates, direction, sl, tp, high, low, close, max_hold)
+
+    # One position at a time: from each taken trade jump to the first candidate after its exit
+    taken = []
+    pos = 0
+    while pos < len(candidates):
+        taken.append(pos)
+        pos = int(np.searchsorted(candidates, exit_idx[pos], side='right'))
+    taken = np.asarray(taken, dtype=np.int64)
+
+    entry = candidates[taken]
+    side = direction[entry]
+    returns = side * (exit_price[taken] - close[entry]) / close[entry] - 2 * fee_bps / 10_000
+    return {
+        'entry': entry,
+        'exit': exit_idx[taken],
+        'side': side,
+        'exit_price': exit_price[taken],
+        'exit_reason': exit_reason[taken],
+        'return': returns,
+    }
+
+
+def trade_stats(trades, bars):
+    """Summary statistics of a simulate() result over a span of bars."""
+    returns = trades['return']
+    equity = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(np.r_[1.0, equity])
+    drawdown = 1 - np.r_[1.0, equity] / peak
+    wins = returns > 0
+    gross_loss = -returns[~wins].sum()
+    count = len(returns)
+    return {
+        'bars': int(bars),
+        'trades': int(count),
+        'long_trades': int((trades['side'] > 0).sum()),
+        'short_trades': int((trades['side'] < 0).sum()),
+        'win_rate': float(wins.mean()) if count else None,
+        'total_return': float(equity[-1] - 1) if count else 0.0,
+        'max_drawdown': float(drawdown.max()),
+        'avg_trade_return': float(returns.mean()) if count else None,
+        # Per-trade mean over standard deviation, scaled by sqrt(trades)
+        'sharpe': float(returns.mean() / returns.std() * np.sqrt(count)) if count > 1 and returns.std() > 0 else None,
+        'profit_factor': float(returns[wins].sum() / gross_loss) if gross_loss > 0 else None,
+        'exposure': float((trades['exit'] - trades['entry']).sum() / bars) if bars else 0.0,
+        'exits': {reason: int((trades['exit_reason'] == reason).sum()) for reason in ('stop', 'target', 'timeout')},
+    }
+
+
+def prepare_levels(high, low, close, score, strategy="day_trading", params=None):
+    """Per-bar SL/TP for the direction each bar's score points in."""
+    long_sl, long_tp = trade_levels(high, low, close, 1, strategy, params)
+    short_sl, short_tp = trade_levels(high, low, close, -1, strategy, params)
+    sl = np.where(score < 0, short_sl, long_sl)
+    tp = np.where(score < 0, short_tp, long_tp)
+    return sl, tp
+
+
+def run_backtest(df, strategy="day_trading", min_score=1, max_hold=DEFAULT_MAX_HOLD, fee_bps=0.0, allow_short=True,
+                 params=None):
+    """
+    Backtest the signals over df (see simulate). Returns (summary, trades,
+    equity) where trades and equity are DataFrames; equity is the
+    compounded balance after each exit.
+    """
+    df = df.reset_index(drop=True)
+    n = len(df)
+    high = df['High'].to_numpy(dtype=float)
+    low = df['Low'].to_numpy(dtype=float)
+    close = df['Close'].to_numpy(dtype=float)
+
+    score = score_arrays(close, params)
+    sl, tp = prepare_levels(high, low, close, score, strategy, params)
+    result = simulate(high, low, close, score, sl, tp, min_score, max_hold, fee_bps, allow_short)
+
+    entry, exit_idx = result['entry'], result['exit']
+    dates = pd.to_datetime(df['Date']) if 'Date' in df.columns else pd.Series(np.arange(n))
+    trades = pd.DataFrame({
+        'entry_date': dates.to_numpy()[entry],
+        'exit_date': dates.to_numpy()[exit_idx],
+        'side': np.where(result['side'] > 0, 'long', 'short'),
+        'score': score[entry],
+        'entry_price': close[entry],
+        'stop_loss': sl[entry],
+        'take_profit': tp[entry],
+        'exit_price': result['exit_price'],
+        'exit_reason': result['exit_reason'],
+        'bars_held': exit_idx - entry,
+        'return': result['return'],
+    })
+    equity_curve = pd.DataFrame({'date': trades['exit_date'], 'equity': np.cumprod(1 + result['return'])})
+    return trade_stats(result, n), trades, equity_curve
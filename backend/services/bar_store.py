@@ -0,0 +1,296 @@
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Local OHLCV store: one memory-mapped .npy file per (source, symbol, interval).
+# The fetch layer reads the stored bars first and only asks upstream for the
+# tail that is missing, so restarts come up warm and repeat fetches are small.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', os.path.join(BASE_DIR, 'data', 'bars'))
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),  # bar open time, epoch milliseconds (UTC)
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# Bar length by interval name (Binance's interval codes), in milliseconds
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '2h': 2 * 3_600_000,
+    '4h': 4 * 3_600_000,
+    '6h': 6 * 3_600_000,
+    '8h': 8 * 3_600_000,
+    '12h': 12 * 3_600_000,
+    '1d': 86_400_000,
+    '1w': 7 * 86_400_000,
+}
+
+# Float type of the in-memory Bars columns. float32 halves the memory per
+# cached series at the cost of ~7 significant digits in returned prices.
+BAR_FLOAT_DTYPE = np.dtype(os.environ.get('BAR_FLOAT_DTYPE', 'float64'))
+BAR_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _file_locks_guard:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = threading.Lock()
+        return lock
+
+
+def bar_path(source, symbol, interval):
+    name = re.sub(r'[^A-Za-z0-9_.=-]', '_', f"{source}_{symbol}_{interval}".upper())
+    return os.path.join(BAR_STORE_DIR, f"{name}.npy")
+
+
+def load_bars(source, symbol, interval):
+    """Return stored bars as a read-only memory-mapped array, or None."""
+    path = bar_path(source, symbol, interval)
+    if not os.path.exists(path):
+        return None
+    try:
+        bars = np.load(path, mmap_mode='r')
+        if bars.dtype != BAR_DTYPE:
+            return None
+        return bars
+    except Exception as e:
+        print(f"Bar store read error ({path}): {e}")
+        return None
+
+
+def save_bars(source, symbol, interval, bars):
+    """Atomically replace the stored bars for a series."""
+    path = bar_path(source, symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Bar store write error ({path}): {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def merge_bars(existing, new):
+    """Combine two bar arrays, keeping the newer copy of any duplicate timestamp."""
+    if existing is None or len(existing) == 0:
+        merged = np.asarray(new, dtype=BAR_DTYPE)
+    elif new is None or len(new) == 0:
+        return np.asarray(existing, dtype=BAR_DTYPE)
+    else:
+        merged = np.concatenate([np.asarray(existing, dtype=BAR_DTYPE), np.asarray(new, dtype=BAR_DTYPE)])
+    # np.unique keeps the first occurrence, so search the reversed array
+    # to prefer bars from `new` over the stored copy.
+    reversed_ts = merged['ts'][::-1]
+    _, idx = np.unique(reversed_ts, return_index=True)
+    return merged[::-1][idx]
+
+
+def append_bars(source, symbol, interval, bars):
+    """Merge bars into the stored series (duplicates replaced) and return the stored length."""
+    path = bar_path(source, symbol, interval)
+    with _lock_for(path):
+        merged = merge_bars(load_bars(source, symbol, interval), bars)
+        save_bars(source, symbol, interval, merged)
+    return len(merged)
+
+
+def frame_to_bars(df):
+    """Convert a history DataFrame (Date + OHLCV columns) to a bar array."""
+    if df is None or df.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    dates = pd.to_datetime(df['Date'], utc=True)
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['ts'] = dates.astype('datetime64[ms, UTC]').astype('int64').to_numpy()
+    bars['open'] = df['Open'].to_numpy(dtype=float)
+    bars['high'] = df['High'].to_numpy(dtype=float)
+    bars['low'] = df['Low'].to_numpy(dtype=float)
+    bars['close'] = df['Close'].to_numpy(dtype=float)
+    bars['volume'] = df['Volume'].to_numpy(dtype=float)
+    return bars
+
+
+def bars_to_frame(bars):
+    """Convert a bar array back to the DataFrame shape the API layer expects."""
+    return pd.DataFrame({
+        'Date': pd.to_datetime(bars['ts'], unit='ms'),
+        'Open': np.array(bars['open']),
+        'High': np.array(bars['high']),
+        'Low': np.array(bars['low']),
+        'Close': np.array(bars['close']),
+        'Volume': np.array(bars['volume']),
+    })
+
+
+class Bars:
+    """
+    Compact in-memory OHLCV series: int64 epoch-ms open times and one
+    contiguous float array per field, nothing else. Columns are read-only,
+    and slicing or column access returns views, so one cached instance can
+    be shared by every reader; to_frame() makes the mutable DataFrame the
+    API layer works on.
+    """
+    __slots__ = ('ts', 'open', 'high', 'low', 'close', 'volume')
+    columns = ('Date',) + BAR_FIELDS
+
+    def __init__(self, ts, open, high, low, close, volume, dtype=BAR_FLOAT_DTYPE):
+        self.ts = self._freeze(ts, np.int64)
+        self.open = self._freeze(open, dtype)
+        self.high = self._freeze(high, dtype)
+        self.low = self._freeze(low, dtype)
+        self.close = self._freeze(close, dtype)
+        self.volume = self._freeze(volume, dtype)
+
+    @staticmethod
+    def _freeze(values, dtype):
+        # Always a private copy, so no caller can change the shared columns
+        values = np.array(values, dtype=dtype, order='C')
+        values.flags.writeable = False
+        return values
+
+    @classmethod
+    def from_records(cls, bars, dtype=BAR_FLOAT_DTYPE):
+        """From a bar store array (BAR_DTYPE records)."""
+        return cls(bars['ts'], bars['open'], bars['high'], bars['low'], bars['close'], bars['volume'], dtype)
+
+    @classmethod
+    def from_frame(cls, df, dtype=BAR_FLOAT_DTYPE):
+        """From a history DataFrame; any columns besides Date and OHLCV are dropped."""
+        if df is None or df.empty:
+            return cls(*([np.empty(0)] * 6), dtype=dtype)
+        dates = pd.to_datetime(df['Date'], utc=True)
+        ts = dates.astype('datetime64[ms, UTC]').astype('int64').to_numpy()
+        volume = df['Volume'].to_numpy(dtype=float) if 'Volume' in df.columns else np.zeros(len(df))
+        return cls(ts, df['Open'].to_numpy(dtype=float), df['High'].to_numpy(dtype=float),
+                   df['Low'].to_numpy(dtype=float), df['Close'].to_numpy(dtype=float), volume, dtype)
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def empty(self):
+        return len(self.ts) == 0
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    @property
+    def dates(self):
+        """Bar open times as a naive UTC DatetimeIndex."""
+        return pd.to_datetime(self.ts, unit='ms')
+
+    def __getitem__(self, key):
+        """bars['Close'] is a zero-copy Series over the column; bars[a:b] a Bars of views."""
+        if isinstance(key, slice):
+            view = object.__new__(Bars)
+            for name in self.__slots__:
+                setattr(view, name, getattr(self, name)[key])
+            return view
+        if key == 'Date':
+            return pd.Series(self.dates, name='Date')
+        if key in BAR_FIELDS:
+            return pd.Series(getattr(self, key.lower()), name=key, copy=False)
+        raise KeyError(key)
+
+    def tail(self, n):
+        return self[max(len(self) - n, 0):]
+
+    def to_frame(self):
+        """A new DataFrame (Date + float64 OHLCV) the caller may modify."""
+        return pd.DataFrame({
+            'Date': self.dates,
+            'Open': self.open.astype(float),
+            'High': self.high.astype(float),
+            'Low': self.low.astype(float),
+            'Close': self.close.astype(float),
+            'Volume': self.volume.astype(float),
+        })
+
+    def to_records(self):
+        """Bar store array (BAR_DTYPE records) of the same bars."""
+        records = np.empty(len(self), dtype=BAR_DTYPE)
+        for name in self.__slots__:
+            records[name] = getattr(self, name)
+        return records
+
+
+def resample_bars(bars, interval):
+    """
+    Aggregate time-ordered bars into interval buckets aligned to multiples of
+    the interval since the epoch (UTC), the way Binance aligns its klines.
+    A trailing bucket that is still filling is returned as a partial bar.
+    """
+    bars = np.asarray(bars, dtype=BAR_DTYPE)
+    if len(bars) == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+    step = INTERVAL_MS[interval]
+    buckets = bars['ts'] // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), dtype=BAR_DTYPE)
+    out['ts'] = buckets[starts]
+    out['open'] = bars['open'][starts]
+    out['high'] = np.maximum.reduceat(bars['high'], starts)
+    out['low'] = np.minimum.reduceat(bars['low'], starts)
+    out['close'] = bars['close'][ends]
+    out['volume'] = np.add.reduceat(bars['volume'], starts)
+    return out
+
+
+def sync_bars(source, symbol, interval, fetch_since, max_bars=None, min_ts=None):
+    """
+    Bring the stored series up to date and return it as a DataFrame.
+
+    fetch_since(last_ts) is called with the open time (epoch ms) of the last
+    stored bar, or None when nothing is stored yet, and must return a history
+    DataFrame covering that bar onwards. The last stored bar is always
+    refetched because it may have been incomplete when it was saved.
+
+    If upstream fails, whatever is already stored is returned. max_bars and
+    min_ts (epoch ms) trim the returned window; the store keeps everything.
+    """
+    path = bar_path(source, symbol, interval)
+    with _lock_for(path):
+        stored = load_bars(source, symbol, interval)
+        last_ts = int(stored['ts'][-1]) if stored is not None and len(stored) else None
+
+        try:
+            fresh = fetch_since(last_ts)
+        except Exception as e:
+            print(f"Bar store upstream error ({symbol} {interval}): {e}")
+            fresh = None
+
+        new_bars = frame_to_bars(fresh)
+        if len(new_bars):
+            merged = merge_bars(stored, new_bars)
+            save_bars(source, symbol, interval, merged)
+        elif stored is not None and len(stored):
+            merged = stored
+        else:
+            return None
+
+    if min_ts is not None:
+        merged = merged[merged['ts'] >= min_ts]
+    if max_bars is not None:
+        merged = merged[-max_bars:]
+    return bars_to_frame(merged)
@@ -1,44 +1,56 @@
-import requests
+import contextvars
+import json
+import os
 import pandas as pd
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import time
 
+from services.bar_store import INTERVAL_MS
+from services.http_client import http_get
+from services.symbols import symbol_index
+
 # Binance Public API Endpoints
 BINANCE_BASE_URL = "https://api.binance.com/api/v3"
 
-def get_binance_klines(symbol, interval='1d', limit=500):
+# Largest page Binance will return from /klines
+BINANCE_KLINES_MAX_LIMIT = 1000
+# Pages of a long kline range fetched at once (each page is 5 request weight)
+BINANCE_BACKFILL_CONCURRENCY = int(os.environ.get('BINANCE_BACKFILL_CONCURRENCY', 4))
+
+def get_binance_klines(symbol, interval='1d', limit=500, start_time=None, end_time=None):
     """
     Fetch historical k-line (candlestick) data from Binance.
+    start_time / end_time are optional epoch-millisecond bounds.
     """
     try:
-        # Binance expects pairs like BTCUSDT
-        # Ensure symbol is correct format
-        clean_symbol = symbol.upper().replace("-", "").replace("/", "")
-        if not clean_symbol.endswith('USDT'):
-             # If just BTC, append USDT
-             clean_symbol += 'USDT'
-             
+        # Binance expects pairs like BTCUSDT; skip symbols it does not list
+        clean_symbol = symbol_index.binance_pair(symbol)
+        if clean_symbol is None:
+            return None
+
         url = f"{BINANCE_BASE_URL}/klines"
         params = {
             'symbol': clean_symbol,
             'interval': interval,
             'limit': limit
         }
+        if start_time is not None:
+            params['startTime'] = int(start_time)
+        if end_time is not None:
+            params['endTime'] = int(end_time)
         
-        response = requests.get(url, params=params, timeout=5)
+        response = http_get(url, params=params, endpoint='binance.klines')
         response.raise_for_status()
         data = response.json()
         
         # Binance returns list of lists:
         # [Open time, Open, High, Low, Close, Volume, Close time, ...]
-        df = pd.DataFrame(data, columns=[
-            'Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume', 
-            'Close_time', 'Quote_asset_val', 'Num_trades', 'Taker_buy_base', 'Taker_buy_quote', 'Ignore'
-        ])
-        
+        # Only the open time and OHLCV are kept; the other six fields are unused.
+        df = pd.DataFrame([row[:6] for row in data], columns=['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
+
         # Convert timestamp to date
         df['Date'] = pd.to_datetime(df['Timestamp'], unit='ms')
-        
+
         # Convert numeric columns
         for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
             df[col] = pd.to_numeric(df[col], errors='coerce')
@@ -48,19 +60,64 @@ def get_binance_klines(symbol, interval='1d', limit=500):
         print(f"Binance Klines Error: {e}")
         return None
 
+def get_binance_klines_range(symbol, start_time, end_time=None, interval='1d'):
+    """
+    Fetch every kline opening in [start_time, end_time] (epoch ms; end
+    defaults to now). The range is split into pages of the per-request
+    limit that are fetched in parallel, then de-duplicated and ordered.
+
+    If a page fails, only the bars before it are returned so callers that
+    resume from the last bar they got never leave a gap behind.
+    Returns None if the first page fails.
+    """
+    step = INTERVAL_MS[interval]
+    if end_time is None:
+        end_time = int(time.time() * 1000)
+    page_span = step * BINANCE_KLINES_MAX_LIMIT
+    starts = list(range(int(start_time), int(end_time) + 1, page_span)) or [int(start_time)]
+
+    def fetch_page(page_start):
+        return get_binance_klines(symbol, interval=interval, limit=BINANCE_KLINES_MAX_LIMIT,
+                                  start_time=page_start, end_time=min(page_start + page_span - 1, end_time))
+
+    if len(starts) == 1:
+        pages = [fetch_page(starts[0])]
+    else:
+        # Each page runs in a copy of the caller's context (rate-limit priority, timing spans)
+        with ThreadPoolExecutor(max_workers=min(BINANCE_BACKFILL_CONCURRENCY, len(starts))) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fetch_page, page_start) for page_start in starts]
+            pages = [future.result() for future in futures]
+
+    complete = []
+    for page in pages:
+        if page is None:
+            break
+        complete.append(page)
+    if not complete:
+        return None
+    df = pd.concat(complete, ignore_index=True)
+    return df.drop_duplicates('Timestamp', keep='last').sort_values('Timestamp').reset_index(drop=True)
+
+def get_binance_klines_since(symbol, start_time, interval='1d'):
+    """
+    Fetch every kline from start_time (epoch ms) up to now, paging through
+    Binance's per-request limit. Returns None if the first page fails.
+    """
+    return get_binance_klines_range(symbol, start_time, interval=interval)
+
 def get_binance_price(symbol):
     """
     Fetch current price from Binance
     """
     try:
-        clean_symbol = symbol.upper().replace("-", "").replace("/", "")
-        if not clean_symbol.endswith('USDT'):
-             clean_symbol += 'USDT'
-             
+        clean_symbol = symbol_index.binance_pair(symbol)
+        if clean_symbol is None:
+            return None
+
         url = f"{BINANCE_BASE_URL}/ticker/price"
         params = {'symbol': clean_symbol}
         
-        response = requests.get(url, params=params, timeout=3)
+        response = http_get(url, params=params, endpoint='binance.price')
         response.raise_for_status()
         data = response.json()
         
@@ -69,19 +126,42 @@ def get_binance_price(symbol):
         print(f"Binance Price Error: {e}")
         return None
 
+def get_binance_prices(symbols):
+    """
+    Fetch current prices for many symbols with one /ticker/price call.
+    Returns {symbol: price} keyed by the symbols passed in; raises if the
+    call fails, so a failure is not mistaken for unlisted symbols.
+    """
+    pairs = {}
+    for symbol in symbols:
+        clean_symbol = symbol_index.binance_pair(symbol)
+        if clean_symbol is not None:
+            pairs[clean_symbol] = symbol
+    if not pairs:
+        return {}
+
+    url = f"{BINANCE_BASE_URL}/ticker/price"
+    params = {'symbols': json.dumps(sorted(pairs), separators=(',', ':'))}
+
+    response = http_get(url, params=params, endpoint='binance.price')
+    response.raise_for_status()
+    data = response.json()
+
+    return {pairs[item['symbol']]: float(item['price']) for item in data if item.get('symbol') in pairs}
+
 def get_binance_24hr_stats(symbol):
     """
     Fetch 24hr ticker stats
     """
     try:
-        clean_symbol = symbol.upper().replace("-", "").replace("/", "")
-        if not clean_symbol.endswith('USDT'):
-             clean_symbol += 'USDT'
-             
+        clean_symbol = symbol_index.binance_pair(symbol)
+        if clean_symbol is None:
+            return None
+
         url = f"{BINANCE_BASE_URL}/ticker/24hr"
         params = {'symbol': clean_symbol}
         
-        response = requests.get(url, params=params, timeout=3)
+        response = http_get(url, params=params, endpoint='binance.24hr')
         response.raise_for_status()
         data = response.json()
         
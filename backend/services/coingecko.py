@@ -1,48 +1,21 @@
-import requests
-from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 
+from services.http_client import http_get
+from services.symbols import symbol_index
+# CRYPTO_ID_MAP used to live here; re-exported so existing imports keep working
+from services.symbols import CRYPTO_ID_MAP  # noqa: F401
+
 # CoinGecko API endpoints (free tier, no API key needed)
 COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
 
-# Mapping of common crypto symbols to CoinGecko IDs
-CRYPTO_ID_MAP = {
-    'BTC': 'bitcoin',
-    'ETH': 'ethereum',
-    'SOL': 'solana',
-    'ADA': 'cardano',
-    'DOT': 'polkadot',
-    'DOGE': 'dogecoin',
-    'MATIC': 'matic-network',
-    'LINK': 'chainlink',
-    'UNI': 'uniswap',
-    'AVAX': 'avalanche-2',
-    'XRP': 'ripple',
-    'LTC': 'litecoin',
-    'BCH': 'bitcoin-cash',
-    'ATOM': 'cosmos',
-    'XLM': 'stellar',
-    'ALGO': 'algorand',
-    'VET': 'vechain',
-    'FIL': 'filecoin',
-    'TRX': 'tron',
-    'TRX': 'tron',
-    'ETC': 'ethereum-classic',
-    'XAUUSD': 'tether-gold', # Map Gold to Tether Gold (XAUt)
-    'GOLD': 'tether-gold',
-    'PAXG': 'pax-gold',
-    'XAUt': 'tether-gold'
-}
-
 def is_crypto_symbol(symbol):
     """Check if symbol is a known cryptocurrency."""
-    base_symbol = symbol.replace('-USD', '').upper()
-    return base_symbol in CRYPTO_ID_MAP
+    return symbol_index.is_crypto(symbol)
 
 def get_coingecko_id(symbol):
     """Get CoinGecko ID from symbol."""
-    base_symbol = symbol.replace('-USD', '').upper()
-    return CRYPTO_ID_MAP.get(base_symbol)
+    return symbol_index.coingecko_id(symbol)
 
 def fetch_crypto_current_price(symbol):
     """Fetch current price and 24h stats from CoinGecko."""
@@ -60,7 +33,7 @@ def fetch_crypto_current_price(symbol):
             'include_last_updated_at': 'true'
         }
         
-        response = requests.get(url, params=params, timeout=5)
+        response = http_get(url, params=params, endpoint='coingecko.price')
         response.raise_for_status()
         data = response.json()
         
@@ -75,6 +48,50 @@ def fetch_crypto_current_price(symbol):
         print(f"CoinGecko API error: {e}")
         return None
 
+def fetch_crypto_current_prices(symbols, raise_errors=False):
+    """
+    Fetch current price and 24h stats for many symbols in one
+    simple/price call. Returns {symbol: {...}} for the ones found; on
+    failure returns {}, or raises if raise_errors is set.
+    """
+    ids_by_symbol = {}
+    for symbol in symbols:
+        coin_id = get_coingecko_id(symbol)
+        if coin_id:
+            ids_by_symbol[symbol] = coin_id
+    if not ids_by_symbol:
+        return {}
+
+    try:
+        url = f"{COINGECKO_BASE_URL}/simple/price"
+        params = {
+            'ids': ','.join(sorted(set(ids_by_symbol.values()))),
+            'vs_currencies': 'usd',
+            'include_24hr_change': 'true',
+            'include_24hr_vol': 'true',
+            'include_last_updated_at': 'true'
+        }
+
+        response = http_get(url, params=params, endpoint='coingecko.price')
+        response.raise_for_status()
+        data = response.json()
+
+        quotes = {}
+        for symbol, coin_id in ids_by_symbol.items():
+            if coin_id in data and 'usd' in data[coin_id]:
+                quotes[symbol] = {
+                    'price': data[coin_id]['usd'],
+                    'change_24h': data[coin_id].get('usd_24h_change', 0),
+                    'volume_24h': data[coin_id].get('usd_24h_vol', 0),
+                    'last_updated': data[coin_id].get('last_updated_at', None)
+                }
+        return quotes
+    except Exception as e:
+        print(f"CoinGecko API error: {e}")
+        if raise_errors:
+            raise
+        return {}
+
 def fetch_crypto_historical_data(symbol, days=365):
     """Fetch historical price data from CoinGecko."""
     coin_id = get_coingecko_id(symbol)
@@ -93,7 +110,7 @@ def fetch_crypto_historical_data(symbol, days=365):
             params['interval'] = 'daily'
         
         print(f"Fetching from CoinGecko: {url} with params {params}")
-        response = requests.get(url, params=params, timeout=10)
+        response = http_get(url, params=params, endpoint='coingecko.market_chart')
         
         # Check for rate limiting
         if response.status_code == 429:
@@ -111,21 +128,21 @@ def fetch_crypto_historical_data(symbol, days=365):
             print("No prices in response")
             return None
         
-        df_data = []
-        for i, (timestamp, price) in enumerate(prices):
-            date = datetime.fromtimestamp(timestamp / 1000)
-            volume = volumes[i][1] if i < len(volumes) else 0
-            
-            df_data.append({
-                'Date': date,
-                'Open': price,  # CoinGecko doesn't provide OHLC for free tier, using close as approximation
-                'High': price * 1.01,  # Approximate
-                'Low': price * 0.99,   # Approximate
-                'Close': price,
-                'Volume': volume
-            })
-        
-        df = pd.DataFrame(df_data)
+        # Built column-wise; timestamps become naive UTC like the other sources
+        points = np.asarray(prices, dtype=float)
+        volume = np.zeros(len(points))
+        if volumes:
+            vol_points = np.asarray(volumes, dtype=float)[:len(points), 1]
+            volume[:len(vol_points)] = vol_points
+        price = points[:, 1]
+        df = pd.DataFrame({
+            'Date': pd.to_datetime(points[:, 0].astype(np.int64), unit='ms'),
+            'Open': price,  # CoinGecko doesn't provide OHLC for free tier, using close as approximation
+            'High': price * 1.01,  # Approximate
+            'Low': price * 0.99,   # Approximate
+            'Close': price,
+            'Volume': volume,
+        })
         print(f"Successfully fetched {len(df)} data points from CoinGecko")
         return df
         
@@ -147,7 +164,7 @@ def get_crypto_info(symbol):
         url = f"{COINGECKO_BASE_URL}/coins/{coin_id}"
         params = {'localization': 'false', 'tickers': 'false', 'community_data': 'false', 'developer_data': 'false'}
         
-        response = requests.get(url, params=params, timeout=5)
+        response = http_get(url, params=params, endpoint='coingecko.coin')
         response.raise_for_status()
         data = response.json()
         
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services.metrics import cache_result
+
+# How long a cached history stays fresh, by bar granularity (seconds).
+# A daily series only changes when the current bar ticks, so it can live
+# much longer than minute bars.
+INTERVAL_TTL_SECONDS = {
+    '1m': 30,
+    '5m': 60,
+    '15m': 120,
+    '1h': 300,
+    '1d': 900,
+}
+DEFAULT_TTL_SECONDS = 300
+
+HISTORY_CACHE_MAX_BYTES = int(os.environ.get('HISTORY_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+HISTORY_CACHE_MAX_ENTRIES = int(os.environ.get('HISTORY_CACHE_MAX_ENTRIES', 2000))
+
+
+def ttl_for_interval(interval):
+    """Return the TTL in seconds for a bar interval."""
+    return INTERVAL_TTL_SECONDS.get(interval, DEFAULT_TTL_SECONDS)
+
+
+def _frame_size(value):
+    """Approximate memory footprint of a cached (hist, source, info) tuple."""
+    hist = value[0]
+    if hasattr(hist, 'nbytes'):
+        return int(hist.nbytes)
+    try:
+        return int(hist.memory_usage(deep=True).sum())
+    except Exception:
+        return 0
+
+
+class _Flight:
+    """One in-progress upstream fetch that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class HistoryCache:
+    """
+    TTL + LRU cache for fetched history with single-flight loading.
+
+    Entries are evicted least-recently-used first once either the entry
+    count or the total byte size goes over its cap. Concurrent misses for
+    the same key wait on one loader call instead of each hitting upstream.
+    """
+
+    def __init__(self, max_bytes=HISTORY_CACHE_MAX_BYTES, max_entries=HISTORY_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl):
+        size = _frame_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_or_load(self, key, loader, ttl):
+        """
+        Return the cached value for key, calling loader() on a miss.
+
+        Only one loader runs per key at a time; other callers block until
+        it finishes and share its result (or its exception). Results whose
+        history is None or empty are returned but not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            cache_result('history', True)
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self.hits += 1
+            cache_result('history', True)
+            return flight.value
+
+        self.misses += 1
+        cache_result('history', False)
+        try:
+            value = loader()
+            flight.value = value
+            hist = value[0] if value else None
+            if hist is not None and not hist.empty:
+                self.put(key, value, ttl)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'inflight': len(self._inflight),
+            }
+
+
+# Shared process-wide cache used by the API layer
+history_cache = HistoryCache()
@@ -0,0 +1,129 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.metrics import upstream_span, upstream_error
+from services.rate_limits import DEFAULT_PENALTY_SECONDS, acquire, get_limiter
+from services.upstream import CircuitOpenError, get_breaker
+
+# Shared, connection-pooled HTTP client for the upstream market data APIs.
+# One requests.Session per host keeps TCP/TLS connections alive between
+# calls, and a urllib3 Retry policy backs off on 429/5xx.
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+# Upper bound on how long a Retry-After header may make a request thread sleep
+HTTP_MAX_RETRY_AFTER = float(os.environ.get('HTTP_MAX_RETRY_AFTER', 10))
+
+# 429 is not retried here: services/rate_limits.py pauses the provider
+# instead, since hammering a rate-limited Binance endpoint earns an IP ban (418).
+RETRY_STATUSES = (500, 502, 503, 504)
+RATE_LIMITED_STATUSES = (418, 429)
+
+# Per-attempt timeouts (seconds) by endpoint name
+ENDPOINT_TIMEOUTS = {
+    'binance.klines': 5,
+    'binance.price': 3,
+    'binance.24hr': 3,
+    'coingecko.price': 5,
+    'coingecko.market_chart': 10,
+    'coingecko.coin': 5,
+    'binance.exchange_info': 15,
+    'coingecko.coins_list': 15,
+}
+DEFAULT_TIMEOUT = 5
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class _CappedRetry(Retry):
+    """Retry policy that honours Retry-After but never sleeps longer than HTTP_MAX_RETRY_AFTER."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, HTTP_MAX_RETRY_AFTER)
+
+
+def _build_session():
+    retry = _CappedRetry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        # Hand the last 429/5xx back to the caller instead of raising RetryError,
+        # so existing status checks keep working.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(url):
+    """Return the pooled session for the host of url."""
+    host = urlsplit(url).netloc
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _sessions[host] = _build_session()
+    return session
+
+
+def http_get(url, params=None, endpoint=None, timeout=None):
+    """
+    GET url through the pooled session for its host.
+    The timeout defaults to the one configured for endpoint.
+    """
+    if timeout is None:
+        timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+    source, _, name = (endpoint or urlsplit(url).netloc).partition('.')
+    # Fail fast while the provider's circuit breaker is open (services/upstream.py),
+    # then wait for rate-limit tokens (services/rate_limits.py)
+    breaker = get_breaker(source)
+    if not breaker.available():
+        raise CircuitOpenError(f"{source} circuit open")
+    acquire(endpoint or source, params)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{source} circuit open")
+    try:
+        with upstream_span(source, name or 'other'):
+            response = get_session(url).get(url, params=params, timeout=timeout)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if response.status_code >= 400:
+        upstream_error(source, name or 'other', response.status_code)
+    used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+    if used_weight and used_weight.isdigit():
+        get_limiter(source).observe_used(int(used_weight))
+    if response.status_code in RATE_LIMITED_STATUSES:
+        retry_after = response.headers.get('Retry-After')
+        get_limiter(source).penalize(float(retry_after) if retry_after and retry_after.isdigit() else DEFAULT_PENALTY_SECONDS)
+
+    # Rate limiting and server errors count against the provider; other 4xx
+    # (e.g. an unknown symbol) mean it is up and answering.
+    if response.status_code in RETRY_STATUSES or response.status_code in RATE_LIMITED_STATUSES:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def close_sessions():
+    """Close all pooled connections (used after fork and in tests)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
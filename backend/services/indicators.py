@@ -0,0 +1,410 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+from services.prediction import signals_from_indicators
+
+# Stateful indicator engine. Each indicator keeps just enough running state
+# (window sums, EMA values) to advance by one bar without rescanning the
+# series, and reproduces the pandas formulas used by get_stock_data /
+# calculate_trading_signals:
+#   rolling(n).mean() / .std(), ewm(span, adjust=False).mean(),
+#   RSI as rolling(14) means of gains and losses, ATR as the 14-bar mean of High-Low.
+
+NAN = float('nan')
+
+# IndicatorBook bounds: engines kept at most, and how long an unused one survives
+INDICATOR_BOOK_MAX_ENGINES = int(os.environ.get('INDICATOR_BOOK_MAX_ENGINES', 1000))
+INDICATOR_BOOK_IDLE_SECONDS = float(os.environ.get('INDICATOR_BOOK_IDLE_SECONDS', 6 * 3600))
+# Syncs for the same (symbol, interval) are serialized on one of this many locks
+INDICATOR_BOOK_LOCK_STRIPES = 64
+
+
+class RollingStats:
+    """Rolling mean and sample std (ddof=1) over the last n values."""
+
+    def __init__(self, n):
+        self.n = n
+        self.window = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._removed = 0
+        self._same_run = 0  # length of the trailing run of identical values
+
+    def copy(self):
+        other = RollingStats(self.n)
+        other.window = deque(self.window)
+        other.mean, other.m2, other._removed, other._same_run = self.mean, self.m2, self._removed, self._same_run
+        return other
+
+    def update(self, x):
+        self._same_run = self._same_run + 1 if self.window and self.window[-1] == x else 1
+        # Welford add/remove keeps this O(1) per bar
+        self.window.append(x)
+        count = len(self.window)
+        delta = x - self.mean
+        self.mean += delta / count
+        self.m2 += delta * (x - self.mean)
+
+        if count > self.n:
+            old = self.window.popleft()
+            count -= 1
+            delta = old - self.mean
+            self.mean -= delta / count
+            self.m2 -= delta * (old - self.mean)
+            self._removed += 1
+            # Re-anchor from the window once per full cycle so rounding error
+            # cannot build up; amortised this is still O(1) per bar.
+            if self._removed >= self.n:
+                self._resync()
+
+    def _resync(self):
+        values = np.fromiter(self.window, dtype=float)
+        self.mean = float(values.mean())
+        self.m2 = float(((values - self.mean) ** 2).sum())
+        self._removed = 0
+
+    def seed(self, values):
+        self.window = deque(float(v) for v in values[-self.n:])
+        self._same_run = 0
+        for v in reversed(self.window):
+            if v != self.window[-1]:
+                break
+            self._same_run += 1
+        if self.window:
+            self._resync()
+        else:
+            self.mean = self.m2 = 0.0
+
+    @property
+    def ready(self):
+        return len(self.window) >= self.n
+
+    @property
+    def value(self):
+        return self.mean if self.ready else NAN
+
+    @property
+    def std(self):
+        if not self.ready or self.n < 2:
+            return NAN
+        if self._same_run >= self.n:
+            # A flat window has zero spread; don't report rounding noise
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+
+class RollingExtreme:
+    """Rolling min or max over the last n values using a monotonic deque."""
+
+    def __init__(self, n, mode='min'):
+        self.n = n
+        self.mode = mode
+        self.items = deque()  # (index, value), monotonic in value
+        self.count = 0
+
+    def copy(self):
+        other = RollingExtreme(self.n, self.mode)
+        other.items = deque(self.items)
+        other.count = self.count
+        return other
+
+    def update(self, x):
+        if self.mode == 'min':
+            while self.items and self.items[-1][1] >= x:
+                self.items.pop()
+        else:
+            while self.items and self.items[-1][1] <= x:
+                self.items.pop()
+        self.items.append((self.count, x))
+        self.count += 1
+        while self.items[0][0] <= self.count - 1 - self.n:
+            self.items.popleft()
+
+    def seed(self, values):
+        self.items.clear()
+        self.count = 0
+        for v in values[-self.n:]:
+            self.update(float(v))
+
+    @property
+    def value(self):
+        return self.items[0][1] if self.items else NAN
+
+
+class EMA:
+    """pandas ewm(span=span, adjust=False).mean(), one value at a time."""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = None
+
+    def copy(self):
+        other = EMA.__new__(EMA)
+        other.alpha, other.value = self.alpha, self.value
+        return other
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        elif self.value != x:
+            # Same arithmetic as pandas' ewm kernel so the results are bit-identical
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+        return self.value
+
+
+class IndicatorEngine:
+    """
+    Running SMA/RSI/EMA/MACD/Bollinger/ATR state for one series.
+
+    Build it with from_frame() (vectorised cold start), then call update()
+    for each new bar. Calling update() again with the same timestamp
+    replaces the last bar, which is how a still-forming candle is handled.
+
+    update() checkpoints the state before each bar so that revision is
+    possible, and the checkpoint copies the rolling windows: a bar costs
+    O(window), i.e. at most the 50 values of sma_50, not O(1). That is
+    still independent of the series length.
+    """
+
+    def __init__(self):
+        self.sma_20 = RollingStats(20)
+        self.sma_50 = RollingStats(50)
+        self.gain = RollingStats(14)
+        self.loss = RollingStats(14)
+        self.tr = RollingStats(14)
+        self.support = RollingExtreme(10, 'min')
+        self.resistance = RollingExtreme(10, 'max')
+        self.ema_9 = EMA(9)
+        self.ema_12 = EMA(12)
+        self.ema_21 = EMA(21)
+        self.ema_26 = EMA(26)
+        self.macd_signal = EMA(9)
+        self.prev_close = None
+        self.prev_macd = NAN
+        self.prev_macd_signal = NAN
+        self.last_ts = None
+        self.last_bar = None
+        self.count = 0
+        self._before_last = None
+
+    _STATE = ('sma_20', 'sma_50', 'gain', 'loss', 'tr', 'support', 'resistance',
+              'ema_9', 'ema_12', 'ema_21', 'ema_26', 'macd_signal')
+    _SCALARS = ('prev_close', 'prev_macd', 'prev_macd_signal', 'last_ts', 'last_bar', 'count')
+
+    def _checkpoint(self):
+        state = {name: getattr(self, name).copy() for name in self._STATE}
+        state.update({name: getattr(self, name) for name in self._SCALARS})
+        return state
+
+    def _restore(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def update(self, ts, open_, high, low, close, volume=0.0):
+        """Advance by one bar (or revise the last one if ts is unchanged)."""
+        if self.last_ts is not None and ts == self.last_ts and self._before_last is not None:
+            self._restore(self._before_last)
+        elif self.last_ts is not None and ts < self.last_ts:
+            raise ValueError("Bars must be applied in time order")
+        self._before_last = self._checkpoint()
+
+        close = float(close)
+        self.prev_macd = self.macd_value
+        self.prev_macd_signal = self.macd_signal.value if self.macd_signal.value is not None else NAN
+
+        self.sma_20.update(close)
+        self.sma_50.update(close)
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.gain.update(max(delta, 0.0))
+            self.loss.update(max(-delta, 0.0))
+        self.tr.update(float(high) - float(low))
+        self.support.update(float(low))
+        self.resistance.update(float(high))
+        self.ema_9.update(close)
+        self.ema_12.update(close)
+        self.ema_21.update(close)
+        self.ema_26.update(close)
+        self.macd_signal.update(self.ema_12.value - self.ema_26.value)
+
+        self.prev_close = close
+        self.last_ts = ts
+        self.last_bar = (ts, float(open_), float(high), float(low), close, float(volume))
+        self.count += 1
+        return self.snapshot()
+
+    @property
+    def macd_value(self):
+        if self.ema_12.value is None:
+            return NAN
+        return self.ema_12.value - self.ema_26.value
+
+    @property
+    def rsi(self):
+        gain, loss = self.gain.value, self.loss.value
+        if math.isnan(gain) or math.isnan(loss):
+            return NAN
+        rs = gain / loss if loss != 0 else (math.inf if gain > 0 else NAN)
+        return 100 - (100 / (1 + rs))
+
+    def snapshot(self):
+        """Latest indicator values in the shape signals_from_indicators expects."""
+        bb_mid, bb_std = self.sma_20.value, self.sma_20.std
+        return {
+            "ts": self.last_ts,
+            "close": self.prev_close,
+            "sma_20": bb_mid,
+            "sma_50": self.sma_50.value,
+            "rsi": self.rsi,
+            "ema_9": self.ema_9.value,
+            "ema_21": self.ema_21.value,
+            "macd": self.macd_value,
+            "macd_signal": self.macd_signal.value,
+            "prev_macd": self.prev_macd,
+            "prev_macd_signal": self.prev_macd_signal,
+            "bb_mid": bb_mid,
+            "bb_std": bb_std,
+            "bb_upper": bb_mid + 2 * bb_std,
+            "bb_lower": bb_mid - 2 * bb_std,
+            "support": self.support.value,
+            "resistance": self.resistance.value,
+            "atr": self.tr.value,
+        }
+
+    def signals(self, strategy="day_trading"):
+        """calculate_trading_signals for the latest bar, without touching history."""
+        if self.count < 20:
+            return None
+        return signals_from_indicators(self.snapshot(), strategy)
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Cold start: compute the EMA chains with pandas over the whole frame and
+        seed every window from its tail, leaving the engine positioned on the
+        second-to-last bar; the last bar is then applied through update() so it
+        can later be revised in place.
+        """
+        engine = cls()
+        if df is None or df.empty:
+            return engine
+
+        ts = _timestamps(df)
+        close = df['Close'].to_numpy(dtype=float)
+        high = df['High'].to_numpy(dtype=float)
+        low = df['Low'].to_numpy(dtype=float)
+        n = len(df) - 1
+
+        if n > 0:
+            head_close = pd.Series(close[:n])
+            ema = {span: head_close.ewm(span=span, adjust=False).mean().to_numpy() for span in (9, 12, 21, 26)}
+            macd = ema[12] - ema[26]
+            signal = pd.Series(macd).ewm(span=9, adjust=False).mean().to_numpy()
+            deltas = np.diff(close[:n])
+
+            engine.sma_20.seed(close[:n])
+            engine.sma_50.seed(close[:n])
+            engine.gain.seed(np.clip(deltas, 0, None))
+            engine.loss.seed(np.clip(-deltas, 0, None))
+            engine.tr.seed(high[:n] - low[:n])
+            engine.support.seed(low[:n])
+            engine.resistance.seed(high[:n])
+            engine.ema_9.value = float(ema[9][-1])
+            engine.ema_12.value = float(ema[12][-1])
+            engine.ema_21.value = float(ema[21][-1])
+            engine.ema_26.value = float(ema[26][-1])
+            engine.macd_signal.value = float(signal[-1])
+            engine.prev_close = float(close[n - 1])
+            engine.last_ts = int(ts[n - 1])
+            engine.count = n
+
+        volume = df['Volume'].to_numpy(dtype=float) if 'Volume' in df.columns else np.zeros(len(df))
+        engine.update(int(ts[n]), float(df['Open'].iloc[n]), high[n], low[n], close[n], volume[n])
+        return engine
+
+
+def _timestamps(df):
+    """Bar open times as epoch milliseconds."""
+    if 'Date' in df.columns:
+        dates = pd.to_datetime(df['Date'], utc=True)
+        return dates.astype('datetime64[ms, UTC]').astype('int64').to_numpy()
+    return np.arange(len(df), dtype='int64')
+
+
+class IndicatorBook:
+    """
+    Per-(symbol, interval) engines, advanced with only the bars they have not
+    seen. Least-recently-used engines are evicted past max_engines, and any
+    engine left unused for idle_seconds is dropped.
+    """
+
+    def __init__(self, max_engines=INDICATOR_BOOK_MAX_ENGINES, idle_seconds=INDICATOR_BOOK_IDLE_SECONDS):
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self._engines = OrderedDict()  # key -> (last_used, engine)
+        self._locks = [threading.Lock() for _ in range(INDICATOR_BOOK_LOCK_STRIPES)]
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def sync(self, key, df, strategy="day_trading"):
+        """
+        Bring the engine for key up to date with df and return its signals,
+        taken under the key's lock so a concurrent sync cannot tear them.
+        Falls back to a cold rebuild if df does not extend what the engine
+        has seen. Only the lookup and the publish take the book-wide lock.
+        """
+        with self._key_lock(key):
+            engine = self.get(key)
+            ts = _timestamps(df)
+            start = int(np.searchsorted(ts, engine.last_ts)) if engine is not None and engine.last_ts is not None else len(ts)
+            if start >= len(ts) or ts[start] != engine.last_ts:
+                engine = IndicatorEngine.from_frame(df)
+            else:
+                # Re-apply the last seen bar (it may have been revised), then the new ones
+                cols = [df[c].to_numpy(dtype=float) for c in ('Open', 'High', 'Low', 'Close')]
+                volume = df['Volume'].to_numpy(dtype=float) if 'Volume' in df.columns else np.zeros(len(df))
+                for i in range(start, len(df)):
+                    engine.update(int(ts[i]), cols[0][i], cols[1][i], cols[2][i], cols[3][i], volume[i])
+            signals = engine.signals(strategy)
+            with self._lock:
+                self._remember(key, engine)
+            return signals
+
+    def _remember(self, key, engine):
+        now = time.monotonic()
+        self._engines[key] = (now, engine)
+        self._engines.move_to_end(key)
+        while self._engines:
+            oldest_key, (last_used, _) = next(iter(self._engines.items()))
+            if len(self._engines) <= self.max_engines and now - last_used < self.idle_seconds:
+                break
+            self._engines.pop(oldest_key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._engines.get(key)
+            return entry[1] if entry is not None else None
+
+    def drop(self, key):
+        with self._lock:
+            self._engines.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._engines.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'engines': len(self._engines), 'max_engines': self.max_engines}
+
+
+indicator_book = IndicatorBook()
@@ -0,0 +1,38 @@
+import importlib
+import importlib.util
+
+# Deferred imports for the heavy data/ML backends (yfinance, sklearn,
+# TensorFlow). Workers that only serve quotes never pay for them, and
+# services/warmup.py can pull them into the gunicorn master ahead of fork.
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def is_available(name):
+    """True if the module can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
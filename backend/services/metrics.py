@@ -0,0 +1,181 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Request timing instrumentation. span() times one stage of a request (an
+# upstream call, indicator computation, JSON encoding, ...) into a
+# Prometheus histogram; the spans of the current request are also collected
+# so they can be sent back in a Server-Timing header. Rendered in the
+# Prometheus text format on /metrics. Metrics are per worker process.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Add a Server-Timing header with the request's spans to every API response
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+# Seconds; covers cache hits (sub-ms) through slow upstream fetches and fits
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_spans = ContextVar('current_spans', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'API request latency by route')
+STAGE_SECONDS = Histogram('stage_duration_seconds', 'Time spent in each request stage')
+UPSTREAM_SECONDS = Histogram('upstream_request_duration_seconds', 'Upstream market data call latency')
+UPSTREAM_ERRORS = Counter('upstream_errors_total', 'Upstream calls that failed or returned an error status')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit/miss)')
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, UPSTREAM_SECONDS, UPSTREAM_ERRORS, CACHE_REQUESTS]
+
+
+def _add_span(name, seconds):
+    spans = _current_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Time a request stage into stage_duration_seconds{stage=...}."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        _add_span(stage, elapsed)
+
+
+@contextmanager
+def upstream_span(source, endpoint):
+    """
+    Time one upstream call, labelled by source (binance/coingecko/yfinance)
+    and endpoint. An exception counts as an error; for HTTP calls use
+    upstream_error() to count error statuses.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(source=source, endpoint=endpoint, reason='exception')
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_SECONDS.observe(elapsed, source=source, endpoint=endpoint)
+        _add_span(f"upstream-{source}", elapsed)
+
+
+def upstream_error(source, endpoint, status):
+    if METRICS_ENABLED:
+        UPSTREAM_ERRORS.inc(source=source, endpoint=endpoint, reason=str(status))
+
+
+def cache_result(cache, hit):
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def begin_request():
+    """Start collecting spans for the current request."""
+    return _current_spans.set([]), time.perf_counter()
+
+
+def end_request(token, route, method, status):
+    """Record the request latency and return its spans."""
+    ctx_token, start = token
+    spans = _current_spans.get() or []
+    _current_spans.reset(ctx_token)
+    elapsed = time.perf_counter() - start
+    if METRICS_ENABLED and route:
+        REQUEST_SECONDS.observe(elapsed, route=route, method=method, status=str(status))
+    return spans, elapsed
+
+
+def server_timing_header(spans, total):
+    """Server-Timing value: same-named spans are summed, durations in ms."""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
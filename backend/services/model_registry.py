@@ -0,0 +1,200 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from services.lazy import lazy_import
+from services.metrics import cache_result
+
+joblib = lazy_import('joblib')
+
+# Registry of fitted prediction models so /api/predict does not retrain on
+# every request. Models are keyed by (symbol, model type, data fingerprint):
+# the fingerprint changes when a new bar arrives or the last bar is revised,
+# which is exactly when a retrain is needed.
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(BASE_DIR, 'data', 'models'))
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', 32))
+# Retrain even without new bars once a model is this old
+MODEL_MAX_AGE_SECONDS = float(os.environ.get('MODEL_MAX_AGE_SECONDS', 24 * 3600))
+# Fits for the same (symbol, model type) are serialized on one of this many locks
+MODEL_LOCK_STRIPES = 64
+
+
+def data_fingerprint(hist):
+    """
+    Identify the training data: last bar date plus a hash of the close series.
+    A {symbol: DataFrame} universe hashes the fingerprints of its members.
+    """
+    if isinstance(hist, dict):
+        parts = [f"{symbol}:{data_fingerprint(df)}" for symbol, df in sorted(hist.items())]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:24]
+
+    closes = hist['Close'].to_numpy(dtype=float)
+    digest = hashlib.sha1(closes.tobytes()).hexdigest()[:16]
+    last_date = pd.to_datetime(hist['Date'].iloc[-1]).strftime('%Y-%m-%dT%H:%M')
+    return f"{last_date}-{len(closes)}-{digest}"
+
+
+def _is_keras_model(obj):
+    return type(obj).__module__.split('.')[0] in ('keras', 'tensorflow', 'tf_keras')
+
+
+class ModelRegistry:
+    """
+    In-memory LRU of fitted models with on-disk persistence.
+
+    Artifacts are whatever the train function returns (a bare model for
+    linear regression, (model, scaler, scaled_data) for the LSTM/MLP path).
+    sklearn objects are stored with joblib; Keras models are saved in their
+    native format next to a joblib file holding the other artifacts.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, max_entries=MODEL_CACHE_SIZE, max_age=MODEL_MAX_AGE_SECONDS):
+        self.model_dir = model_dir
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()  # (symbol, model_type, fingerprint) -> (trained_at, artifacts)
+        self._locks = [threading.Lock() for _ in range(MODEL_LOCK_STRIPES)]
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, model_type):
+        name = re.sub(r'[^A-Za-z0-9_.=-]', '_', f"{symbol}_{model_type}".upper())
+        return os.path.join(self.model_dir, name)
+
+    def _key_lock(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def _fresh(self, trained_at):
+        return time.time() - trained_at < self.max_age
+
+    def get(self, symbol, model_type, fingerprint):
+        """Cached artifacts for this exact training data, from memory or disk."""
+        artifacts = self._lookup(symbol, model_type, fingerprint)
+        cache_result('model', artifacts is not None)
+        return artifacts
+
+    def _lookup(self, symbol, model_type, fingerprint):
+        key = (symbol, model_type, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[0]):
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                self._entries.pop(key)
+
+        entry = self._load(symbol, model_type, fingerprint)
+        if entry is not None and self._fresh(entry[0]):
+            self._remember(key, entry)
+            return entry[1]
+        return None
+
+    def put(self, symbol, model_type, fingerprint, artifacts, trained_at=None):
+        entry = (trained_at or time.time(), artifacts)
+        self._remember((symbol, model_type, fingerprint), entry)
+        self._save(symbol, model_type, fingerprint, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_train(self, symbol, model_type, hist, train_fn):
+        """
+        Return fitted artifacts for hist, calling train_fn(hist) only if no
+        fresh model exists for the same data. Concurrent requests for the
+        same model wait for one fit instead of each training their own.
+        """
+        fingerprint = data_fingerprint(hist)
+        artifacts = self.get(symbol, model_type, fingerprint)
+        if artifacts is not None:
+            return artifacts
+
+        with self._key_lock((symbol, model_type)):
+            artifacts = self._lookup(symbol, model_type, fingerprint)
+            if artifacts is not None:
+                return artifacts
+            artifacts = train_fn(hist)
+            self.put(symbol, model_type, fingerprint, artifacts)
+            return artifacts
+
+    def clear(self):
+        """Forget in-memory models; persisted ones are still loaded on demand."""
+        with self._lock:
+            self._entries.clear()
+
+    # -------- persistence --------
+
+    def _save(self, symbol, model_type, fingerprint, entry):
+        trained_at, artifacts = entry
+        base = self._path(symbol, model_type)
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            parts = artifacts if isinstance(artifacts, tuple) else (artifacts,)
+            keras_file = None
+            if parts and _is_keras_model(parts[0]):
+                # One file per fingerprint, complete before the index below
+                # points at it, so a reader never sees a half-written model
+                # or one from another fit
+                keras_file = f"{os.path.basename(base)}.{re.sub(r'[^A-Za-z0-9_-]', '_', fingerprint)}.keras"
+                tmp_keras = os.path.join(self.model_dir, f"{keras_file}.{os.getpid()}.tmp.keras")
+                parts[0].save(tmp_keras)
+                os.replace(tmp_keras, os.path.join(self.model_dir, keras_file))
+                parts = (None,) + tuple(parts[1:])
+            payload = {
+                'fingerprint': fingerprint,
+                'trained_at': trained_at,
+                'tuple': isinstance(artifacts, tuple),
+                'keras': keras_file is not None,
+                'keras_file': keras_file,
+                'parts': parts,
+            }
+            tmp_path = f"{base}.joblib.{os.getpid()}.tmp"
+            joblib.dump(payload, tmp_path)
+            os.replace(tmp_path, f"{base}.joblib")
+            if keras_file is not None:
+                self._remove_stale_keras(base, keep=keras_file)
+        except Exception as e:
+            print(f"Model registry save error ({symbol} {model_type}): {e}")
+
+    def _load(self, symbol, model_type, fingerprint):
+        base = self._path(symbol, model_type)
+        if not os.path.exists(f"{base}.joblib"):
+            return None
+        try:
+            payload = joblib.load(f"{base}.joblib")
+            if payload.get('fingerprint') != fingerprint:
+                return None
+            parts = list(payload['parts'])
+            if payload.get('keras'):
+                from tensorflow.keras.models import load_model
+                keras_file = payload.get('keras_file')
+                parts[0] = load_model(os.path.join(self.model_dir, keras_file) if keras_file else f"{base}.keras")
+            artifacts = tuple(parts) if payload['tuple'] else parts[0]
+            return payload['trained_at'], artifacts
+        except Exception as e:
+            print(f"Model registry load error ({symbol} {model_type}): {e}")
+            return None
+
+    def _remove_stale_keras(self, base, keep):
+        prefix = f"{os.path.basename(base)}."
+        for name in os.listdir(self.model_dir):
+            if name.startswith(prefix) and name.endswith('.keras') and name != keep and '.tmp.' not in name:
+                try:
+                    os.remove(os.path.join(self.model_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries}
+
+
+model_registry = ModelRegistry()
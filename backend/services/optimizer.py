@@ -0,0 +1,344 @@
+"""
+Walk-forward optimization of the trading signal parameters.
+
+    python -m services.optimizer BTC --interval 1d --search random --samples 300 --save
+    python -m services.optimizer ETH --interval 1h --search grid --params rsi_buy,rsi_sell,bb_std
+
+Candidate parameter sets (a grid over chosen parameters, or random samples
+of all of them) are backtested on rolling walk-forward windows: each window
+has a training span followed by an out-of-sample test span. Configurations
+are ranked by their performance over all test spans together, and the
+walk-forward result shows what picking each window's best training
+configuration would have earned on the following test span.
+
+Evaluation runs on a process pool across all cores. The price series is
+placed in shared memory once and every worker maps it read-only, instead of
+each task pickling its own copy. With --save the best configuration is
+written where load_signal_params() finds it, and /api/stock and
+/api/backtest use it for that symbol and interval.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.backtest import (score_arrays, prepare_levels, simulate, trade_stats, DEFAULT_MAX_HOLD, MIN_HISTORY)
+from services.prediction import DEFAULT_SIGNAL_PARAMS, signal_params
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIGNAL_PARAMS_DIR = os.environ.get('SIGNAL_PARAMS_DIR', os.path.join(BASE_DIR, 'data', 'signal_params'))
+OPTIMIZER_WORKERS = int(os.environ.get('OPTIMIZER_WORKERS', os.cpu_count() or 1))
+# Configurations evaluated per pool task (amortizes task overhead)
+OPTIMIZER_BATCH = int(os.environ.get('OPTIMIZER_BATCH', 8))
+
+# Values searched for each parameter
+PARAM_GRID = {
+    'rsi_period': [7, 10, 14, 21],
+    'rsi_buy': [20, 25, 30, 35],
+    'rsi_sell': [65, 70, 75, 80],
+    'ema_fast': [5, 7, 9, 12],
+    'ema_slow': [18, 21, 26, 34, 50],
+    'macd_fast': [8, 10, 12],
+    'macd_slow': [21, 26, 30],
+    'macd_signal': [7, 9, 12],
+    'bb_period': [14, 20, 30],
+    'bb_std': [1.5, 2.0, 2.5, 3.0],
+    'atr_period': [7, 14, 21],
+    'scalp_tp': [5.0, 7.5, 10.0, 12.5],
+    'scalp_sl': [3.0, 4.0, 5.0, 6.0],
+}
+# Only searched for the scalping_xau strategy
+SCALPING_PARAMS = ('scalp_tp', 'scalp_sl')
+OBJECTIVES = ('total_return', 'sharpe', 'profit_factor', 'win_rate')
+
+
+# -------- saved configurations --------
+
+_saved = {}  # path -> (mtime, params)
+_saved_lock = threading.Lock()
+
+
+def signal_params_path(symbol, interval):
+    return os.path.join(SIGNAL_PARAMS_DIR, f"{symbol.upper()}_{interval}.json")
+
+
+def save_signal_params(symbol, interval, params, meta=None):
+    """Store params as the configuration to use for symbol/interval."""
+    path = signal_params_path(symbol, interval)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'params': params, 'meta': meta or {}}, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_signal_params(symbol, interval):
+    """The saved configuration for symbol/interval, or None to use the defaults."""
+    path = signal_params_path(symbol, interval)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _saved_lock:
+        cached = _saved.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(path) as f:
+            params = signal_params(json.load(f)['params'])
+    except Exception as e:
+        print(f"Signal params load error ({path}): {e}")
+        params = None
+    with _saved_lock:
+        _saved[path] = (mtime, params)
+    return params
+
+
+# -------- search space --------
+
+def valid_params(p):
+    return p['ema_fast'] < p['ema_slow'] and p['macd_fast'] < p['macd_slow'] and p['rsi_buy'] < p['rsi_sell']
+
+
+def grid_candidates(names, strategy="day_trading"):
+    """Every combination of PARAM_GRID values for names (others at their defaults)."""
+    names = [n for n in names if strategy == "scalping_xau" or n not in SCALPING_PARAMS]
+    candidates = []
+    for values in itertools.product(*(PARAM_GRID[n] for n in names)):
+        params = signal_params(dict(zip(names, values)))
+        if valid_params(params):
+            candidates.append(params)
+    return candidates
+
+
+def random_candidates(samples, strategy="day_trading", seed=0):
+    """samples distinct random configurations drawn from PARAM_GRID, plus the defaults."""
+    rng = np.random.RandomState(seed)
+    names = [n for n in PARAM_GRID if strategy == "scalping_xau" or n not in SCALPING_PARAMS]
+    candidates, seen = [dict(DEFAULT_SIGNAL_PARAMS)], {tuple(sorted(DEFAULT_SIGNAL_PARAMS.items()))}
+    for _ in range(samples * 20):
+        if len(candidates) > samples:
+            break
+        params = signal_params({n: PARAM_GRID[n][rng.randint(len(PARAM_GRID[n]))] for n in names})
+        params = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in params.items()}
+        key = tuple(sorted(params.items()))
+        if valid_params(params) and key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def walk_forward_windows(n, train_bars, test_bars, warmup=MIN_HISTORY):
+    """[(train_start, test_start, test_end), ...] rolling forward by test_bars."""
+    windows = []
+    test_start = warmup + train_bars
+    while test_start + test_bars <= n:
+        windows.append((test_start - train_bars, test_start, test_start + test_bars))
+        test_start += test_bars
+    if not windows and n - warmup > train_bars:
+        windows.append((warmup, warmup + train_bars, n))
+    return windows
+
+
+# -------- evaluation (pool workers) --------
+
+_shm = None
+_prices = None  # read-only view of the shared [high, low, close] array
+
+
+def _attach(name, shape):
+    global _shm, _prices
+    _shm = shared_memory.SharedMemory(name=name)
+    _prices = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _prices.flags.writeable = False
+
+
+def objective_value(stats, objective, min_trades):
+    """Objective of one backtest; None if it traded too little to judge."""
+    if stats['trades'] < min_trades:
+        return None
+    return stats[objective]
+
+
+def combined_stats(returns):
+    """Stats of several test spans' trades taken back to back."""
+    returns = np.concatenate(returns) if returns else np.empty(0)
+    count = len(returns)
+    equity = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(np.r_[1.0, equity])
+    wins = returns > 0
+    gross_loss = -returns[~wins].sum()
+    return {
+        'trades': int(count),
+        'win_rate': float(wins.mean()) if count else None,
+        'total_return': float(equity[-1] - 1) if count else 0.0,
+        'max_drawdown': float((1 - np.r_[1.0, equity] / peak).max()),
+        'sharpe': float(returns.mean() / returns.std() * np.sqrt(count)) if count > 1 and returns.std() > 0 else None,
+        'profit_factor': float(returns[wins].sum() / gross_loss) if gross_loss > 0 else None,
+    }
+
+
+def evaluate(prices, params, windows, strategy, options):
+    """
+    Backtest one configuration on every window. Indicators are computed
+    once over the whole series (they only look back), then each span is
+    simulated on its slice. Returns (train stats, test trade returns) per window.
+    """
+    high, low, close = prices
+    score = score_arrays(close, params)
+    sl, tp = prepare_levels(high, low, close, score, strategy, params)
+
+    def run(lo, hi):
+        trades = simulate(high[lo:hi], low[lo:hi], close[lo:hi], score[lo:hi], sl[lo:hi], tp[lo:hi],
+                          options['min_score'], options['max_hold'], options['fee_bps'], first_bar=0)
+        return trades, trade_stats(trades, hi - lo)
+
+    results = []
+    for train_start, test_start, test_end in windows:
+        _, train = run(train_start, test_start)
+        test_trades, _ = run(test_start, test_end)
+        results.append((train, test_trades['return']))
+    return results
+
+
+def _evaluate_batch(batch, windows, strategy, options):
+    return [evaluate(_prices, params, windows, strategy, options) for params in batch]
+
+
+# -------- driver --------
+
+def optimize(bars, candidates, train_bars, test_bars, strategy="day_trading", objective='total_return',
+             min_trades=5, min_score=1, max_hold=DEFAULT_MAX_HOLD, fee_bps=0.0, workers=OPTIMIZER_WORKERS, top=20):
+    """
+    Evaluate candidates over walk-forward windows of a bar array (bar store
+    layout). Returns a report dict with the ranking by out-of-sample
+    objective and the walk-forward selection result.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    windows = walk_forward_windows(len(bars), train_bars, test_bars)
+    if not windows:
+        raise ValueError(f"Need more than {MIN_HISTORY + train_bars} bars for one window, got {len(bars)}")
+    options = {'min_score': min_score, 'max_hold': max_hold, 'fee_bps': fee_bps}
+
+    shape = (3, len(bars))
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    started = time.perf_counter()
+    try:
+        prices = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        prices[0], prices[1], prices[2] = bars['high'], bars['low'], bars['close']
+        batches = [candidates[i:i + OPTIMIZER_BATCH] for i in range(0, len(candidates), OPTIMIZER_BATCH)]
+        with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_attach, initargs=(shm.name, shape)) as pool:
+            futures = [pool.submit(_evaluate_batch, batch, windows, strategy, options) for batch in batches]
+            results = [result for future in futures for result in future.result()]
+        del prices
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Rank by the objective over all test spans together
+    ranking = []
+    for params, per_window in zip(candidates, results):
+        oos = combined_stats([test for _, test in per_window])
+        ranking.append({'params': params, 'out_of_sample': oos,
+                        'objective': objective_value(oos, objective, min_trades * len(windows))})
+    ranking.sort(key=lambda r: (r['objective'] is not None, r['objective'] or 0), reverse=True)
+
+    # Walk forward: each window trades the config that did best on its training span
+    walk_forward, picked_returns = [], []
+    dates = pd.to_datetime(bars['ts'], unit='ms')
+    for w, (train_start, test_start, test_end) in enumerate(windows):
+        scores = [objective_value(per_window[w][0], objective, min_trades) for per_window in results]
+        valid = [i for i, s in enumerate(scores) if s is not None]
+        if not valid:
+            walk_forward.append({'test_start': str(dates[test_start]), 'params': None})
+            continue
+        best = max(valid, key=lambda i: scores[i])
+        test_returns = results[best][w][1]
+        picked_returns.append(test_returns)
+        walk_forward.append({
+            'train_start': str(dates[train_start]),
+            'test_start': str(dates[test_start]),
+            'test_end': str(dates[test_end - 1]),
+            'params': candidates[best],
+            'train_objective': scores[best],
+            'test': combined_stats([test_returns]),
+        })
+
+    return {
+        'bars': len(bars),
+        'windows': len(windows),
+        'candidates': len(candidates),
+        'objective': objective,
+        'seconds': round(time.perf_counter() - started, 2),
+        'best': ranking[0]['params'] if ranking and ranking[0]['objective'] is not None else None,
+        'ranking': ranking[:top],
+        'walk_forward': {'result': combined_stats(picked_returns), 'windows': walk_forward},
+    }
+
+
+def main():
+    from services.bar_store import load_bars
+
+    parser = argparse.ArgumentParser(description="Walk-forward optimize the trading signal parameters")
+    parser.add_argument('symbol', help="symbol as the API takes it, e.g. BTC")
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--source', default='binance', help="bar store source (binance or yfinance)")
+    parser.add_argument('--strategy', default='day_trading', choices=['day_trading', 'scalping_xau'])
+    parser.add_argument('--search', default='random', choices=['random', 'grid'])
+    parser.add_argument('--samples', type=int, default=200, help="random search: configurations to try")
+    parser.add_argument('--params', help="grid search: comma-separated parameters to vary")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--train-bars', type=int, default=365)
+    parser.add_argument('--test-bars', type=int, default=90)
+    parser.add_argument('--objective', default='total_return', choices=OBJECTIVES)
+    parser.add_argument('--min-trades', type=int, default=5, help="per window; fewer trades disqualify a span")
+    parser.add_argument('--min-score', type=int, default=1)
+    parser.add_argument('--max-hold', type=int, default=DEFAULT_MAX_HOLD)
+    parser.add_argument('--fee-bps', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=OPTIMIZER_WORKERS)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--save', action='store_true', help="save the best configuration for the API")
+    args = parser.parse_args()
+
+    symbol = args.symbol.upper()
+    bars = load_bars(args.source, symbol, args.interval)
+    if bars is None or not len(bars):
+        print(f"No stored {args.source} {args.interval} bars for {symbol}; run services/backfill.py first")
+        return 1
+
+    if args.search == 'grid':
+        names = [n.strip() for n in (args.params or '').split(',') if n.strip()]
+        unknown = [n for n in names if n not in PARAM_GRID]
+        if not names or unknown:
+            parser.error(f"--params must name some of: {', '.join(PARAM_GRID)}")
+        candidates = grid_candidates(names, args.strategy)
+    else:
+        candidates = random_candidates(args.samples, args.strategy, args.seed)
+
+    report = optimize(np.array(bars), candidates, args.train_bars, args.test_bars, args.strategy, args.objective,
+                      args.min_trades, args.min_score, args.max_hold, args.fee_bps, args.workers, args.top)
+    if args.save and report['best'] is not None:
+        meta = {'objective': args.objective, 'strategy': args.strategy, 'windows': report['windows'],
+                'out_of_sample': report['ranking'][0]['out_of_sample'], 'saved_at': int(time.time())}
+        report['saved_to'] = save_signal_params(symbol, args.interval, report['best'], meta)
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,32 +1,50 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.model_selection import train_test_split
-try:
-    import tensorflow as tf
-    from tensorflow.keras.models import Sequential
-    from tensorflow.keras.layers import LSTM, Dense
-except ImportError:
-    print("TensorFlow not installed. LSTM features will utilize a mock or be unavailable.")
-    tf = None
+
+# sklearn and TensorFlow are imported on first use: together they are most of
+# a worker's boot time, and quote-only workers never need them.
+_tensorflow = None
+_tensorflow_checked = False
+
+def load_tensorflow():
+    """Import TensorFlow on first call; returns None if it is not installed."""
+    global _tensorflow, _tensorflow_checked
+    if not _tensorflow_checked:
+        try:
+            import tensorflow
+            _tensorflow = tensorflow
+        except ImportError:
+            print("TensorFlow not installed. LSTM features will utilize a mock or be unavailable.")
+            _tensorflow = None
+        _tensorflow_checked = True
+    return _tensorflow
+
+def make_windows(series, look_back=60):
+    """
+    Training windows over a 1-D series without copying it:
+    x[i] = series[i:i+look_back] (shape [samples, look_back, 1]), y[i] = series[i+look_back].
+    """
+    series = np.asarray(series, dtype=float)
+    if len(series) < look_back:
+        raise ValueError(f"Need at least {look_back} data points, got {len(series)}")
+    # sliding_window_view is a strided view; drop the last window, which has no target
+    x = sliding_window_view(series, look_back)[:-1]
+    y = series[look_back:]
+    return x[..., np.newaxis], y
 
 def prepare_data(df, look_back=60):
     """
     Prepare data for LSTM.
     """
+    from sklearn.preprocessing import MinMaxScaler
+
     data = df.filter(['Close'])
     dataset = data.values
     scaler = MinMaxScaler(feature_range=(0, 1))
     scaled_data = scaler.fit_transform(dataset)
 
-    x_train, y_train = [], []
-    for i in range(look_back, len(scaled_data)):
-        x_train.append(scaled_data[i-look_back:i, 0])
-        y_train.append(scaled_data[i, 0])
-        
-    x_train, y_train = np.array(x_train), np.array(y_train)
-    x_train = np.reshape(x_train, (x_train.shape[0], x_train.shape[1], 1))
+    x_train, y_train = make_windows(scaled_data[:, 0], look_back)
     
     return x_train, y_train, scaler, scaled_data
 
@@ -35,6 +53,9 @@ def train_linear_regression(df):
     Train a simple Linear Regression model.
     Predicts next day based on numeric date.
     """
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
+
     df = df.copy()
     df['Date_Ordinal'] = pd.to_datetime(df['Date']).map(pd.Timestamp.toordinal)
     
@@ -48,20 +69,16 @@ def train_linear_regression(df):
     
     return model
 
-def train_lstm_model(df):
+def fit_sequence_model(x_train, y_train):
     """
-    Train a simple LSTM model.
+    Fit the forecasting network on [samples, look_back, 1] windows.
     Falls back to MLPRegressor (Neural Net) if TensorFlow is not installed.
     """
     # Use MLPRegressor as fallback if TF is not available
-    if tf is None:
+    if load_tensorflow() is None:
         print("TensorFlow not found. Falling back to sklearn MLPRegressor (Lightweight Neural Net).")
         from sklearn.neural_network import MLPRegressor
         
-        # Prepare data for MLP (Non-sequential input usually, but we can use window)
-        # Re-using the same prepare_data format but flattening X
-        x_train, y_train, scaler, scaled_data = prepare_data(df)
-        
         # Flatten x_train for MLP: [samples, look_back, 1] -> [samples, look_back]
         nsamples, nx, ny = x_train.shape
         x_train_flat = x_train.reshape((nsamples, nx*ny))
@@ -69,11 +86,12 @@ def train_lstm_model(df):
         model = MLPRegressor(hidden_layer_sizes=(100, 50), activation='relu', solver='adam', max_iter=200, random_state=42)
         model.fit(x_train_flat, y_train)
         
-        return model, scaler, scaled_data
+        return model
 
     # TensorFlow LSTM implementation
-    x_train, y_train, scaler, scaled_data = prepare_data(df)
-    
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+
     model = Sequential()
     model.add(LSTM(50, return_sequences=True, input_shape=(x_train.shape[1], 1)))
     model.add(LSTM(50, return_sequences=False))
@@ -83,8 +101,42 @@ def train_lstm_model(df):
     model.compile(optimizer='adam', loss='mean_squared_error')
     model.fit(x_train, y_train, batch_size=32, epochs=5, verbose=0)
     
+    return model
+
+def train_lstm_model(df):
+    """
+    Train a simple LSTM model.
+    Falls back to MLPRegressor (Neural Net) if TensorFlow is not installed.
+    """
+    x_train, y_train, scaler, scaled_data = prepare_data(df)
+    model = fit_sequence_model(x_train, y_train)
     return model, scaler, scaled_data
 
+def train_universe_model(frames, look_back=60):
+    """
+    Fit one network on the windows of many symbols at once.
+
+    frames is {symbol: history DataFrame}. Each series is normalised with its
+    own MinMaxScaler (via prepare_data) so symbols at very different price
+    levels share one model. Symbols with fewer than look_back+1 bars are
+    skipped. Returns (model, {symbol: scaler}, {symbol: scaled_data}).
+    """
+    xs, ys, scalers, datas = [], [], {}, {}
+    for symbol, df in frames.items():
+        if df is None or len(df) <= look_back:
+            continue
+        x_train, y_train, scaler, scaled_data = prepare_data(df, look_back=look_back)
+        xs.append(x_train)
+        ys.append(y_train)
+        scalers[symbol] = scaler
+        datas[symbol] = scaled_data
+
+    if not xs:
+        raise ValueError("Not enough data in any symbol to train a universe model")
+
+    model = fit_sequence_model(np.concatenate(xs), np.concatenate(ys))
+    return model, scalers, datas
+
 def predict_future_linear(model, last_date, days=7):
     future_dates = []
     current_date = pd.to_datetime(last_date)
@@ -97,71 +149,210 @@ def predict_future_linear(model, last_date, days=7):
     
     return [{"date": d.strftime('%Y-%m-%d'), "price": p} for d, p in zip(future_dates, predictions)]
 
-def predict_future_lstm(model, scaler, data, look_back=60, days=7):
-    # Check if model is sklearn MLP or TF Sequential
-    is_sklearn = False
+def _is_sklearn_mlp(model):
+    if not type(model).__module__.startswith('sklearn'):
+        return False
     try:
         from sklearn.neural_network import MLPRegressor
-        if isinstance(model, MLPRegressor):
-            is_sklearn = True
-    except:
-        pass
-        
+        return isinstance(model, MLPRegressor)
+    except ImportError:
+        return False
+
+def _mlp_forward(model, x):
+    """
+    MLPRegressor.predict without sklearn's per-call input validation:
+    relu hidden layers, identity output, as fitted by train_lstm_model.
+    """
+    activation = x
+    last = len(model.coefs_) - 1
+    for i, (coef, intercept) in enumerate(zip(model.coefs_, model.intercepts_)):
+        activation = activation @ coef + intercept
+        if i != last:
+            np.maximum(activation, 0, out=activation)
+    return activation[:, 0]
+
+def _one_step(model, windows, is_sklearn):
+    """Next-value prediction for a [n, look_back] batch of scaled windows."""
+    if is_sklearn:
+        return _mlp_forward(model, windows)
+    # predict_on_batch runs the compiled graph without predict()'s per-call
+    # data-adapter and callback setup (~20x less overhead per step)
+    x = windows.reshape(windows.shape[0], windows.shape[1], 1).astype('float32')
+    return np.asarray(model.predict_on_batch(x)).reshape(-1)
+
+def predict_future_lstm_batch(model, scalers, datas, look_back=60, days=7):
+    """
+    Recursive forecast for many series with one shared model: each of the
+    `days` steps is a single batched model call for all series.
+    datas are the scaled series (as returned by prepare_data), scalers their
+    fitted MinMaxScalers. Returns one list of prices per series.
+    """
+    n = len(datas)
+    if n == 0:
+        return []
+    is_sklearn = _is_sklearn_mlp(model)
+
+    # Rolling input buffer: the last look_back known values, then the forecasts
+    buffer = np.empty((n, look_back + days))
+    for i, data in enumerate(datas):
+        buffer[i, :look_back] = np.asarray(data, dtype=float).reshape(-1)[-look_back:]
+
+    for step in range(days):
+        buffer[:, look_back + step] = _one_step(model, buffer[:, step:step + look_back], is_sklearn)
+
+    # MinMaxScaler.inverse_transform is (x - min_) / scale_, applied row-wise
+    mins = np.array([s.min_[0] for s in scalers])[:, np.newaxis]
+    scales = np.array([s.scale_[0] for s in scalers])[:, np.newaxis]
+    prices = (buffer[:, look_back:] - mins) / scales
+    return prices.tolist()
+
+def predict_future_lstm(model, scaler, data, look_back=60, days=7):
     # data is the full scaled dataset
-    curr_input = data[-look_back:].reshape(1, look_back, 1)
+    return predict_future_lstm_batch(model, [scaler], [data], look_back=look_back, days=days)[0]
+
+def _forecast_rows(last_date, future_prices):
     predictions = []
-    
-    temp_input = list(curr_input[0])
-    temp_input = [x[0] for x in temp_input] # flatten
-    
-    for i in range(days):
-        if is_sklearn:
-            # Flatten input for MLP
-            x_input = np.array(temp_input[-look_back:]).reshape(1, look_back)
-            pred = model.predict(x_input)
-            # MLP returns [value], TF returns [[value]]
-            pred_val = pred[0]
-        else:
-            # 3D input for LSTM
-            x_input = np.array(temp_input[-look_back:]).reshape(1, look_back, 1)
-            pred = model.predict(x_input, verbose=0)
-            pred_val = pred[0][0]
-            
-        predictions.append(pred_val)
-        temp_input.append(pred_val)
-        
-    predictions = np.array(predictions).reshape(-1, 1)
-    predictions = scaler.inverse_transform(predictions)
-    
-    return predictions.flatten().tolist()
+    last_date = pd.to_datetime(last_date)
+    for i, p in enumerate(future_prices):
+        future_date = last_date + pd.Timedelta(days=i+1)
+        predictions.append({
+            "date": future_date.strftime('%Y-%m-%d'),
+            "price": float(p)
+        })
+    return predictions
+
+def predict_universe(model, scalers, datas, look_back=60, days=7):
+    """Forecast every symbol of a universe model in one batched pass: {symbol: [prices]}."""
+    symbols = list(datas)
+    prices = predict_future_lstm_batch(model, [scalers[s] for s in symbols], [datas[s] for s in symbols],
+                                       look_back=look_back, days=days)
+    return dict(zip(symbols, prices))
 
-def calculate_trading_signals(df, strategy="day_trading"):
+def forecast_from_artifacts(model_type, artifacts, hist, days=7):
+    """
+    Turn fitted artifacts into the /api/predict payload rows.
+    artifacts is a LinearRegression for 'linear', (model, scaler, scaled_data)
+    for 'lstm', and the train_universe_model result for 'universe' (in which
+    case hist is {symbol: DataFrame} and the result is {symbol: rows}).
+    """
+    if model_type == 'linear':
+        return predict_future_linear(artifacts, hist.iloc[-1]['Date'], days=days)
+
+    if model_type == 'universe':
+        model, scalers, datas = artifacts
+        prices = predict_universe(model, scalers, datas, days=days)
+        return {symbol: _forecast_rows(hist[symbol].iloc[-1]['Date'], p) for symbol, p in prices.items()}
+
+    model, scaler, scaled_data = artifacts
+    future_prices = predict_future_lstm(model, scaler, scaled_data, days=days)
+    return _forecast_rows(hist.iloc[-1]['Date'], future_prices)
+
+# Indicator periods and thresholds of the trading signals. Any subset can be
+# overridden per call (services/optimizer.py searches these).
+DEFAULT_SIGNAL_PARAMS = {
+    'rsi_period': 14,
+    'rsi_buy': 30,
+    'rsi_sell': 70,
+    'ema_fast': 9,
+    'ema_slow': 21,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'bb_period': 20,
+    'bb_std': 2.0,
+    'atr_period': 14,
+    'scalp_tp': 7.5,
+    'scalp_sl': 4.0,
+}
+
+def signal_params(params=None):
+    """DEFAULT_SIGNAL_PARAMS with the given overrides applied."""
+    if not params:
+        return DEFAULT_SIGNAL_PARAMS
+    unknown = set(params) - set(DEFAULT_SIGNAL_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown signal parameters: {', '.join(sorted(unknown))}")
+    return {**DEFAULT_SIGNAL_PARAMS, **params}
+
+def rsi_series(close, period=14):
+    """RSI from rolling means of gains and losses (the formula /api/stock uses)."""
+    delta = close.diff()
+    gain = delta.clip(lower=0).rolling(period).mean()
+    loss = (-delta.clip(upper=0)).rolling(period).mean()
+    return 100 - (100 / (1 + gain / loss))
+
+def latest_indicators(df, params=None):
+    """
+    Indicator values for the last bar of df, as consumed by signals_from_indicators.
+    """
+    p = signal_params(params)
+    latest = df.iloc[-1]
+
+    # We calculate EMAs on the fly as they are faster for day trading than SMA 20/50
+    ema_fast = df['Close'].ewm(span=p['macd_fast'], adjust=False).mean()
+    ema_slow = df['Close'].ewm(span=p['macd_slow'], adjust=False).mean()
+    macd_line = ema_fast - ema_slow
+    signal_line = macd_line.ewm(span=p['macd_signal'], adjust=False).mean()
+
+    tr = df['High'] - df['Low']
+
+    # The RSI column /api/stock adds is the default period; others are computed here
+    if p['rsi_period'] == DEFAULT_SIGNAL_PARAMS['rsi_period']:
+        rsi = float(latest['RSI']) if 'RSI' in df.columns else 50.0
+    else:
+        rsi = float(rsi_series(df['Close'], p['rsi_period']).iloc[-1])
+
+    return {
+        "close": float(latest['Close']),
+        "rsi": rsi,
+        "ema_9": df['Close'].ewm(span=p['ema_fast'], adjust=False).mean().iloc[-1],
+        "ema_21": df['Close'].ewm(span=p['ema_slow'], adjust=False).mean().iloc[-1],
+        "macd": macd_line.iloc[-1],
+        "macd_signal": signal_line.iloc[-1],
+        "prev_macd": macd_line.iloc[-2],
+        "prev_macd_signal": signal_line.iloc[-2],
+        "bb_mid": df['Close'].rolling(window=p['bb_period']).mean().iloc[-1],
+        "bb_std": df['Close'].rolling(window=p['bb_period']).std().iloc[-1],
+        # Use recent swing highs/lows (last 5-10 candles) for tighter stop loss
+        "support": df['Low'].tail(10).min(),
+        "resistance": df['High'].tail(10).max(),
+        # ATR (Average True Range) approx for dynamic SL/TP
+        "atr": tr.tail(p['atr_period']).mean(),
+    }
+
+def calculate_trading_signals(df, strategy="day_trading", params=None):
     """
     Generate Advanced Trading Signals with detailed technical analysis.
     Optimized for Day Trading (Faster indicators, tighter stops).
+    params overrides DEFAULT_SIGNAL_PARAMS (e.g. an optimizer result).
     """
     if df is None or df.empty or len(df) < 20:
         return None
-        
-    # Get latest data points
-    latest = df.iloc[-1]
-    
-    close = float(latest['Close'])
+
+    return signals_from_indicators(latest_indicators(df, params), strategy, params)
+
+def signals_from_indicators(ind, strategy="day_trading", params=None):
+    """
+    Score the RSI/EMA/MACD/Bollinger rules and derive SL/TP levels from one
+    bar's indicator values (see latest_indicators for the expected keys;
+    ema_9/ema_21 hold the fast/slow EMAs whatever their spans).
+    """
+    p = signal_params(params)
+    close = ind['close']
     
     # --- 1. RSI Analysis (Standard 14) ---
-    rsi = float(latest['RSI']) if 'RSI' in df.columns else 50.0
+    rsi = ind['rsi']
     rsi_signal = "NEUTRAL"
     # Day trading often uses slightly more extreme levels or rapid reversals, 
     # but 30/70 is still standard.
-    if rsi < 30:
+    if rsi < p['rsi_buy']:
         rsi_signal = "BUY"
-    elif rsi > 70:
+    elif rsi > p['rsi_sell']:
         rsi_signal = "SELL"
         
     # --- 2. Moving Average Analysis (EMA 9 vs 21 for Speed) ---
-    # We calculate EMAs on the fly as they are faster for day trading than SMA 20/50
-    ema9 = df['Close'].ewm(span=9, adjust=False).mean().iloc[-1]
-    ema21 = df['Close'].ewm(span=21, adjust=False).mean().iloc[-1]
+    ema9 = ind['ema_9']
+    ema21 = ind['ema_21']
     
     ma_signal = "NEUTRAL"
     if ema9 > ema21:
@@ -170,15 +361,10 @@ def calculate_trading_signals(df, strategy="day_trading"):
         ma_signal = "SELL" # Fast Downtrend
         
     # --- 3. MACD Calculation ---
-    ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-    macd_line = ema12 - ema26
-    signal_line = macd_line.ewm(span=9, adjust=False).mean()
-    
-    curr_macd = macd_line.iloc[-1]
-    curr_sig = signal_line.iloc[-1]
-    prev_macd = macd_line.iloc[-2]
-    prev_sig = signal_line.iloc[-2]
+    curr_macd = ind['macd']
+    curr_sig = ind['macd_signal']
+    prev_macd = ind['prev_macd']
+    prev_sig = ind['prev_macd_signal']
     
     macd_signal = "NEUTRAL"
     if curr_macd > curr_sig and prev_macd <= prev_sig:
@@ -191,10 +377,10 @@ def calculate_trading_signals(df, strategy="day_trading"):
         macd_signal = "SELL"
 
     # --- 4. Volatility / Bollinger for Scalping ---
-    sma20 = df['Close'].rolling(window=20).mean().iloc[-1]
-    std_dev = df['Close'].rolling(window=20).std().iloc[-1]
-    upper_band = sma20 + (std_dev * 2)
-    lower_band = sma20 - (std_dev * 2)
+    sma20 = ind['bb_mid']
+    std_dev = ind['bb_std']
+    upper_band = sma20 + (std_dev * p['bb_std'])
+    lower_band = sma20 - (std_dev * p['bb_std'])
     
     bb_signal = "NEUTRAL"
     if close <= lower_band:
@@ -228,20 +414,16 @@ def calculate_trading_signals(df, strategy="day_trading"):
         confidence = "Medium"
         
     # --- Day Trading Levels (Tighter) ---
-    # Use recent swing highs/lows (last 5-10 candles) for tighter stop loss
-    support = df['Low'].tail(10).min()
-    resistance = df['High'].tail(10).max()
-    
-    # Calculate ATR (Average True Range) approx for dynamic SL/TP
-    tr = df['High'] - df['Low']
-    atr = tr.tail(14).mean()
+    support = ind['support']
+    resistance = ind['resistance']
+    atr = ind['atr']
     
     # --- Risk Management Strategy ---
     if strategy == "scalping_xau":
         # Specific Scalping Strategy for Gold (50-100 pips target)
         # Assuming 1 pip = 0.1 price change (standard), 50-100 pips = $5.0 - $10.0 move
-        tp_target = 7.5 # Aim for ~75 pips ($7.50) avg
-        sl_target = 4.0 # Risk ~40 pips ($4.00) avg
+        tp_target = p['scalp_tp'] # Aim for ~75 pips ($7.50) avg
+        sl_target = p['scalp_sl'] # Risk ~40 pips ($4.00) avg
         
         if "BUY" in overall_signal:
             sl = close - sl_target
@@ -282,9 +464,9 @@ def calculate_trading_signals(df, strategy="day_trading"):
         "take_profit": tp,
         "strategy": "Day Trading (Intraday)",
         "analysis": [
-            { "name": "RSI (14)", "value": f"{rsi:.2f}", "signal": rsi_signal, "condition": "Momentum (<30 Buy, >70 Sell)" },
+            { "name": f"RSI ({p['rsi_period']})", "value": f"{rsi:.2f}", "signal": rsi_signal, "condition": f"Momentum (<{p['rsi_buy']:g} Buy, >{p['rsi_sell']:g} Sell)" },
             { "name": "MACD", "value": f"{curr_macd:.2f}", "signal": macd_signal, "condition": "Trend Crossover" },
-            { "name": "EMA Trend (9 vs 21)", "value": "Bullish" if ma_signal == "BUY" else "Bearish", "signal": ma_signal, "condition": "Fast Moving Averages" },
+            { "name": f"EMA Trend ({p['ema_fast']} vs {p['ema_slow']})", "value": "Bullish" if ma_signal == "BUY" else "Bearish", "signal": ma_signal, "condition": "Fast Moving Averages" },
             { "name": "Bollinger Bands", "value": "Volatility", "signal": bb_signal, "condition": "Reversion (Outer Bands)" }
         ]
     }
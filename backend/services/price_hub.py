@@ -0,0 +1,181 @@
+import os
+import queue
+import random
+import threading
+import time
+
+from services.binance_api import get_binance_price
+from services.coingecko import fetch_crypto_current_price
+from services.quotes import get_quotes
+from services.symbols import symbol_index
+from services.upstream import hedged_call
+
+# In-process pub/sub for live prices. One poller thread per watched symbol
+# publishes into the hub, which fans each update out to every subscriber, so
+# upstream load depends on the number of symbols, not the number of viewers.
+PRICE_POLL_INTERVAL = float(os.environ.get('PRICE_POLL_INTERVAL', 2))
+# How long a poller keeps running after its last subscriber leaves
+PRICE_POLLER_IDLE_SECONDS = float(os.environ.get('PRICE_POLLER_IDLE_SECONDS', 30))
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def _coingecko_price(symbol):
+    price_data = fetch_crypto_current_price(symbol)
+    return price_data['price'] if price_data else None
+
+
+def upstream_price_source(symbol):
+    """Live price from Binance, hedged with CoinGecko for crypto; the shared quote cache for everything else."""
+    resolution = symbol_index.resolve(symbol)
+    if resolution['route'] == 'crypto':
+        # Only the sources that list the coin take part in the race
+        candidates = []
+        if resolution['binance_pair']:
+            candidates.append(('binance', get_binance_price, (symbol,)))
+        if resolution['coingecko_id']:
+            candidates.append(('coingecko', _coingecko_price, (symbol,)))
+        _, price = hedged_call(candidates)
+        return price
+    quote = get_quotes([symbol]).get(symbol)
+    return quote['price'] if quote else None
+
+
+class LocalPriceSource:
+    """
+    Offline stand-in for upstream prices: a seeded random walk per symbol.
+    Select it with PRICE_SOURCE=local.
+    """
+
+    def __init__(self, start_price=100.0, volatility=0.002, seed=None):
+        self.start_price = start_price
+        self.volatility = volatility
+        self.seed = seed
+        self._prices = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol):
+        with self._lock:
+            price = self._prices.get(symbol)
+            if price is None:
+                rng = random.Random(f"{self.seed}:{symbol}")
+                price = self.start_price * (0.5 + rng.random())
+            else:
+                price *= 1 + random.gauss(0, self.volatility)
+            self._prices[symbol] = price
+            return round(price, 6)
+
+
+class Subscription:
+    """One client's view of the hub: a bounded queue of price updates."""
+
+    def __init__(self, symbols):
+        self.symbols = tuple(symbols)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, update):
+        # Slow consumers lose their oldest updates rather than blocking the poller
+        while True:
+            try:
+                self.queue.put_nowait(update)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Next update, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class PriceHub:
+    """
+    Fans out live prices from per-symbol pollers to subscribers.
+    Pollers start on first subscribe and stop once a symbol has had no
+    subscribers for idle_seconds.
+    """
+
+    def __init__(self, source=upstream_price_source, poll_interval=PRICE_POLL_INTERVAL,
+                 idle_seconds=PRICE_POLLER_IDLE_SECONDS):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.idle_seconds = idle_seconds
+        self._subscribers = {}  # symbol -> set of Subscription
+        self._pollers = {}  # symbol -> Thread
+        self._latest = {}  # symbol -> last published update
+        self._lock = threading.Lock()
+
+    def subscribe(self, symbols):
+        sub = Subscription(symbols)
+        with self._lock:
+            for symbol in sub.symbols:
+                self._subscribers.setdefault(symbol, set()).add(sub)
+                if symbol in self._latest:
+                    sub.push(self._latest[symbol])
+                if symbol not in self._pollers:
+                    poller = threading.Thread(target=self._poll, args=(symbol,), daemon=True,
+                                              name=f"price-poller-{symbol}")
+                    self._pollers[symbol] = poller
+                    poller.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for symbol in sub.symbols:
+                subs = self._subscribers.get(symbol)
+                if subs is not None:
+                    subs.discard(sub)
+
+    def publish(self, symbol, price):
+        update = {"symbol": symbol, "price": price, "ts": time.time()}
+        with self._lock:
+            self._latest[symbol] = update
+            subs = list(self._subscribers.get(symbol, ()))
+        for sub in subs:
+            sub.push(update)
+
+    def _poll(self, symbol):
+        idle_since = None
+        while True:
+            with self._lock:
+                if self._subscribers.get(symbol):
+                    idle_since = None
+                else:
+                    idle_since = idle_since or time.monotonic()
+                    if time.monotonic() - idle_since >= self.idle_seconds:
+                        # Garbage-collect the symbol: no one has listened for a while
+                        self._pollers.pop(symbol, None)
+                        self._subscribers.pop(symbol, None)
+                        self._latest.pop(symbol, None)
+                        return
+
+            if idle_since is None:
+                try:
+                    price = self.source(symbol)
+                except Exception as e:
+                    print(f"Price poller error ({symbol}): {e}")
+                    price = None
+                if price is not None:
+                    self.publish(symbol, price)
+
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "symbols": sorted(self._pollers),
+                "symbol_subscriptions": sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+def _default_source():
+    if os.environ.get('PRICE_SOURCE', 'upstream').lower() == 'local':
+        return LocalPriceSource()
+    return upstream_price_source
+
+
+price_hub = PriceHub(source=_default_source())
@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+
+from services.binance_api import get_binance_prices
+from services.lazy import lazy_import
+from services.coingecko import is_crypto_symbol, fetch_crypto_current_prices
+from services.metrics import cache_result, upstream_span
+from services.symbols import GOLD_SYMBOLS
+from services.upstream import guarded, hedged_call, submit
+
+yf = lazy_import('yfinance')
+
+# Live quotes are shared across every poller for QUOTE_CACHE_TTL seconds, so
+# any number of clients watching a symbol costs one upstream call per tick.
+QUOTE_CACHE_TTL = float(os.environ.get('QUOTE_CACHE_TTL', 5))
+# Symbols an upstream answered for without a quote are remembered as misses
+# this long, so polling an unknown or delisted symbol does not hit upstream
+# every tick. A failed or throttled call records no misses.
+QUOTE_MISS_TTL = float(os.environ.get('QUOTE_MISS_TTL', 30))
+
+# IAU trades at roughly 1/53.4 of spot gold
+IAU_GOLD_SCALE = 53.4
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class QuoteCache:
+    """
+    Short-lived quote cache with per-symbol single-flight refresh.
+
+    A caller that finds a symbol missing and not already being fetched
+    becomes responsible for fetching it; callers that arrive while that
+    fetch is running wait for it instead of issuing their own.
+    """
+
+    def __init__(self, ttl=QUOTE_CACHE_TTL, miss_ttl=QUOTE_MISS_TTL):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._quotes = {}  # symbol -> (expires_at, quote or None for a known miss)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _fresh(self, symbol, now):
+        """The unexpired (expires_at, quote) entry for symbol, or None."""
+        entry = self._quotes.get(symbol)
+        if entry is not None and entry[0] >= now:
+            return entry
+        return None
+
+    def _sweep(self, now):
+        # Drop expired entries now and then, so symbols nobody polls any more do not pile up
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + max(self.ttl, self.miss_ttl)
+        for symbol in [s for s, entry in self._quotes.items() if entry[0] < now]:
+            del self._quotes[symbol]
+
+    def invalidate(self):
+        with self._lock:
+            self._quotes.clear()
+
+    def get_many(self, symbols, fetcher):
+        """
+        Return {symbol: quote} for every symbol that has a quote, calling
+        fetcher(missing_symbols) -> ({symbol: quote}, answered) for stale
+        ones. Only symbols in answered (an upstream call for them succeeded)
+        are cached as misses when they come back without a quote.
+        """
+        results, mine, waits = {}, [], []
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                entry = self._fresh(symbol, now)
+                if entry is not None:
+                    if entry[1] is not None:
+                        results[symbol] = entry[1]
+                elif symbol in self._inflight:
+                    waits.append(self._inflight[symbol])
+                else:
+                    mine.append(symbol)
+            if mine:
+                flight = _Flight()
+                for symbol in mine:
+                    self._inflight[symbol] = flight
+
+        for symbol in symbols:
+            cache_result('quote', symbol not in mine)
+
+        if mine:
+            try:
+                fetched, answered = fetcher(mine)
+            except Exception as e:
+                print(f"Quote fetch error: {e}")
+                fetched, answered = {}, ()
+            now = time.monotonic()
+            with self._lock:
+                for symbol, quote in fetched.items():
+                    self._quotes[symbol] = (now + self.ttl, quote)
+                for symbol in mine:
+                    if symbol not in fetched and symbol in answered:
+                        self._quotes[symbol] = (now + self.miss_ttl, None)
+                for symbol in mine:
+                    self._inflight.pop(symbol, None)
+                self._sweep(now)
+            flight.done.set()
+            results.update({s: q for s, q in fetched.items() if s in mine})
+
+        for waited in waits:
+            waited.done.wait()
+
+        if waits:
+            with self._lock:
+                for symbol in symbols:
+                    if symbol not in results:
+                        entry = self._quotes.get(symbol)
+                        if entry is not None and entry[1] is not None:
+                            results[symbol] = entry[1]
+        return results
+
+
+def _fetch_yfinance_quotes(tickers):
+    """Last close for many tickers from one yf.download call; raises if the call fails."""
+    if not tickers:
+        return {}
+    with upstream_span('yfinance', 'download'):
+        frames = guarded('yfinance.quotes', lambda: yf.download(list(tickers), period='5d', group_by='ticker', threads=True,
+                                                                progress=False, auto_adjust=False))
+    if frames is None or frames.empty:
+        return {}
+
+    prices = {}
+    for ticker in tickers:
+        try:
+            if len(tickers) == 1 and 'Close' in frames.columns:
+                closes = frames['Close'].dropna()
+            else:
+                closes = frames[ticker]['Close'].dropna()
+        except KeyError:
+            continue
+        if not closes.empty:
+            prices[ticker] = float(closes.iloc[-1])
+    return prices
+
+
+def _binance_quotes(crypto, gold):
+    prices = get_binance_prices(crypto + (['PAXG'] if gold else []))
+    quotes = {s: {'price': prices[s], 'source': 'Binance API'} for s in crypto if prices.get(s)}
+    if prices.get('PAXG'):
+        quotes.update({s: {'price': prices['PAXG'], 'source': 'Binance PAXG'} for s in gold})
+    return quotes
+
+
+def _coingecko_quotes(crypto):
+    prices = fetch_crypto_current_prices(crypto, raise_errors=True)
+    return {s: {'price': data['price'], 'source': 'CoinGecko'} for s, data in prices.items()}
+
+
+def fetch_quotes(symbols):
+    """
+    Fetch live prices for a mixed list of symbols with as few upstream
+    calls as possible: one Binance multi-symbol ticker call (hedged with
+    CoinGecko, see services/upstream.py), a CoinGecko call for whatever
+    Binance missed, and one yfinance batch that runs alongside them.
+
+    Returns (quotes, answered): answered holds the symbols whose upstream
+    calls succeeded, so a symbol missing from quotes there really has no
+    quote rather than a failed or throttled fetch.
+    """
+    crypto = [s for s in symbols if s not in GOLD_SYMBOLS and is_crypto_symbol(s)]
+    gold = [s for s in symbols if s in GOLD_SYMBOLS]
+    stocks = [s for s in symbols if s not in GOLD_SYMBOLS and s not in crypto]
+
+    # IAU is fetched up front with the stocks so a missing PAXG price does
+    # not cost a second, serial yfinance round trip.
+    yf_tickers = list(stocks)
+    if gold and 'IAU' not in yf_tickers:
+        yf_tickers.append('IAU')
+    yf_future = submit(_fetch_yfinance_quotes, yf_tickers) if yf_tickers else None
+
+    quotes, answered, source = {}, set(), None
+    if crypto or gold:
+        candidates = [('binance', _binance_quotes, (crypto, gold))]
+        if crypto:
+            candidates.append(('coingecko', _coingecko_quotes, (crypto,)))
+        source, result = hedged_call(candidates)
+        quotes.update(result or {})
+
+    # Coins Binance does not list (CoinGecko already had its chance if it won the race)
+    missing_crypto = [s for s in crypto if s not in quotes]
+    if source == 'coingecko' or not missing_crypto:
+        answered.update(crypto)
+    else:
+        try:
+            quotes.update(_coingecko_quotes(missing_crypto))
+            answered.update(crypto)
+        except Exception:
+            pass  # already logged
+
+    yf_prices = {}
+    if yf_future:
+        try:
+            yf_prices = yf_future.result()
+            answered.update(stocks)
+            answered.update(gold)
+        except Exception as e:
+            print(f"yfinance quote error: {e}")
+    for symbol in stocks:
+        if symbol in yf_prices:
+            quotes[symbol] = {'price': yf_prices[symbol], 'source': 'yfinance'}
+    if gold and 'IAU' in yf_prices:
+        for symbol in gold:
+            quotes.setdefault(symbol, {'price': yf_prices['IAU'] * IAU_GOLD_SCALE, 'source': 'yfinance IAU (Scaled)'})
+
+    return quotes, answered
+
+
+quote_cache = QuoteCache()
+
+
+def get_quotes(symbols):
+    """Cached live quotes for symbols: {symbol: {'price': ..., 'source': ...}}."""
+    symbols = [s.upper() for s in symbols]
+    return quote_cache.get_many(symbols, fetch_quotes)
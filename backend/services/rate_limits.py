@@ -0,0 +1,267 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from services.metrics import Counter, Histogram, REGISTRY
+
+# Client-side rate limiting for the upstream providers. Every upstream call
+# takes tokens from its provider's bucket before it is sent, weighted the
+# way the provider counts it (Binance request weight, one call for
+# CoinGecko/yfinance). When a bucket is empty, callers queue by priority:
+# live prices are served before history loads, and history loads before
+# background backfills. A caller that cannot get tokens before its
+# deadline gets RateLimitExceeded instead of a 429 from upstream.
+
+PRIORITY_LIVE = 0        # live prices / quotes
+PRIORITY_HISTORY = 1     # on-request history and metadata
+PRIORITY_BACKFILL = 2    # background backfills and bulk refreshes
+PRIORITY_NAMES = {PRIORITY_LIVE: 'live', PRIORITY_HISTORY: 'history', PRIORITY_BACKFILL: 'backfill'}
+
+# How long a caller may queue for tokens, by priority (seconds)
+PRIORITY_DEADLINES = {
+    PRIORITY_LIVE: float(os.environ.get('RATE_LIMIT_LIVE_DEADLINE', 2)),
+    PRIORITY_HISTORY: float(os.environ.get('RATE_LIMIT_HISTORY_DEADLINE', 10)),
+    PRIORITY_BACKFILL: float(os.environ.get('RATE_LIMIT_BACKFILL_DEADLINE', 120)),
+}
+
+# (budget, window seconds). Binance: 6000 request weight per minute per IP.
+# CoinGecko: ~30 calls per minute on the free/demo plan. yfinance has no
+# published limit; Yahoo starts refusing well before 2000 calls an hour. A
+# batched yf.download counts as one call whatever its ticker count, so one
+# large watchlist poll does not drain the bucket for the next one.
+# Defaults keep a 10% margin below the published figures.
+PROVIDER_LIMITS = {
+    'binance': (int(os.environ.get('BINANCE_WEIGHT_PER_MINUTE', 5400)), 60),
+    'coingecko': (int(os.environ.get('COINGECKO_CALLS_PER_MINUTE', 27)), 60),
+    'yfinance': (int(os.environ.get('YFINANCE_CALLS_PER_MINUTE', 30)), 60),
+}
+
+# Endpoint -> default priority; anything not listed is PRIORITY_HISTORY
+ENDPOINT_PRIORITIES = {
+    'binance.price': PRIORITY_LIVE,
+    'binance.24hr': PRIORITY_LIVE,
+    'coingecko.price': PRIORITY_LIVE,
+    'yfinance.quotes': PRIORITY_LIVE,
+}
+
+# Retry-After to assume for a 429 that does not send one (seconds)
+DEFAULT_PENALTY_SECONDS = 30
+
+RATE_LIMIT_WAIT = Histogram('rate_limit_wait_seconds', 'Time spent queued for upstream rate-limit tokens')
+RATE_LIMIT_REJECTED = Counter('rate_limit_rejected_total', 'Upstream calls dropped because their queue deadline passed')
+REGISTRY.extend([RATE_LIMIT_WAIT, RATE_LIMIT_REJECTED])
+
+_priority = ContextVar('upstream_priority', default=None)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+@contextmanager
+def upstream_priority(priority):
+    """Run the enclosed upstream calls at priority (e.g. PRIORITY_BACKFILL for bulk jobs)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def binance_weight(endpoint, params):
+    """Request weight of a Binance REST call, per the spot API documentation."""
+    params = params or {}
+    if endpoint == 'binance.klines':
+        limit = int(params.get('limit', 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    if endpoint == 'binance.price':
+        return 2 if 'symbol' in params else 4
+    if endpoint == 'binance.24hr':
+        if 'symbol' in params:
+            return 2
+        count = params['symbols'].count(',') + 1 if 'symbols' in params else None
+        if count is None or count > 100:
+            return 80
+        return 2 if count <= 20 else 40
+    if endpoint == 'binance.exchange_info':
+        return 20
+    return 1
+
+
+def request_weight(endpoint, params=None):
+    source = (endpoint or '').partition('.')[0]
+    if source == 'binance':
+        return binance_weight(endpoint, params)
+    return 1
+
+
+class _Waiter:
+    __slots__ = ('weight', 'granted')
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.granted = False
+
+
+class ProviderLimiter:
+    """
+    Token bucket (budget tokens refilled evenly over window seconds) with a
+    priority queue of waiters. Tokens only go to the head of the queue, so
+    a heavy low-priority request cannot starve live-price calls and higher
+    priorities always go first.
+    """
+
+    def __init__(self, name, budget, window):
+        self.name = name
+        self.capacity = float(budget)
+        self.rate = budget / float(window)
+        self.window = window
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+        self.granted = 0
+        self.rejected = 0
+        self.reported_used = None
+        self._queue = []  # (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight=1, priority=PRIORITY_HISTORY, deadline=None):
+        """
+        Block until weight tokens are granted. Raises RateLimitExceeded if
+        that cannot happen within deadline seconds (default by priority).
+        """
+        weight = min(float(weight), self.capacity)
+        if deadline is None:
+            deadline = PRIORITY_DEADLINES.get(priority, PRIORITY_DEADLINES[PRIORITY_HISTORY])
+        start = time.monotonic()
+        give_up_at = start + deadline
+        waiter = _Waiter(weight)
+
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._queue[0][2] is waiter and now >= self.blocked_until and self.tokens >= weight:
+                        heapq.heappop(self._queue)
+                        self.tokens -= weight
+                        self.granted += 1
+                        waiter.granted = True
+                        self._cond.notify_all()
+                        break
+                    if now >= give_up_at:
+                        self.rejected += 1
+                        break
+                    # Sleep until tokens could be available, the deadline, or a notify
+                    if self._queue[0][2] is waiter:
+                        ready_at = max(self.blocked_until, now + (weight - self.tokens) / self.rate)
+                        if ready_at > give_up_at:
+                            # Refill is deterministic: waiting cannot help, fail now
+                            self.rejected += 1
+                            break
+                    else:
+                        ready_at = give_up_at
+                    self._cond.wait(max(0.001, min(ready_at, give_up_at) - now))
+            finally:
+                if not waiter.granted:
+                    self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        RATE_LIMIT_WAIT.observe(waited, source=self.name, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        if not waiter.granted:
+            RATE_LIMIT_REJECTED.inc(source=self.name, priority=PRIORITY_NAMES.get(priority, str(priority)))
+            raise RateLimitExceeded(f"{self.name} rate limit: no capacity within {deadline:.1f}s")
+        return waited
+
+    def penalize(self, seconds):
+        """Upstream said slow down (429/418): hand out no tokens for seconds."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+            self._cond.notify_all()
+        print(f"{self.name} rate limited upstream; pausing calls for {seconds:.0f}s")
+
+    def observe_used(self, used):
+        """
+        Align the bucket with the provider's own count (Binance reports the
+        weight used in the current minute in X-MBX-USED-WEIGHT-1M), e.g.
+        when other processes share the same IP.
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            self.reported_used = used
+            self.tokens = min(self.tokens, max(0.0, self.capacity - used))
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            waiting = {}
+            for priority, _, _ in self._queue:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                waiting[name] = waiting.get(name, 0) + 1
+            return {
+                'budget': self.capacity,
+                'window_seconds': self.window,
+                'tokens': round(self.tokens, 2),
+                'waiting': waiting,
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'paused_for_seconds': round(max(0.0, self.blocked_until - now), 1),
+                'reported_used_weight': self.reported_used,
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(source):
+    limiter = _limiters.get(source)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(source)
+            if limiter is None:
+                budget, window = PROVIDER_LIMITS.get(source, (600, 60))
+                limiter = _limiters[source] = ProviderLimiter(source, budget, window)
+    return limiter
+
+
+def acquire(endpoint, params=None, weight=None):
+    """Take tokens for one call to endpoint ('source.name') at the current priority."""
+    source = endpoint.partition('.')[0]
+    priority = _priority.get()
+    if priority is None:
+        priority = ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_HISTORY)
+    if weight is None:
+        weight = request_weight(endpoint, params)
+    return get_limiter(source).acquire(weight, priority)
+
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    for source in PROVIDER_LIMITS:
+        if source not in limiters:
+            limiters[source] = get_limiter(source)
+    return {name: limiter.stats() for name, limiter in sorted(limiters.items())}
@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response
+
+from services.lazy import lazy_import, is_available
+from services.metrics import cache_result, span
+from services.model_registry import data_fingerprint
+from services.serialization import encode_json
+
+# Fully rendered API responses. A /api/stock or /api/predict body only
+# changes when the bars behind it do, so it is encoded and compressed once
+# per bar version and then served as stored bytes. Each body carries a
+# strong ETag; a client that sends it back in If-None-Match gets a 304
+# without the response being rebuilt or resent.
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+# Upper bound on an entry's life even if its bars never change (e.g. a model refit after MODEL_MAX_AGE_SECONDS)
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 3600))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 5))
+# Bodies smaller than this are not worth compressing
+RESPONSE_COMPRESS_MIN_BYTES = 1024
+
+# brotli is optional; without it clients are served gzip
+BROTLI_AVAILABLE = is_available('brotli')
+brotli = lazy_import('brotli') if BROTLI_AVAILABLE else None
+
+
+def bars_version(hist):
+    """
+    Identify the bars a response was built from: data_fingerprint (last bar
+    date, length, close hash) plus the last bar's other fields, which move
+    while the current bar is still forming.
+    """
+    last = hist.iloc[-1]
+    tail = '|'.join(repr(float(last[col])) for col in ('Open', 'High', 'Low', 'Volume') if col in hist.columns)
+    return f"{data_fingerprint(hist)}-{hashlib.sha1(tail.encode()).hexdigest()[:8]}"
+
+
+class RenderedResponse:
+    """One encoded response body, its compressed variants and its ETag."""
+
+    __slots__ = ('bodies', 'etag', 'mimetype')
+
+    def __init__(self, body, mimetype='application/json'):
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.bodies = {'identity': body}
+        if len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+            with span('compress'):
+                self.bodies['gzip'] = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+                if BROTLI_AVAILABLE:
+                    self.bodies['br'] = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+
+    @property
+    def nbytes(self):
+        return sum(len(body) for body in self.bodies.values())
+
+    def etag_for(self, encoding):
+        # A strong ETag names exact bytes, so every content-coding gets its own
+        return self.etag if encoding == 'identity' else f"{self.etag}-{encoding}"
+
+    def negotiate(self, accept_encodings):
+        """Best stored encoding the client accepts: br, then gzip, then identity."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings.quality(encoding) > 0:
+                return encoding
+        return 'identity'
+
+    def respond(self, request):
+        """200 with the best encoding for request, or 304 if it already holds this body."""
+        encoding = self.negotiate(request.accept_encodings)
+        not_modified = any(request.if_none_match.contains_weak(self.etag_for(e)) for e in self.bodies)
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = Response(self.bodies[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.etag_for(encoding))
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Clients may keep the body but must revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of RenderedResponse, capped by entry count and by the
+    total size of the stored bodies.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, RenderedResponse)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                cache_result('response', False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cache_result('response', True)
+            return entry[1]
+
+    def put(self, key, payload):
+        """Render payload as JSON, store it under key and return the RenderedResponse."""
+        rendered = RenderedResponse(encode_json(payload))
+        size = rendered.nbytes
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return rendered
+            self._entries[key] = (time.monotonic() + self.ttl, rendered)
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._drop(next(iter(self._entries)))
+        return rendered
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._drop(key)
+
+    def _drop(self, key):
+        _, rendered = self._entries.pop(key)
+        self._bytes -= rendered.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
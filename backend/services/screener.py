@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from services.backtest import indicator_arrays, rule_points, MIN_HISTORY
+
+# Cross-sectional screening: the close series of a whole universe are laid
+# side by side in one bars x symbols array (right-aligned on each symbol's
+# latest bar, shorter histories NaN-padded at the start) and the signal
+# rules of calculate_trading_signals are evaluated for every column at
+# once. Each symbol's latest-bar score matches what /api/stock reports.
+
+RULE_NAMES = {2: 'STRONG BUY', 1: 'BUY', 0: 'NEUTRAL', -1: 'SELL', -2: 'STRONG SELL'}
+CONFIDENCE_RANK = {'High': 2, 'Medium': 1, 'Low': 0}
+SORT_KEYS = ('score', 'abs_score', 'confidence', 'rsi', 'change_pct', 'symbol')
+
+
+def align_closes(frames):
+    """
+    Stack {symbol: history frame} into (symbols, bars x symbols array).
+    Series shorter than the signals need are left out.
+    """
+    symbols = [s for s, df in frames.items() if df is not None and len(df) >= MIN_HISTORY]
+    length = max((len(frames[s]) for s in symbols), default=0)
+    closes = np.full((length, len(symbols)), np.nan)
+    for col, sym in enumerate(symbols):
+        values = frames[sym]['Close'].to_numpy(dtype=float)
+        closes[length - len(values):, col] = values
+    return symbols, closes
+
+
+def classify(score):
+    """Overall signal and confidence for an array of scores, as signals_from_indicators labels them."""
+    signal = np.select([score >= 3, score >= 1, score <= -3, score <= -1],
+                       ['STRONG BUY', 'BUY', 'STRONG SELL', 'SELL'], 'NEUTRAL')
+    confidence = np.select([np.abs(score) >= 3, np.abs(score) >= 1], ['High', 'Medium'], 'Low')
+    return signal, confidence
+
+
+def screen(frames, params=None):
+    """
+    Latest-bar signals of every symbol in {symbol: history frame}, as a
+    DataFrame with one row per symbol. All symbols share params.
+    """
+    symbols, closes = align_closes(frames)
+    if not symbols:
+        return pd.DataFrame()
+
+    ind = indicator_arrays(closes, params)
+    points = rule_points({name: values[-1:] for name, values in ind.items()}, params)
+    last = {name: values[-1] for name, values in ind.items()}
+    score = points['rsi'][-1] + points['ma'][-1] + points['macd'][-1] + points['bb'][-1]
+    signal, confidence = classify(score)
+    prev_close = closes[-2]
+
+    result = pd.DataFrame({
+        'symbol': symbols,
+        'signal': signal,
+        'confidence': confidence,
+        'score': score.astype(int),
+        'close': last['close'],
+        'change_pct': (last['close'] / prev_close - 1) * 100,
+        'rsi': last['rsi'],
+        'ema_fast': last['ema_fast'],
+        'ema_slow': last['ema_slow'],
+        'macd': last['macd'],
+        'macd_signal': last['macd_signal'],
+        'bb_upper': last['bb_mid'] + last['bb_band'],
+        'bb_lower': last['bb_mid'] - last['bb_band'],
+    })
+    for rule in ('rsi', 'ma', 'macd', 'bb'):
+        result[f'{rule}_rule'] = [RULE_NAMES[int(v)] for v in points[rule][-1]]
+    result['date'] = pd.to_datetime([frames[s]['Date'].iloc[-1] for s in symbols])
+    return result
+
+
+def filter_and_sort(result, signals=None, confidences=None, min_score=None, max_score=None,
+                    rsi_below=None, rsi_above=None, sort='score', descending=True, limit=None):
+    """Apply the /api/screen filters; None means no constraint."""
+    if result.empty:
+        return result
+    mask = np.ones(len(result), dtype=bool)
+    if signals:
+        mask &= result['signal'].isin(signals).to_numpy()
+    if confidences:
+        mask &= result['confidence'].isin(confidences).to_numpy()
+    if min_score is not None:
+        mask &= (result['score'] >= min_score).to_numpy()
+    if max_score is not None:
+        mask &= (result['score'] <= max_score).to_numpy()
+    if rsi_below is not None:
+        mask &= (result['rsi'] < rsi_below).to_numpy()
+    if rsi_above is not None:
+        mask &= (result['rsi'] > rsi_above).to_numpy()
+    result = result[mask]
+
+    if sort == 'abs_score':
+        keys = [result['score'].abs()]
+    elif sort == 'confidence':
+        keys = [result['confidence'].map(CONFIDENCE_RANK), result['score'].abs()]
+    else:
+        keys = [result[sort]]
+    order = pd.DataFrame({f'k{i}': key.to_numpy() for i, key in enumerate(keys)}, index=result.index)
+    order = order.sort_values(list(order.columns), ascending=not descending, na_position='last', kind='stable')
+    result = result.loc[order.index]
+    return result.head(limit) if limit else result
@@ -0,0 +1,86 @@
+import numpy as np
+from flask import Response, current_app
+
+from services.metrics import span
+
+# orjson is optional: it serializes NumPy arrays natively and is much faster
+# than the stdlib encoder, but the API works without it.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Columns sent for every bar in /api/stock, and the dtype each is sent as
+STOCK_COLUMNS = {
+    'Open': 'float64',
+    'High': 'float64',
+    'Low': 'float64',
+    'Close': 'float64',
+    'Volume': 'int64',
+    'SMA_20': 'float64',
+    'SMA_50': 'float64',
+    'RSI': 'float64',
+}
+
+# Columns of the /api/backtest trade list and equity curve
+TRADE_COLUMNS = {
+    'exit_date': 'object',
+    'side': 'object',
+    'score': 'int64',
+    'entry_price': 'float64',
+    'stop_loss': 'float64',
+    'take_profit': 'float64',
+    'exit_price': 'float64',
+    'exit_reason': 'object',
+    'bars_held': 'int64',
+    'return': 'float64',
+}
+EQUITY_COLUMNS = {
+    'equity': 'float64',
+}
+
+
+def frame_columns(df, columns=STOCK_COLUMNS, date_column='Date'):
+    """
+    Pull each column out of df as one contiguous NumPy array.
+    Dates are expected to be pre-formatted strings.
+    """
+    arrays = {date_column: df[date_column].to_numpy(dtype=object)}
+    for name, dtype in columns.items():
+        arrays[name] = df[name].to_numpy(dtype=dtype)
+    return arrays
+
+
+def columns_to_records(arrays):
+    """Turn {field: array} into a list of row dicts without touching pandas per row."""
+    names = list(arrays.keys())
+    # tolist() converts to native Python scalars in C, so the only Python-level
+    # work left is building one dict per row.
+    values = [arrays[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def columns_to_lists(arrays):
+    """Columnar payload shape: {field: [values...]}."""
+    return {name: values.tolist() for name, values in arrays.items()}
+
+
+def _orjson_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def encode_json(payload):
+    """payload as JSON bytes, with orjson when available."""
+    with span('encode'):
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(payload, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        return current_app.json.dumps(payload).encode()
+
+
+def json_response(payload, status=200):
+    """A JSON Response with the same bytes encode_json (and so the response cache) produces."""
+    return Response(encode_json(payload), status=status, mimetype='application/json')
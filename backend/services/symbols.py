@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import time
+
+from services.http_client import http_get
+from services.rate_limits import upstream_priority, PRIORITY_BACKFILL
+
+# Symbol resolution. Every symbol the API accepts is looked up in one dict
+# built from a curated map plus local snapshots of Binance exchangeInfo and
+# CoinGecko coins/list, so each request is routed to the right source up
+# front: no yfinance round trip for coins we did not hard-code, and no
+# Binance call for pairs that do not exist. The snapshots are refreshed by
+# a background thread; until the first one exists the curated map is used.
+#
+# Bare tickers are only treated as crypto when curated (CRYPTO_ID_MAP or
+# CRYPTO_SYMBOLS). Both listings collide with stock tickers: Binance has
+# CVX, MDT, STX, COMP, NEO, ... and CoinGecko thousands of tokens (AAPL,
+# MSFT, ... tokenized stocks). Any other listed coin must be asked for as a
+# pair (SYMBOLUSDT, SYMBOL-USDT, SYMBOL-USD) or by its CoinGecko id.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOL_SNAPSHOT_DIR = os.environ.get('SYMBOL_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'data', 'symbols'))
+# Snapshot age that triggers a refresh; 0 disables fetching (snapshots on disk are still used)
+SYMBOL_INDEX_REFRESH_SECONDS = float(os.environ.get('SYMBOL_INDEX_REFRESH_SECONDS', 6 * 3600))
+SYMBOL_INDEX_RETRY_SECONDS = float(os.environ.get('SYMBOL_INDEX_RETRY_SECONDS', 300))
+# Bare tickers routed to crypto on top of CRYPTO_ID_MAP (their pair/id comes from the snapshots)
+CRYPTO_SYMBOLS = frozenset(s.strip().upper() for s in
+                           os.environ.get('CRYPTO_SYMBOLS', 'BNB,SHIB,PEPE,NEAR,APT,ARB,SUI,TON').split(',')
+                           if s.strip())
+
+BINANCE_EXCHANGE_INFO_URL = "https://api.binance.com/api/v3/exchangeInfo"
+COINGECKO_COINS_LIST_URL = "https://api.coingecko.com/api/v3/coins/list"
+QUOTE_ASSET = 'USDT'
+GOLD_SYMBOLS = ('XAUUSD', 'GOLD')
+
+# Mapping of common crypto symbols to CoinGecko IDs; these win over the snapshots
+CRYPTO_ID_MAP = {
+    'BTC': 'bitcoin',
+    'ETH': 'ethereum',
+    'SOL': 'solana',
+    'ADA': 'cardano',
+    'DOT': 'polkadot',
+    'DOGE': 'dogecoin',
+    'MATIC': 'matic-network',
+    'LINK': 'chainlink',
+    'UNI': 'uniswap',
+    'AVAX': 'avalanche-2',
+    'XRP': 'ripple',
+    'LTC': 'litecoin',
+    'BCH': 'bitcoin-cash',
+    'ATOM': 'cosmos',
+    'XLM': 'stellar',
+    'ALGO': 'algorand',
+    'VET': 'vechain',
+    'FIL': 'filecoin',
+    'TRX': 'tron',
+    'ETC': 'ethereum-classic',
+    'XAUUSD': 'tether-gold', # Map Gold to Tether Gold (XAUt)
+    'GOLD': 'tether-gold',
+    'PAXG': 'pax-gold',
+    'XAUT': 'tether-gold'
+}
+
+
+def _resolution(symbol, route, binance_pair=None, coingecko_id=None):
+    return {'symbol': symbol, 'route': route, 'binance_pair': binance_pair, 'coingecko_id': coingecko_id}
+
+
+def _crypto_aliases(base):
+    return (base, f"{base}{QUOTE_ASSET}", f"{base}-{QUOTE_ASSET}", f"{base}/{QUOTE_ASSET}", f"{base}-USD", f"{base}/USD")
+
+
+def _normalize(symbol):
+    return symbol.strip().upper()
+
+
+def build_index(binance_symbols=None, coingecko_coins=None, curated=CRYPTO_ID_MAP, allowlist=CRYPTO_SYMBOLS):
+    """
+    key -> resolution for every accepted spelling. binance_symbols is the
+    exchangeInfo 'symbols' list and coingecko_coins the coins/list payload;
+    None means that snapshot is not available.
+    """
+    pairs = {}  # base -> pair
+    if binance_symbols is not None:
+        for item in binance_symbols:
+            if item.get('status') == 'TRADING' and item.get('quoteAsset') == QUOTE_ASSET:
+                pairs[item['baseAsset'].upper()] = item['symbol'].upper()
+
+    coin_ids = {}  # symbol -> [ids]
+    for coin in coingecko_coins or ():
+        if coin.get('symbol') and coin.get('id'):
+            coin_ids.setdefault(coin['symbol'].upper(), []).append(coin['id'])
+
+    def coingecko_for(base):
+        if base in curated:
+            return curated[base]
+        ids = coin_ids.get(base, ())
+        return ids[0] if len(ids) == 1 else None  # ambiguous symbols are left to Binance
+
+    def binance_for(base):
+        if binance_symbols is None:
+            # No snapshot yet: assume the USDT pair exists, as before the index
+            return f"{base}{QUOTE_ASSET}"
+        return pairs.get(base)
+
+    index = {}
+    # CoinGecko-only coins: explicit -USD spellings and ids only
+    for base, ids in coin_ids.items():
+        if len(ids) == 1 and base not in pairs:
+            resolution = _resolution(base, 'crypto', None, ids[0])
+            for key in _crypto_aliases(base)[4:]:
+                index[key] = resolution
+            index[ids[0].upper()] = resolution
+    # Binance coins: every pair spelling, but the bare ticker only when curated
+    for base in set(pairs) | set(curated) | set(allowlist):
+        if base in GOLD_SYMBOLS:
+            continue
+        bare = base in curated or base in allowlist
+        if not bare and base not in pairs:
+            continue
+        resolution = _resolution(base, 'crypto', binance_for(base) if bare else pairs[base], coingecko_for(base))
+        if resolution['binance_pair'] is None and resolution['coingecko_id'] is None:
+            continue
+        for key in _crypto_aliases(base)[0 if bare else 1:]:
+            index[key] = resolution
+        if resolution['coingecko_id']:
+            index[resolution['coingecko_id'].upper()] = resolution
+    for symbol in GOLD_SYMBOLS:
+        index[symbol] = _resolution(symbol, 'gold', None, curated.get(symbol))
+    return index
+
+
+class SymbolIndex:
+    """
+    O(1) symbol lookup over the curated map and the exchange snapshots,
+    swapped atomically whenever the background refresh builds a new one.
+    """
+
+    def __init__(self, snapshot_dir=SYMBOL_SNAPSHOT_DIR, refresh_seconds=SYMBOL_INDEX_REFRESH_SECONDS):
+        self.snapshot_dir = snapshot_dir
+        self.refresh_seconds = refresh_seconds
+        self._index = build_index()
+        self._snapshot_times = {'binance': None, 'coingecko': None}
+        self._started_pid = None
+        self._lock = threading.Lock()
+
+    # -------- lookup --------
+
+    def resolve(self, symbol):
+        """{'symbol', 'route' (crypto/gold/yfinance), 'binance_pair', 'coingecko_id'} for any spelling."""
+        self._ensure_started()
+        key = _normalize(symbol)
+        resolution = self._index.get(key)
+        if resolution is None:
+            return _resolution(key, 'yfinance')
+        return resolution
+
+    def is_crypto(self, symbol):
+        resolution = self.resolve(symbol)
+        return resolution['binance_pair'] is not None or resolution['coingecko_id'] is not None
+
+    def binance_pair(self, symbol):
+        """USDT pair for symbol, or None if Binance does not list one."""
+        resolution = self.resolve(symbol)
+        if resolution['binance_pair'] is None and self._snapshot_times['binance'] is None \
+                and resolution['route'] == 'yfinance':
+            # Nothing to check against yet: form the pair the way callers always have
+            clean_symbol = resolution['symbol'].replace("-", "").replace("/", "")
+            return clean_symbol if clean_symbol.endswith(QUOTE_ASSET) else clean_symbol + QUOTE_ASSET
+        return resolution['binance_pair']
+
+    def coingecko_id(self, symbol):
+        return self.resolve(symbol)['coingecko_id']
+
+    def stats(self):
+        return {
+            'keys': len(self._index),
+            'snapshots': {source: (round(time.time() - t) if t else None) for source, t in self._snapshot_times.items()},
+        }
+
+    # -------- snapshots --------
+
+    def _path(self, source):
+        return os.path.join(self.snapshot_dir, f"{source}.json")
+
+    def _read_snapshot(self, source):
+        try:
+            with open(self._path(source)) as f:
+                return json.load(f), os.path.getmtime(self._path(source))
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            print(f"Symbol snapshot read error ({source}): {e}")
+            return None, None
+
+    def _write_snapshot(self, source, payload):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self._path(source)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def reload(self):
+        """Rebuild the index from the snapshots on disk."""
+        binance, binance_time = self._read_snapshot('binance')
+        coingecko, coingecko_time = self._read_snapshot('coingecko')
+        self._index = build_index(binance, coingecko)
+        self._snapshot_times = {'binance': binance_time, 'coingecko': coingecko_time}
+
+    def refresh(self):
+        """Fetch whichever snapshots are stale, then rebuild. Returns True if all are fresh."""
+        ok = True
+        now = time.time()
+        with upstream_priority(PRIORITY_BACKFILL):
+            for source, fetch in (('binance', _fetch_binance_symbols), ('coingecko', _fetch_coingecko_coins)):
+                fetched_at = self._snapshot_times.get(source)
+                if fetched_at is not None and now - fetched_at < self.refresh_seconds:
+                    continue
+                try:
+                    self._write_snapshot(source, fetch())
+                except Exception as e:
+                    print(f"Symbol snapshot refresh error ({source}): {e}")
+                    ok = False
+        self.reload()
+        return ok
+
+    def _ensure_started(self):
+        # Started on first use, i.e. in the serving process after any fork
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self.reload()
+            if self.refresh_seconds > 0:
+                threading.Thread(target=self._refresh_loop, name='symbol-index', daemon=True).start()
+            self._started_pid = os.getpid()
+
+    def _refresh_loop(self):
+        while True:
+            ok = self.refresh()
+            oldest = min((t for t in self._snapshot_times.values() if t), default=time.time())
+            wait = max(oldest + self.refresh_seconds - time.time(), 60) if ok else SYMBOL_INDEX_RETRY_SECONDS
+            time.sleep(wait)
+
+
+def _fetch_binance_symbols():
+    response = http_get(BINANCE_EXCHANGE_INFO_URL, endpoint='binance.exchange_info')
+    response.raise_for_status()
+    # Only what build_index reads; the full payload is several MB of filters
+    return [{'symbol': s['symbol'], 'baseAsset': s['baseAsset'], 'quoteAsset': s['quoteAsset'], 'status': s['status']}
+            for s in response.json()['symbols']]
+
+
+def _fetch_coingecko_coins():
+    response = http_get(COINGECKO_COINS_LIST_URL, endpoint='coingecko.coins_list')
+    response.raise_for_status()
+    return [{'id': c['id'], 'symbol': c['symbol']} for c in response.json()]
+
+
+symbol_index = SymbolIndex()
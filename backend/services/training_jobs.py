@@ -0,0 +1,231 @@
+import fcntl
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+
+from services.model_registry import ModelRegistry, model_registry, data_fingerprint
+from services.prediction import train_linear_regression, train_lstm_model, train_universe_model, forecast_from_artifacts
+
+# Model fits run in a separate process pool so a cold LSTM/MLP fit never
+# occupies a web worker's CPU. Each web worker has its own pool, so the
+# host-wide cap on concurrent fits is a set of slot files under the shared
+# model directory: a pool process holds an flock on one while it fits.
+TRAINING_FITS_PER_CORE = float(os.environ.get('TRAINING_FITS_PER_CORE', 0.5))
+TRAINING_HOST_SLOTS = int(os.environ.get('TRAINING_HOST_SLOTS',
+                                         max(1, int((os.cpu_count() or 1) * TRAINING_FITS_PER_CORE))))
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', TRAINING_HOST_SLOTS))
+# How often a fit waiting for a host slot retries
+TRAINING_SLOT_POLL_SECONDS = 0.2
+# Jobs waiting for a free worker beyond this are rejected
+TRAINING_MAX_PENDING = int(os.environ.get('TRAINING_MAX_PENDING', 32))
+# Finished jobs are kept this long for GET polling
+TRAINING_JOB_TTL = float(os.environ.get('TRAINING_JOB_TTL', 3600))
+
+TRAINERS = {
+    'linear': train_linear_regression,
+    'lstm': train_lstm_model,
+    # hist is {symbol: DataFrame}; one shared model for the whole universe
+    'universe': train_universe_model,
+}
+
+
+class TrainingQueueFull(Exception):
+    pass
+
+
+@contextmanager
+def fit_slot(model_dir, slots=TRAINING_HOST_SLOTS):
+    """Hold one of the host's TRAINING_HOST_SLOTS fit slots, waiting for a free one."""
+    slot_dir = os.path.join(model_dir, '.fit-slots')
+    os.makedirs(slot_dir, exist_ok=True)
+    first = os.getpid() % slots  # spread processes over the slots
+    while True:
+        for i in range(slots):
+            handle = open(os.path.join(slot_dir, f"slot-{(first + i) % slots}.lock"), 'a')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+                handle.close()
+            return
+        time.sleep(TRAINING_SLOT_POLL_SECONDS)
+
+
+def _train_and_forecast(symbol, model_type, hist, model_dir):
+    """
+    Runs in a pool process: fit (or reuse from disk), persist to the shared
+    model directory, and return the forecast rows. Only the fit takes a
+    host slot.
+    """
+    registry = ModelRegistry(model_dir=model_dir)
+    artifacts = registry.get(symbol, model_type, data_fingerprint(hist))
+    if artifacts is None:
+        with fit_slot(model_dir):
+            artifacts = registry.get_or_train(symbol, model_type, hist, TRAINERS[model_type])
+    return forecast_from_artifacts(model_type, artifacts, hist)
+
+
+class TrainingJob:
+    def __init__(self, symbol, model_type, fingerprint):
+        self.id = uuid.uuid4().hex
+        self.symbol = symbol
+        self.model_type = model_type
+        self.fingerprint = fingerprint
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+        self.result = None
+        self.error = None
+
+    @property
+    def status(self):
+        if self.finished_at is not None:
+            return "failed" if self.error else "done"
+        if self.future is not None and self.future.running():
+            return "running"
+        return "queued"
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "symbol": self.symbol,
+            "model": self.model_type,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            data["predictions"] = self.result
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class TrainingQueue:
+    """
+    Job queue in front of a ProcessPoolExecutor.
+
+    Identical in-flight jobs (same symbol, model type and data fingerprint)
+    are collapsed into one. A job whose model is already in the registry
+    completes immediately without touching the pool.
+    """
+
+    def __init__(self, workers=TRAINING_WORKERS, max_pending=TRAINING_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = None
+        self._jobs = {}
+        self._inflight = {}  # (symbol, model_type, fingerprint) -> job id
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created lazily so it is started inside the serving process, after any
+        # gunicorn fork. 'spawn' keeps TensorFlow state out of the children.
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def submit(self, symbol, model_type, hist):
+        if model_type not in TRAINERS:
+            raise ValueError(f"Unknown model type: {model_type}")
+        fingerprint = data_fingerprint(hist)
+        key = (symbol, model_type, fingerprint)
+
+        with self._lock:
+            self._prune()
+            job_id = self._inflight.get(key)
+            if job_id is not None:
+                return self._jobs[job_id]
+
+        # A registry hit may load from disk and the forecast takes a while;
+        # neither holds up other submits or status polls.
+        job = TrainingJob(symbol, model_type, fingerprint)
+        artifacts = model_registry.get(symbol, model_type, fingerprint)
+        if artifacts is not None:
+            job.result = forecast_from_artifacts(model_type, artifacts, hist)
+            job.finished_at = time.time()
+            with self._lock:
+                self._jobs[job.id] = job
+            return job
+
+        with self._lock:
+            job_id = self._inflight.get(key)
+            if job_id is not None:
+                return self._jobs[job_id]
+
+            pending = sum(1 for j in self._jobs.values() if j.finished_at is None)
+            if pending >= self.max_pending:
+                raise TrainingQueueFull("Too many training jobs queued, try again later")
+
+            pool = self._get_pool()
+            job.future = pool.submit(_train_and_forecast, symbol, model_type, hist, model_registry.model_dir)
+            self._jobs[job.id] = job
+            self._inflight[key] = job.id
+
+        job.future.add_done_callback(lambda future, job=job, key=key, pool=pool: self._finish(job, key, future, pool))
+        return job
+
+    def _finish(self, job, key, future, pool):
+        try:
+            job.result = future.result()
+        except BrokenProcessPool as e:
+            job.error = str(e) or type(e).__name__
+            # A crashed child (e.g. OOM during a fit) poisons the pool; start a fresh one next time.
+            # Only the pool this job ran on: another job from it may already have replaced it.
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+        job.finished_at = time.time()
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _prune(self):
+        cutoff = time.time() - TRAINING_JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout=None):
+        """Block until job finishes or timeout passes; returns True if it finished."""
+        if job.future is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            job.future.result(timeout=timeout)
+        except Exception:
+            pass
+        # The done callback may still be running on another thread
+        while job.finished_at is None and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.01)
+        return job.finished_at is not None
+
+    def stats(self):
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "done": statuses.count("done"),
+            "failed": statuses.count("failed"),
+        }
+
+
+training_queue = TrainingQueue()
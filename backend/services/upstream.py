@@ -0,0 +1,239 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import Counter, REGISTRY
+from services.rate_limits import acquire
+
+# Hedged upstream fetches and per-provider circuit breakers.
+#
+# hedged_call() starts the primary source and, if it has not produced a
+# valid result within HEDGE_DELAY_SECONDS (or fails sooner), starts the
+# fallback as well; the first valid result wins and the other attempt is
+# cancelled. The fetchers are the existing blocking requests/yfinance
+# functions, so they run on a shared thread pool driven by one background
+# asyncio loop. A cancelled attempt's thread still runs to completion (a
+# blocking call cannot be interrupted), but nobody waits for it.
+#
+# A provider whose calls keep failing (timeouts, connection errors, 5xx/429)
+# trips its breaker: for BREAKER_COOLDOWN_SECONDS its calls fail immediately
+# and hedged_call goes straight to the next source. One trial call is then
+# let through; success closes the breaker again.
+HEDGE_DELAY_SECONDS = float(os.environ.get('HEDGE_DELAY_SECONDS', 0.75))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get('BREAKER_COOLDOWN_SECONDS', 30))
+UPSTREAM_THREADS = int(os.environ.get('UPSTREAM_THREADS', 32))
+
+HEDGES_FIRED = Counter('upstream_hedges_total', 'Fallback attempts started because the primary was slow or failed')
+HEDGE_WINS = Counter('upstream_hedge_wins_total', 'Which source produced the result of a hedged call')
+SHORT_CIRCUITS = Counter('upstream_short_circuits_total', 'Calls skipped because the provider breaker was open')
+REGISTRY.extend([HEDGES_FIRED, HEDGE_WINS, SHORT_CIRCUITS])
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (cool-down) -> half-open (one trial) -> closed."""
+
+    def __init__(self, name, threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def available(self):
+        """True if a call would currently be let through (does not claim the trial slot)."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            return state == 'closed' or (state == 'half_open' and not self._trial_running)
+
+    def allow(self):
+        """Claim permission for one call; in half-open state only one trial runs at a time."""
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+        SHORT_CIRCUITS.inc(source=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"Circuit breaker opened for {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {'state': self._state(time.monotonic()), 'consecutive_failures': self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(source):
+    breaker = _breakers.get(source)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(source, CircuitBreaker(source))
+    return breaker
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in sorted(breakers.items())}
+
+
+def guarded(endpoint, fn, *args, weight=None):
+    """
+    Call fn(*args) as one call to endpoint ('source.name') for providers
+    that are not called through http_get (yfinance): take rate-limit tokens,
+    raise CircuitOpenError while the breaker is open, and count exceptions
+    as failures and returns as successes.
+    """
+    source = endpoint.partition('.')[0]
+    breaker = get_breaker(source)
+    if not breaker.available():
+        SHORT_CIRCUITS.inc(source=source)
+        raise CircuitOpenError(f"{source} circuit open")
+    acquire(endpoint, weight=weight)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{source} circuit open")
+    try:
+        result = fn(*args)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+# -------- event loop --------
+
+_loop = None
+_executor = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    # Started on first use, i.e. inside the serving process after any fork
+    global _loop, _executor
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                _executor = ThreadPoolExecutor(max_workers=UPSTREAM_THREADS, thread_name_prefix='upstream')
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(_executor)
+                threading.Thread(target=loop.run_forever, name='upstream-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def has_value(result):
+    """Default validity test: not None, and non-empty for frames/containers."""
+    if result is None:
+        return False
+    if isinstance(result, tuple):
+        return has_value(result[0])
+    empty = getattr(result, 'empty', None)
+    if isinstance(empty, bool):
+        return not empty
+    if isinstance(result, (dict, list)):
+        return len(result) > 0
+    return True
+
+
+async def _race(candidates, hedge_delay, is_valid):
+    loop = asyncio.get_running_loop()
+    queue = list(candidates)
+    running = {}  # task -> source
+
+    def start_next():
+        while queue:
+            source, fn, args, ctx = queue.pop(0)
+            if not get_breaker(source).available():
+                SHORT_CIRCUITS.inc(source=source)
+                continue
+            if running:
+                HEDGES_FIRED.inc(source=source)
+            running[asyncio.ensure_future(loop.run_in_executor(None, ctx.run, fn, *args))] = source
+            return True
+        return False
+
+    start_next()
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, timeout=hedge_delay if queue else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                start_next()  # primary is slow: hedge
+                continue
+            for task in done:
+                source = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    print(f"Upstream {source} failed: {e}")
+                    continue
+                if is_valid(result):
+                    HEDGE_WINS.inc(source=source)
+                    return source, result
+            # A failure or empty answer: don't wait out the hedge delay
+            start_next()
+        return None, None
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def hedged_call(candidates, hedge_delay=HEDGE_DELAY_SECONDS, is_valid=has_value, timeout=None):
+    """
+    Run candidates [(source, fn, args), ...] in order of preference with
+    hedging; returns (source, result) of the first valid result, or
+    (None, None) if every source failed, was empty or had an open breaker.
+    """
+    if not candidates:
+        return None, None
+    # Each attempt runs in its own copy of the caller's context (timing spans)
+    candidates = [(source, fn, args, contextvars.copy_context()) for source, fn, args in candidates]
+    future = asyncio.run_coroutine_threadsafe(_race(candidates, hedge_delay, is_valid), _get_loop())
+    return future.result(timeout=timeout)
+
+
+def submit(fn, *args):
+    """Start fn(*args) on the upstream pool; returns a concurrent.futures.Future."""
+    _get_loop()
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,39 @@
+import os
+import time
+import importlib
+
+# Heavy backends that are imported lazily by the request path. Importing them
+# once in the gunicorn master (preload_app + when_ready) means forked workers
+# share those pages copy-on-write instead of each importing them again.
+WARM_MODULES = (
+    'yfinance',
+    'joblib',
+    'sklearn.linear_model',
+    'sklearn.model_selection',
+    'sklearn.neural_network',
+    'sklearn.preprocessing',
+)
+
+# TensorFlow starts threads on import, which does not survive fork; only
+# preload it when explicitly asked to.
+WARM_TENSORFLOW = os.environ.get('WARM_TENSORFLOW', '0') == '1'
+
+
+def warm_up(include_tensorflow=WARM_TENSORFLOW):
+    """Import the lazily-loaded backends now; returns {module: seconds}."""
+    timings = {}
+    for name in WARM_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Warm-up skipped {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+
+    if include_tensorflow:
+        from services.prediction import load_tensorflow
+        start = time.perf_counter()
+        load_tensorflow()
+        timings['tensorflow'] = time.perf_counter() - start
+    return timings
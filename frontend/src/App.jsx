@@ -60,7 +60,13 @@ function App() {
     if (!data) return;
     setLoadingPred(true)
     try {
-      const res = await axios.get(`/api/predict/${symbol}?model=${modelType}`)
+      let res = await axios.get(`/api/predict/${symbol}?model=${modelType}`)
+      // Slow fits come back as a 202 job; poll it until the forecast is ready
+      while (res.status === 202 || res.data.status === 'queued' || res.data.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        res = await axios.get(res.data.status_url)
+      }
+      if (res.data.status === 'failed') throw { response: { data: res.data } }
       setPredictions(res.data.predictions)
     } catch (err) {
       console.error(err)
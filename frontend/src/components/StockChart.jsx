@@ -2,12 +2,15 @@ import React from 'react';
 import Plot from 'react-plotly.js';
 
 const StockChart = ({ data, predictions, symbol, company }) => {
-    if (!data || data.length === 0) return null;
+    if (!data) return null;
 
-    const dates = data.map(d => d.Date);
-    const close = data.map(d => d.Close);
-    const sma20 = data.map(d => d.SMA_20);
-    const sma50 = data.map(d => d.SMA_50);
+    // Accept both the row payload and the columnar one (?format=columnar)
+    const columnar = !Array.isArray(data);
+    const dates = columnar ? data.Date : data.map(d => d.Date);
+    if (!dates || dates.length === 0) return null;
+    const close = columnar ? data.Close : data.map(d => d.Close);
+    const sma20 = columnar ? data.SMA_20 : data.map(d => d.SMA_20);
+    const sma50 = columnar ? data.SMA_50 : data.map(d => d.SMA_50);
 
     const traces = [
         {